@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+"""
+Asynchronous alert sinks for new findings.
+
+Findings stored by a scan, a watch poll or a shard worker are published to
+every configured sink:
+
+    ALERT_WEBHOOK_URL     POST batches as JSON to a (local) webhook
+    ALERT_DROP_DIR        Write each batch as a JSON file into a directory
+    ALERT_SYSLOG_ADDRESS  Send one syslog message per finding, to host:port
+                          over UDP or to a Unix socket path such as /dev/log
+
+Each sink has its own bounded queue and background thread, so publishing
+never waits for a receiver. The thread sends alerts in batches of up to
+ALERT_BATCH_SIZE, retrying failed sends with exponential backoff. Batches that
+still fail, and alerts published while the queue is full, are appended to a
+spill file per sink under ALERT_SPILL_DIR and sent again once the receiver
+answers (or on the next start).
+
+Tokens are masked in alerts unless ALERT_INCLUDE_TOKENS=true.
+
+Send a sample alert to the configured sinks:
+    python alert_sinks.py --sample
+"""
+
+import argparse
+import atexit
+import json
+import logging
+import os
+import queue
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import requests
+
+import metrics
+from log_setup import setup_logging
+from request_guard import request_timeouts
+from tracing import env_flag
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SPILL_DIR = "alert_spill"
+DEFAULT_QUEUE_SIZE = 10000
+DEFAULT_BATCH_SIZE = 100
+# How long a batch waits to fill up before it is sent anyway
+BATCH_SECONDS = 2.0
+MAX_SEND_ATTEMPTS = 5
+INITIAL_BACKOFF = 1.0
+MAX_BACKOFF = 60.0
+# Seconds to keep sending at interpreter exit before the rest is spilled
+FLUSH_SECONDS = 5.0
+
+
+def mask_token(token: str) -> str:
+    """Keep only enough of a token to recognise it"""
+    return f"{token[:4]}...{token[-4:]}" if len(token) > 12 else "***"
+
+
+def build_alerts(scan_id: str, pattern: str, processed: List[Dict[str, Any]],
+                 include_tokens: bool = False) -> List[Dict[str, Any]]:
+    """One alert per processed result record"""
+    published_at = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+    alerts = []
+    for result in processed:
+        tokens = [t if isinstance(t, str) else " ".join(t) for t in result.get("found_tokens", [])]
+        alerts.append({
+            "id": uuid.uuid4().hex,
+            "scan_id": scan_id,
+            "pattern": pattern,
+            "repository": result.get("repository"),
+            "file_path": result.get("file_path"),
+            "html_url": result.get("html_url"),
+            "last_modified": result.get("last_modified"),
+            "location_count": result.get("location_count", 1),
+            "token_count": len(tokens),
+            "tokens": tokens if include_tokens else [mask_token(t) for t in tokens],
+            "published_at": published_at
+        })
+    return alerts
+
+
+class AlertSink:
+    """A receiver of alert batches; send raises if the batch was not delivered."""
+    name = "sink"
+
+    def send(self, alerts: List[Dict[str, Any]]) -> None:
+        raise NotImplementedError
+
+
+class WebhookSink(AlertSink):
+    """POSTs {"alerts": [...]} to a URL; any non-2xx answer is a failure."""
+    name = "webhook"
+
+    def __init__(self, url: str):
+        self.url = url
+        self.session = requests.Session()
+
+    def send(self, alerts: List[Dict[str, Any]]) -> None:
+        response = self.session.post(self.url, json={"alerts": alerts}, timeout=request_timeouts())
+        if not 200 <= response.status_code < 300:
+            raise IOError(f"Webhook answered HTTP {response.status_code}")
+
+
+class FileDropSink(AlertSink):
+    """Writes each batch as a new JSON file, renamed into place once complete."""
+    name = "file"
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def send(self, alerts: List[Dict[str, Any]]) -> None:
+        name = f"alerts_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}.json"
+        partial = os.path.join(self.directory, f".{name}.tmp")
+        with open(partial, "w", encoding="utf-8") as f:
+            json.dump({"alerts": alerts}, f, indent=2)
+        # Readers polling the directory never see a half-written file
+        os.replace(partial, os.path.join(self.directory, name))
+
+
+class SyslogSink(AlertSink):
+    """Sends one RFC 3164 message per alert over UDP or a Unix datagram socket."""
+    name = "syslog"
+    # facility local0, severity warning
+    PRIORITY = 16 * 8 + 4
+
+    def __init__(self, address: str):
+        if address.startswith("/"):
+            self.family, self.address = socket.AF_UNIX, address
+        else:
+            host, _, port = address.rpartition(":")
+            self.family, self.address = socket.AF_INET, (host or "localhost", int(port or 514))
+
+    def send(self, alerts: List[Dict[str, Any]]) -> None:
+        with socket.socket(self.family, socket.SOCK_DGRAM) as sock:
+            sock.settimeout(request_timeouts()[0])
+            for alert in alerts:
+                message = f"<{self.PRIORITY}>gitsentry: {json.dumps(alert, separators=(',', ':'))}"
+                sock.sendto(message.encode("utf-8"), self.address)
+
+
+class SinkWorker:
+    """Bounded queue and background thread delivering alerts to one sink."""
+
+    def __init__(self, sink: AlertSink, spill_dir: str = DEFAULT_SPILL_DIR,
+                 queue_size: int = DEFAULT_QUEUE_SIZE, batch_size: int = DEFAULT_BATCH_SIZE):
+        self.sink = sink
+        self.batch_size = batch_size
+        self.queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=queue_size)
+        os.makedirs(spill_dir, exist_ok=True)
+        self.spill_path = os.path.join(spill_dir, f"{sink.name}.jsonl")
+        self.spill_lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.last_replay = time.monotonic()
+        self.thread = threading.Thread(target=self._run, name=f"alert-{sink.name}", daemon=True)
+        self.thread.start()
+
+    def offer(self, alerts: List[Dict[str, Any]]) -> None:
+        """Queue alerts without blocking; what does not fit is spilled to disk"""
+        overflow = []
+        for alert in alerts:
+            try:
+                self.queue.put_nowait(alert)
+            except queue.Full:
+                overflow.append(alert)
+        if overflow:
+            logger.warning(f"Alert queue of {self.sink.name} sink full, spilling {len(overflow)} alerts")
+            self._spill(overflow)
+        metrics.ALERT_QUEUE_DEPTH.set(self.queue.qsize(), sink=self.sink.name)
+
+    def _spill(self, alerts: List[Dict[str, Any]]) -> None:
+        if not alerts:
+            return
+        with self.spill_lock:
+            with open(self.spill_path, "a", encoding="utf-8") as f:
+                for alert in alerts:
+                    f.write(json.dumps(alert) + "\n")
+        metrics.ALERTS_SPILLED.inc(len(alerts), sink=self.sink.name)
+
+    def _take_spill(self) -> List[Dict[str, Any]]:
+        """Read and remove the spill file"""
+        with self.spill_lock:
+            try:
+                with open(self.spill_path, encoding="utf-8") as f:
+                    alerts = [json.loads(line) for line in f if line.strip()]
+            except FileNotFoundError:
+                return []
+            os.remove(self.spill_path)
+        return alerts
+
+    def _next_batch(self) -> List[Dict[str, Any]]:
+        """Wait for an alert, then collect more for up to BATCH_SECONDS"""
+        try:
+            batch = [self.queue.get(timeout=BATCH_SECONDS)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + BATCH_SECONDS
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self.stop_event.is_set():
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        metrics.ALERT_QUEUE_DEPTH.set(self.queue.qsize(), sink=self.sink.name)
+        return batch
+
+    def _deliver(self, batch: List[Dict[str, Any]]) -> bool:
+        """Send a batch with exponential backoff, spilling it if every attempt fails"""
+        backoff = INITIAL_BACKOFF
+        for attempt in range(1, MAX_SEND_ATTEMPTS + 1):
+            try:
+                self.sink.send(batch)
+                metrics.ALERTS_SENT.inc(len(batch), sink=self.sink.name)
+                return True
+            except Exception as e:
+                metrics.ALERT_SEND_FAILURES.inc(sink=self.sink.name)
+                logger.warning(f"Sending {len(batch)} alerts to {self.sink.name} sink failed "
+                               f"(attempt {attempt}/{MAX_SEND_ATTEMPTS}): {str(e)}")
+                if attempt == MAX_SEND_ATTEMPTS or self.stop_event.wait(backoff):
+                    break
+                backoff = min(backoff * 2, MAX_BACKOFF)
+        self._spill(batch)
+        return False
+
+    def _replay_spill(self) -> None:
+        spilled = self._take_spill()
+        if spilled:
+            logger.info(f"Resending {len(spilled)} spilled alerts to {self.sink.name} sink")
+        for start in range(0, len(spilled), self.batch_size):
+            if not self._deliver(spilled[start:start + self.batch_size]):
+                # Still down, the rest goes back to the spill file behind the failed batch
+                self._spill(spilled[start + self.batch_size:])
+                return
+
+    def _run(self):
+        # Alerts spilled by an earlier run go out first
+        self._replay_spill()
+        while not self.stop_event.is_set():
+            batch = self._next_batch()
+            delivered = bool(batch) and self._deliver(batch)
+            for _ in batch:
+                self.queue.task_done()
+            spilled = os.path.exists(self.spill_path)
+            # Resend what piled up once the receiver is back, or now and then while idle
+            if spilled and (delivered or (not batch and time.monotonic() - self.last_replay > MAX_BACKOFF)):
+                self.last_replay = time.monotonic()
+                self._replay_spill()
+
+    def flush(self, timeout: float) -> bool:
+        """Wait until every queued alert is delivered or spilled, returning False on timeout"""
+        deadline = time.monotonic() + timeout
+        while self.queue.unfinished_tasks:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def close(self, timeout: float = FLUSH_SECONDS) -> None:
+        """Send what is queued for up to timeout seconds, then spill the rest"""
+        self.flush(timeout)
+        self.stop_event.set()
+        self.thread.join(timeout=1.0)
+        rest = []
+        while True:
+            try:
+                rest.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+            self.queue.task_done()
+        if rest:
+            self._spill(rest)
+
+
+class AlertDispatcher:
+    """Fans published findings out to a worker per sink."""
+
+    def __init__(self, sinks: List[AlertSink], spill_dir: str = DEFAULT_SPILL_DIR,
+                 queue_size: int = DEFAULT_QUEUE_SIZE, batch_size: int = DEFAULT_BATCH_SIZE,
+                 include_tokens: bool = False):
+        self.include_tokens = include_tokens
+        self.workers = [SinkWorker(sink, spill_dir, queue_size, batch_size) for sink in sinks]
+
+    def publish(self, scan_id: str, pattern: str, processed: List[Dict[str, Any]]) -> int:
+        """Queue an alert per result record for every sink and return the number of alerts"""
+        if not self.workers or not processed:
+            return 0
+        alerts = build_alerts(scan_id, pattern, processed, self.include_tokens)
+        for worker in self.workers:
+            worker.offer(alerts)
+        return len(alerts)
+
+    def flush(self, timeout: float = FLUSH_SECONDS) -> bool:
+        """Wait until every sink's queue is drained"""
+        deadline = time.monotonic() + timeout
+        return all([worker.flush(max(0.0, deadline - time.monotonic())) for worker in self.workers])
+
+    def close(self, timeout: float = FLUSH_SECONDS) -> None:
+        for worker in self.workers:
+            worker.close(timeout)
+
+
+def sinks_from_env() -> List[AlertSink]:
+    """Create the sinks configured in the environment"""
+    sinks: List[AlertSink] = []
+    if os.getenv("ALERT_WEBHOOK_URL"):
+        sinks.append(WebhookSink(os.getenv("ALERT_WEBHOOK_URL")))
+    if os.getenv("ALERT_DROP_DIR"):
+        sinks.append(FileDropSink(os.getenv("ALERT_DROP_DIR")))
+    if os.getenv("ALERT_SYSLOG_ADDRESS"):
+        sinks.append(SyslogSink(os.getenv("ALERT_SYSLOG_ADDRESS")))
+    return sinks
+
+
+_dispatcher: Optional[AlertDispatcher] = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_alert_dispatcher() -> AlertDispatcher:
+    """Get the process-wide dispatcher for the sinks configured in the environment"""
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            _dispatcher = AlertDispatcher(
+                sinks_from_env(),
+                os.getenv("ALERT_SPILL_DIR", DEFAULT_SPILL_DIR),
+                int(os.getenv("ALERT_QUEUE_SIZE", DEFAULT_QUEUE_SIZE)),
+                int(os.getenv("ALERT_BATCH_SIZE", DEFAULT_BATCH_SIZE)),
+                env_flag("ALERT_INCLUDE_TOKENS")
+            )
+            if _dispatcher.workers:
+                logger.info(f"Alert sinks: {', '.join(w.sink.name for w in _dispatcher.workers)}")
+                atexit.register(_dispatcher.close)
+        return _dispatcher
+
+
+def publish_findings(scan_id: str, pattern: str, processed: List[Dict[str, Any]]) -> int:
+    """Queue alerts for new findings on every configured sink without waiting for delivery"""
+    try:
+        return get_alert_dispatcher().publish(scan_id, pattern, processed)
+    except Exception as e:
+        # Alerting must never fail the scan that found something
+        logger.error(f"Could not publish alerts: {str(e)}", exc_info=True)
+        return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Send a sample alert to the sinks configured in the environment.")
+    parser.add_argument("--sample", action="store_true", required=True, help="Send one sample alert")
+    parser.parse_args()
+
+    setup_logging()
+    dispatcher = get_alert_dispatcher()
+    if not dispatcher.workers:
+        raise SystemExit("No alert sinks configured (ALERT_WEBHOOK_URL, ALERT_DROP_DIR, ALERT_SYSLOG_ADDRESS)")
+    sample = {
+        "repository": "owner/repo",
+        "file_path": "config/settings.py",
+        "html_url": "https://github.com/owner/repo/blob/main/config/settings.py",
+        "last_modified": None,
+        "found_tokens": ["gsk_sampleSampleSampleSample"]
+    }
+    dispatcher.publish("sample", "sample", [sample])
+    delivered = dispatcher.flush()
+    print("Sample alert sent" if delivered else "Sample alert not delivered yet, it will be spilled and retried")
+
+
+if __name__ == "__main__":
+    main()
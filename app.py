@@ -11,7 +11,6 @@ A web interface for the GitHub PAT Scraper that allows:
 """
 
 import streamlit as st
-import threading
 import time
 import logging
 import re # Added for regex compilation
@@ -19,12 +18,127 @@ import re # Added for regex compilation
 from config import get_github_tokens
 from token_patterns import load_token_patterns
 from github_api import search_github
-from result_processor import process_results, save_results
-from search_query import generate_search_query
-from thread_safe_api import thread_safe_state, thread_safe_search_github
+from http_cache import get_cache_stats
+from findings_store import SORT_COLUMNS, get_findings_store
+from alert_sinks import publish_findings
+import metrics
+from tracing import env_flag, finish_scan_trace, use_tracer
+from result_processor import process_scan
+from search_query import generate_search_query, plan_catalog, plan_query
+from thread_safe_api import ThreadSafeState
+from job_manager import get_job_manager
 
 logger = logging.getLogger(__name__) # Initialize logger for app.py
 
+def render_results_explorer(scan_id: str, pattern: str):
+    """Render a paginated, filterable view of stored findings."""
+    st.header("Results Explorer")
+    findings_store = get_findings_store()
+
+    scope = st.radio("Show findings from", ["This scan", "All scans"], horizontal=True)
+    filter_cols = st.columns(4)
+    with filter_cols[0]:
+        repository_filter = st.text_input("Repository starts with", value="")
+    with filter_cols[1]:
+        path_filter = st.text_input("File path contains", value="")
+    with filter_cols[2]:
+        sort_label = st.selectbox("Sort by", list(SORT_COLUMNS.keys()))
+    with filter_cols[3]:
+        descending = st.selectbox("Order", ["Ascending", "Descending"]) == "Descending"
+
+    pattern_filter = pattern
+    if scope == "All scans":
+        patterns = findings_store.list_patterns()
+        pattern_filter = st.selectbox(
+            "Pattern",
+            ["Any"] + patterns,
+            index=(patterns.index(pattern) + 1) if pattern in patterns else 0
+        )
+        pattern_filter = None if pattern_filter == "Any" else pattern_filter
+
+    page_cols = st.columns(2)
+    with page_cols[0]:
+        page_size = st.selectbox("Results per page", [10, 25, 50, 100], index=1)
+    query_args = dict(
+        scan_id=scan_id if scope == "This scan" else None,
+        pattern=pattern_filter,
+        repository=repository_filter,
+        path=path_filter,
+        sort_by=SORT_COLUMNS[sort_label],
+        descending=descending,
+        page_size=page_size
+    )
+    _, total = findings_store.query_findings(**query_args, page=1)
+    total_pages = max(1, -(-total // page_size))
+    with page_cols[1]:
+        page = st.number_input("Page", min_value=1, max_value=total_pages, value=1, step=1)
+
+    findings, total = findings_store.query_findings(**query_args, page=page)
+    st.caption(f"Showing {len(findings)} of {total} findings (page {page} of {total_pages})")
+    if not findings:
+        return
+
+    st.dataframe(
+        [
+            {
+                "Repository": f["repository"],
+                "File": f["file_path"],
+                "Last Modified": f["last_modified"],
+                "Found Date": f["found_date"],
+                "Unique Tokens": f["unique_matches"],
+                "URL": f["html_url"]
+            }
+            for f in findings
+        ],
+        use_container_width=True,
+        hide_index=True
+    )
+    for finding in findings:
+        with st.expander(f"{finding['repository']} - {finding['file_path']}"):
+            st.markdown(f"""
+            - URL: {finding['html_url'] or 'N/A'}
+            - Last Updated: {finding['last_modified'] or 'N/A'}
+            - Found Tokens: {len(finding['found_tokens'])}
+            """)
+            st.markdown("**Tokens Found in Context:**")
+            for fragment in finding["fragments"]:
+                st.code(fragment, language="text")
+
+def render_job_list(job_manager):
+    """List scan jobs and let the session attach to one of them."""
+    jobs = job_manager.list_jobs()
+    if not jobs:
+        return
+    with st.expander(f"Scan Jobs ({sum(job.status in ('queued', 'running') for job in jobs)} active)", expanded=True):
+        st.dataframe(
+            [
+                {
+                    "Job": job.job_id,
+                    "Pattern Type": job.label,
+                    "Status": job.status,
+                    "Priority": job.priority,
+                    "Progress": f"{job.state.get_progress():.0%}",
+                    "Results": len(job.state.get_results() or []),
+                    "Elapsed (s)": int(((job.finished_at or time.time()) - (job.started_at or time.time())))
+                }
+                for job in jobs
+            ],
+            use_container_width=True,
+            hide_index=True
+        )
+        job_ids = [job.job_id for job in jobs]
+        attached = st.session_state.get("job_id")
+        selected = st.selectbox(
+            "Attach to job",
+            job_ids,
+            index=job_ids.index(attached) if attached in job_ids else 0,
+            format_func=lambda job_id: f"{job_id} - {job_manager.get_job(job_id).label}"
+        )
+        if selected != attached:
+            st.session_state.job_id = selected
+            st.session_state.should_update_ui = False
+            st.rerun()
+
 def main():
     st.set_page_config(
         page_title="GitSentry",
@@ -32,6 +146,9 @@ def main():
         layout="wide"
     )
     
+    # Start the metrics exporters configured in the environment (no-op once running)
+    metrics.start_from_env()
+    
     st.title("🔍 GitSentry")
     st.markdown("Search for tokens and secrets in GitHub public code.")
     
@@ -57,6 +174,8 @@ def main():
 
     # Load token patterns
     TOKEN_PATTERNS = load_token_patterns()
+    # Warm the memoized query plans for the whole catalog
+    plan_catalog(TOKEN_PATTERNS)
     
     # Add empty custom token type
     TOKEN_PATTERNS["Custom (Empty)"] = ""
@@ -158,6 +277,9 @@ def main():
                 disabled=True,
                 help="Query automatically generated from the pattern type and regex"
             )
+            plan = plan_query(st.session_state.pattern)
+            if plan:
+                st.sidebar.caption(f"Estimated result pages: ~{plan.estimated_pages}")
         else:
             search_query = ""
             st.sidebar.info(f"Using default search query: '{search_query}'")
@@ -179,48 +301,89 @@ def main():
         disabled=search_active
     )
     
-    # Add custom cooldown time configuration
-    if enable_extended:
-        st.sidebar.markdown("---")
-        custom_cooldown = st.sidebar.checkbox(
-            "Use Custom Cooldown Time",
+    fetch_full_content = st.sidebar.checkbox(
+        "Fetch Full File Content",
+        value=False,
+        help="Download the full content of each matching file and run the pattern over it, instead of only the short text-match snippets. Uses extra API requests.",
+        disabled=search_active
+    )
+    
+    enrich_repos = st.sidebar.checkbox(
+        "Resolve Repository Dates",
+        value=True,
+        help="Look up the last activity date of repositories whose search results have none, with one GraphQL request per 100 repositories",
+        disabled=search_active
+    )
+    
+    collapse_duplicates = st.sidebar.checkbox(
+        "Collapse Duplicate Files",
+        value=env_flag("COLLAPSE_DUPLICATES"),
+        help="Report each file blob once, listing every repository and path it was found in (forks, vendored copies), instead of one result per copy"
+    )
+    
+    with st.sidebar.expander("🩺 Diagnostics"):
+        record_trace = st.checkbox(
+            "Record Performance Trace",
             value=False,
-            help="Customize the cooldown time between batches in extended search (default is 40 seconds)",
+            help="Record timing spans for each scan stage and write a Chrome trace file to the traces directory",
             disabled=search_active
         )
-        
-        cooldown_time = 40  # Default value
-        if custom_cooldown:
-            cooldown_time = st.sidebar.number_input(
-                "Cooldown Time (seconds)",
-                min_value=5,
-                max_value=120, 
-                value=40,
-                step=5,
-                help="Time to wait between batches to avoid rate limiting (seconds)",
-                disabled=search_active
-            )
-            
-            st.sidebar.info(
-                "ℹ️ Lower values may cause more rate limit errors. Higher values make the search slower but more reliable."
-            )
-    else:
-        cooldown_time = 40  # Default if extended search is not enabled
-        custom_cooldown = False
+        record_profile = st.checkbox(
+            "Include cProfile Dump",
+            value=False,
+            help="Profile the search thread and the pool threads running its partition searches and blob fetches with cProfile (adds overhead)",
+            disabled=search_active or not record_trace
+        )
+        record_memory = st.checkbox(
+            "Include Memory Snapshot",
+            value=False,
+            help="Capture a tracemalloc snapshot after results are processed (adds overhead)",
+            disabled=search_active or not record_trace
+        )
+    
+    job_priority = st.sidebar.number_input(
+        "Job Priority",
+        min_value=0,
+        max_value=10,
+        value=5,
+        help="When more scans are queued than can run at once, higher priority jobs start first",
+        disabled=search_active
+    )
+    
+    deadline_minutes = st.sidebar.number_input(
+        "Scan Deadline (minutes)",
+        min_value=0,
+        max_value=1440,
+        value=0,
+        help="Stop the scan after this many minutes and keep the results collected so far (0 = no deadline)",
+        disabled=search_active
+    )
 
     # Main content
-    if 'search_thread' not in st.session_state:
-        st.session_state.search_thread = None
+    if 'job_id' not in st.session_state:
+        st.session_state.job_id = None
     if 'should_update_ui' not in st.session_state:
         st.session_state.should_update_ui = False
+    if 'shown_errors' not in st.session_state:
+        # Jobs whose error this session has displayed; the error itself stays on the shared job
+        st.session_state.shown_errors = set()
+
+    # Every scan runs as a job with its own state; this session shows the attached job
+    job_manager = get_job_manager()
+    render_job_list(job_manager)
+    job = job_manager.get_job(st.session_state.job_id)
+    scan_state = job.state if job else ThreadSafeState()
+    scan_error = scan_state.get_error()
+    if job and job.job_id in st.session_state.shown_errors:
+        scan_error = None
 
     # When search completes or has an error, Streamlit will rerun the app and
     # this will be set to show the appropriate screen
-    if thread_safe_state.get_results() is not None and not thread_safe_state.is_search_running():
+    if scan_state.get_results() is not None and not scan_state.is_search_running():
         st.session_state.should_update_ui = True
     
     # Show welcome message if no search is in progress and no results to show
-    if not thread_safe_state.is_search_running() and thread_safe_state.get_results() is None and thread_safe_state.get_error() is None:
+    if not scan_state.is_search_running() and scan_state.get_results() is None and scan_error is None:
         st.info("ℹ️ Configure your search parameters in the sidebar and click 'Start Scraping' to begin.")
     
     # Create container for progress and status updates
@@ -228,7 +391,7 @@ def main():
     progress_bar = st.progress(0)
     
     # Button is only active if no search is running
-    if st.button("Start Scraping", type="primary", disabled=thread_safe_state.is_search_running()):
+    if st.button("Start Scraping", type="primary"):
         # Final validation check before starting
         try:
             re.compile(st.session_state.pattern)
@@ -244,10 +407,6 @@ def main():
         elif not get_github_tokens():
             st.error("⚠️ No GitHub token found in environment variables. Please set GITHUB_TOKEN or GITHUB_TOKENS.")
         else:
-            # Reset thread safe state
-            thread_safe_state.reset()
-            thread_safe_state.set_running(True)
-            
             # Show search configuration
             st.info("🚀 Starting the scraping process...")
             st.markdown(f"""
@@ -257,42 +416,48 @@ def main():
             - Search Query: `{search_query}`
             - Result Limit: `{limit}`
             - Extended Search: {"Enabled" if enable_extended else "Disabled"}
+            - Full File Content: {"Enabled" if fetch_full_content else "Disabled"}
             """)
             
-            # Capture current values for the thread
-            current_search_query = search_query
-            current_limit = limit
-            current_enable_extended = enable_extended
-            
-            # Function to be run in the thread - no Streamlit API access
-            def thread_target():
-                try:
-                    # Use thread-safe search function that doesn't require Streamlit UI elements
-                    thread_safe_search_github(
-                        query=current_search_query,
-                        limit=current_limit,
-                        extended=current_enable_extended,
-                        cooldown=cooldown_time
-                    )
-                except Exception as e:
-                    logger.error(f"Error in search thread: {str(e)}", exc_info=True)
-                    thread_safe_state.set_error(f"An unexpected error occurred: {str(e)}")
-                finally:
-                    thread_safe_state.set_running(False)
-
-            # Start thread
-            st.session_state.search_thread = threading.Thread(target=thread_target)
-            st.session_state.search_thread.start()
+            # Queue the scan as a job with its own state and attach this session to it
+            job = job_manager.submit(
+                st.session_state.pattern_type,
+                st.session_state.pattern,
+                priority=job_priority,
+                deadline=deadline_minutes * 60 or None,
+                query=search_query,
+                limit=limit,
+                extended=enable_extended,
+                fetch_full_content=fetch_full_content,
+                enrich_repos=enrich_repos,
+                trace=record_trace,
+                profile=record_trace and record_profile,
+                trace_memory=record_trace and record_memory
+            )
+            st.session_state.job_id = job.job_id
+            st.session_state.should_update_ui = False
             
             # Force a rerun to enter the search monitoring state
             st.rerun()
 
+    # Cancel the attached job; a running scan stops within about a second with partial results
+    if job and job.status in ("queued", "running"):
+        if st.button("Cancel Scan", help="Stop this scan and keep the results collected so far"):
+            job_manager.cancel(job.job_id)
+            st.rerun()
+    
+    # Queued state - wait for a free job slot
+    if job and job.status == "queued":
+        status_container.info(f"⏳ Job {job.job_id} is queued and will start when a scan slot is free.")
+        time.sleep(1)
+        st.rerun()
+    
     # Search monitoring state - display progress and status updates
-    if thread_safe_state.is_search_running():
+    if scan_state.is_search_running():
         # Display a spinner while search is running
         with st.spinner("Search in progress"):
             # Update UI with current progress and status
-            progress_bar.progress(thread_safe_state.get_progress())
+            progress_bar.progress(scan_state.get_progress())
             
             # Create simplified status display
             status_container.empty()
@@ -320,36 +485,18 @@ def main():
                 """, unsafe_allow_html=True)
                 
                 # Get current status message for details
-                status_msg = thread_safe_state.get_status()
-                
-                # Check for cooling down phase
-                is_cooling_down = "Cooling down" in status_msg
-                cooldown_time = 40  # Default value
+                status_msg = scan_state.get_status()
                 
-                # Try to extract cooldown time from status message
-                if is_cooling_down:
-                    try:
-                        # Look for patterns like "Cooling down for X seconds" or similar
-                        cooldown_parts = status_msg.split("Cooling down")
-                        if len(cooldown_parts) > 1:
-                            for part in cooldown_parts[1:]:
-                                if "seconds" in part:
-                                    # Extract number before "seconds"
-                                    numbers = [int(s) for s in part.split() if s.isdigit()]
-                                    if numbers:
-                                        cooldown_time = numbers[0]
-                                        break
-                    except:
-                        # If extraction fails, use default value
-                        pass
+                # Seconds until the scheduler expects a token's budget back, if every token is spent
+                budget_wait = scan_state.get_budget_wait()
                 
                 # Display appropriate card based on state
-                if is_cooling_down:
+                if budget_wait:
                     st.markdown(f"""
                     <div class="cooling-card">
-                    <h4>⏱️ Cooling Down Between Batches</h4>
-                    <p>The search is paused for a cooling down period of <strong>{cooldown_time} seconds</strong> to avoid GitHub API rate limits.</p>
-                    <p>This is normal during extended searches. The search will automatically continue after the cooldown period.</p>
+                    <h4>⏱️ Waiting for Rate Limit Budget</h4>
+                    <p>Every token has used up its search budget. The search continues in about <strong>{int(budget_wait) + 1} seconds</strong>, when the earliest token's rate limit resets.</p>
+                    <p>This is normal during large searches.</p>
                     </div>
                     """, unsafe_allow_html=True)
                 
@@ -357,7 +504,7 @@ def main():
                 st.markdown(f"""
                 <div class="status-card">
                 <h4>📊 Search Information</h4>
-                <p>Searching for tokens matching pattern: <code>{st.session_state.pattern_type}</code></p>
+                <p>Searching for tokens matching pattern: <code>{job.label}</code></p>
                 <p>Please wait while GitHub is being searched. This may take several minutes.</p>
                 </div>
                 """, unsafe_allow_html=True)
@@ -367,9 +514,9 @@ def main():
                     st.code(status_msg)
             
             # Keep checking the search state until it's done
-            while thread_safe_state.is_search_running() and st.session_state.search_thread and st.session_state.search_thread.is_alive():
+            while scan_state.is_search_running():
                 # Get updated progress
-                current_progress = thread_safe_state.get_progress()
+                current_progress = scan_state.get_progress()
                 progress_bar.progress(current_progress)
                 
                 # Update status container with new info
@@ -397,36 +544,18 @@ def main():
                     """, unsafe_allow_html=True)
                     
                     # Get current status message for details
-                    status_msg = thread_safe_state.get_status()
+                    status_msg = scan_state.get_status()
                     
-                    # Check for cooling down phase
-                    is_cooling_down = "Cooling down" in status_msg
-                    cooldown_time = 40  # Default value
-                    
-                    # Try to extract cooldown time from status message
-                    if is_cooling_down:
-                        try:
-                            # Look for patterns like "Cooling down for X seconds" or similar
-                            cooldown_parts = status_msg.split("Cooling down")
-                            if len(cooldown_parts) > 1:
-                                for part in cooldown_parts[1:]:
-                                    if "seconds" in part:
-                                        # Extract number before "seconds"
-                                        numbers = [int(s) for s in part.split() if s.isdigit()]
-                                        if numbers:
-                                            cooldown_time = numbers[0]
-                                            break
-                        except:
-                            # If extraction fails, use default value
-                            pass
+                    # Seconds until the scheduler expects a token's budget back, if every token is spent
+                    budget_wait = scan_state.get_budget_wait()
                     
                     # Display appropriate card based on state
-                    if is_cooling_down:
+                    if budget_wait:
                         st.markdown(f"""
                         <div class="cooling-card">
-                        <h4>⏱️ Cooling Down Between Batches</h4>
-                        <p>The search is paused for a cooling down period of <strong>{cooldown_time} seconds</strong> to avoid GitHub API rate limits.</p>
-                        <p>This is normal during extended searches. The search will automatically continue after the cooldown period.</p>
+                        <h4>⏱️ Waiting for Rate Limit Budget</h4>
+                        <p>Every token has used up its search budget. The search continues in about <strong>{int(budget_wait) + 1} seconds</strong>, when the earliest token's rate limit resets.</p>
+                        <p>This is normal during large searches.</p>
                         </div>
                         """, unsafe_allow_html=True)
                     
@@ -434,7 +563,7 @@ def main():
                     st.markdown(f"""
                     <div class="status-card">
                     <h4>📊 Search Information</h4>
-                    <p>Searching for tokens matching pattern: <code>{st.session_state.pattern_type}</code></p>
+                    <p>Searching for tokens matching pattern: <code>{job.label}</code></p>
                     <p>Please wait while GitHub is being searched. This may take several minutes.</p>
                     </div>
                     """, unsafe_allow_html=True)
@@ -450,7 +579,10 @@ def main():
             progress_bar.progress(1.0)  # Force to 100% when complete
             
             with status_container.container():
-                st.success("✅ Search completed successfully!")
+                if job.cancel_token.cancelled:
+                    st.warning(f"⏹️ Search stopped ({job.cancel_token.reason}), keeping the partial results.")
+                else:
+                    st.success("✅ Search completed successfully!")
                 
                 # Display simple completion message
                 st.info("Results are being processed and will be displayed shortly...")
@@ -460,41 +592,66 @@ def main():
         # Rerun to show results or error
         st.rerun()
     
-    # Error state - display error message
-    if thread_safe_state.get_error():
+    # Error state - display error message once in this session; other sessions attached to the job still see it
+    if scan_error:
         status_container.empty()
         progress_bar.empty()
-        st.error(f"Search failed: {thread_safe_state.get_error()}")
-        # Clear error after displaying
-        thread_safe_state.set_error(None)
+        st.error(f"Search failed: {scan_error}")
+        if job:
+            st.session_state.shown_errors.add(job.job_id)
 
     # Results state - display search results
-    if thread_safe_state.get_results() is not None and st.session_state.should_update_ui:
+    if scan_state.get_results() is not None and st.session_state.should_update_ui:
         # Clear the progress and status indicators
         status_container.empty()
         progress_bar.empty()
         
         # Get results from thread-safe state
-        results = thread_safe_state.get_results()
+        results = scan_state.get_results()
         
-        # Process results with the pattern from session state
-        current_pattern = st.session_state.pattern
-        processed_results = process_results(results, current_pattern)
+        # Process and save results once per scan and pattern, reruns only re-render
+        current_pattern = job.pattern
+        scan_id = scan_state.get_scan_id()
         
-        if processed_results:
-            tokens_file, detailed_file, save_error = save_results(processed_results, current_pattern)
-            
+        def store_findings(processed):
+            # Persist findings to the indexed store once per scan and pattern
+            findings_store = get_findings_store()
+            if not findings_store.has_scan(scan_id, current_pattern):
+                findings_store.add_findings(scan_id, current_pattern, processed)
+                # Queued for the alert sinks, delivery happens in the background
+                publish_findings(scan_id, current_pattern, processed)
+        
+        # Matching and saving spans belong to this job's trace, not to whatever runs on this thread
+        tracer = scan_state.get_tracer()
+        with use_tracer(tracer):
+            scan_output = process_scan(
+                scan_id,
+                current_pattern,
+                results,
+                scan_state.get_blob_texts(),
+                on_processed=store_findings,
+                repo_dates=scan_state.get_repo_dates(),
+                collapse=collapse_duplicates
+            )
+        # Close the scan's trace now that processing and saving are done
+        trace_summary = finish_scan_trace(tracer) if tracer else None
+        
+        tokens_file = scan_output["tokens_file"]
+        detailed_file = scan_output["detailed_file"]
+        save_error = scan_output["save_error"]
+        
+        if scan_output["result_count"]:
             if save_error:
                 st.error(f"Failed to save results: {save_error}")
             else:
-                st.success(f"✅ Found {len(processed_results)} results with matching patterns!")
+                st.success(f"✅ Found {scan_output['result_count']} results with matching patterns!")
                 
                 # Display summary
                 st.header("Summary")
-                total_tokens = sum(len(r["found_tokens"]) for r in processed_results)
                 st.markdown(f"""
-                - Total repositories scanned: {len(processed_results)}
-                - Total unique tokens found: {total_tokens}
+                - Total repositories scanned: {scan_output['result_count']}
+                - Total unique tokens found: {scan_output['total_tokens']}
+                - Locations including forks and copies: {scan_output['match_statistics'].get('total_locations', scan_output['result_count'])}
                 - Results saved to:
                     - Tokens file: `{tokens_file}`
                     - Detailed results: `{detailed_file}`
@@ -521,32 +678,43 @@ def main():
                         )
                 
                 # Display results preview
-                st.header("Results Preview")
-                for idx, result in enumerate(processed_results[:5], 1):
-                    with st.expander(f"Result #{idx} - {result.get('repository', 'N/A')}", expanded=idx==1):
-                        st.markdown(f"""
-                        - Repository: {result.get('repository', 'N/A')}
-                        - File: {result.get('path', 'N/A')}
-                        - URL: {result.get('html_url', 'N/A')}
-                        - Last Updated: {result.get('last_modified', 'N/A')}
-                        - Found Tokens: {len(result.get('found_tokens', []))}
-                        """)
-                        st.markdown("**Tokens Found in Context:**")
-                        for fragment in result.get('fragments', []):
-                            st.code(fragment, language="text")
+                # Browse the stored findings page by page
+                render_results_explorer(scan_id, current_pattern)
+                
+                if trace_summary:
+                    with st.expander("Performance Trace", expanded=False):
+                        st.table(trace_summary)
+                        for kind, path in tracer.files.items():
+                            st.markdown(f"- {kind.capitalize()} file: `{path}`")
+                
+                partition_report = scan_state.get_partition_report()
+                if len(partition_report) > 1:
+                    with st.expander("Partition Overlap", expanded=False):
+                        st.caption("Duplicates were dropped as pages arrived; partitions with a high overlap add little")
+                        st.table(partition_report)
                 
-                if len(processed_results) > 5:
-                    st.info(f"... and {len(processed_results) - 5} more results")
+                cache_stats = get_cache_stats()
+                if cache_stats:
+                    with st.expander("HTTP Cache Statistics", expanded=False):
+                        st.table([
+                            {
+                                "Endpoint": endpoint,
+                                "Requests": stats["requests"],
+                                "Hit Ratio": f"{stats['hit_ratio']:.0%}",
+                                "Bytes Saved": stats["bytes_saved"]
+                            }
+                            for endpoint, stats in cache_stats.items()
+                        ])
         else:
             st.warning("No matching tokens found in the search results.")
         
         # Reset session state for next run
         st.session_state.should_update_ui = False
         # Do not clear results from thread_safe_state here to allow viewing results again
-        # thread_safe_state.results = None
+        # scan_state.results = None
 
     # Display error if any occurred during search (should display once then clear)
-    if st.session_state.search_error and not thread_safe_state.is_search_running():
+    if st.session_state.search_error and not scan_state.is_search_running():
         st.error(st.session_state.search_error)
         st.session_state.search_error = None # Clear error after displaying
 
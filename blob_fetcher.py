@@ -0,0 +1,251 @@
+"""
+Full-blob fetch stage for GitHub code search results.
+
+Code search only returns short `text_matches` fragments, so tokens outside the
+snippet window are missed. This module fetches the full file content of hit
+candidates through a bounded worker pool and keeps it in a content-addressed
+cache keyed by blob sha, so identical files are never fetched twice. The
+in-memory cache holds the most recently used blobs up to
+BLOB_CACHE_MEMORY_BYTES; the disk cache under BLOB_CACHE_DIR keeps them all.
+"""
+
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, Iterable, Optional, Union
+
+import requests
+
+from config import get_token_rotator
+from http_cache import get_cache_stats, get_session
+from request_guard import DeadlineExceeded, request_deadline, request_timeouts, watchdog
+from search_records import SearchHit, as_hit
+import metrics
+from tracing import in_scan_context, traced
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BLOB_BYTES = 1024 * 1024  # Skip files larger than 1 MB
+DEFAULT_FETCH_WORKERS = 8
+DEFAULT_MEMORY_BYTES = 64 * 1024 * 1024
+_CHUNK_SIZE = 64 * 1024
+_OVERSIZED = object()  # Marker returned for blobs larger than the size cap
+
+
+class BlobCache:
+    """Content-addressed store of decoded file contents keyed by blob sha, least recently used first out."""
+
+    def __init__(self, cache_dir: Optional[str] = None, max_memory_bytes: int = DEFAULT_MEMORY_BYTES):
+        self.lock = threading.Lock()
+        self.cache_dir = cache_dir
+        self.max_memory_bytes = max_memory_bytes
+        self._blobs: "OrderedDict[str, str]" = OrderedDict()
+        self._memory_bytes = 0
+        # Blobs we know to be oversized or binary, so they are not requested again
+        self._skipped = set()
+
+    def _path(self, sha: str) -> str:
+        return os.path.join(self.cache_dir, sha[:2], sha)
+
+    def get(self, sha: str) -> Optional[str]:
+        """Get cached content for a blob sha, checking the disk cache if configured"""
+        with self.lock:
+            if sha in self._blobs:
+                self._blobs.move_to_end(sha)
+                return self._blobs[sha]
+        if self.cache_dir:
+            try:
+                with open(self._path(sha), "r", encoding="utf-8") as f:
+                    text = f.read()
+            except (IOError, OSError):
+                return None
+            self._remember(sha, text)
+            return text
+        return None
+
+    def put(self, sha: str, text: str) -> None:
+        """Store content for a blob sha"""
+        self._remember(sha, text)
+        if self.cache_dir:
+            path = self._path(sha)
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                # Written under a temporary name and renamed, so a concurrent get never reads part of a file
+                fd, partial = tempfile.mkstemp(dir=os.path.dirname(path), prefix=f".{sha}.")
+                try:
+                    with os.fdopen(fd, "w", encoding="utf-8") as f:
+                        f.write(text)
+                    os.replace(partial, path)
+                except BaseException:
+                    os.unlink(partial)
+                    raise
+            except (IOError, OSError) as e:
+                logger.warning(f"Could not write blob {sha} to cache: {str(e)}")
+
+    def _remember(self, sha: str, text: str) -> None:
+        """Keep a blob in memory, evicting the least recently used ones beyond the memory budget"""
+        size = sys.getsizeof(text)
+        if size > self.max_memory_bytes:
+            return
+        with self.lock:
+            if sha in self._blobs:
+                self._memory_bytes -= sys.getsizeof(self._blobs.pop(sha))
+            self._blobs[sha] = text
+            self._memory_bytes += size
+            while self._memory_bytes > self.max_memory_bytes:
+                _, evicted = self._blobs.popitem(last=False)
+                self._memory_bytes -= sys.getsizeof(evicted)
+
+    def mark_skipped(self, sha: str) -> None:
+        """Remember a blob that is too large or binary"""
+        with self.lock:
+            self._skipped.add(sha)
+
+    def is_skipped(self, sha: str) -> bool:
+        with self.lock:
+            return sha in self._skipped
+
+    def __len__(self) -> int:
+        with self.lock:
+            return len(self._blobs)
+
+
+# Shared cache so blobs fetched by one scan are reused by the next
+blob_cache = BlobCache(
+    os.getenv("BLOB_CACHE_DIR"),
+    int(os.getenv("BLOB_CACHE_MEMORY_BYTES", DEFAULT_MEMORY_BYTES))
+)
+
+
+@traced("blob_request")
+def _fetch_blob(git_url: str, token: str, max_bytes: int):
+    """
+    Fetch the raw content of a single blob.
+
+    Returns the blob bytes, None if the request failed, or _OVERSIZED if the
+    blob is larger than max_bytes.
+    """
+    headers = {
+        "Accept": "application/vnd.github.raw",
+        "X-GitHub-Api-Version": "2022-11-28",
+        "Authorization": f"Bearer {token}"
+    }
+    # Conditional session: unchanged blobs come back as 304 and cost no rate limit
+    session = get_session()
+    with watchdog.track("blob", git_url):
+        metrics.REQUESTS_SENT.inc(endpoint="blob")
+        request_start = time.monotonic()
+        try:
+            response = session.get(git_url, headers=headers, stream=True, timeout=request_timeouts())
+        except requests.exceptions.RequestException:
+            metrics.REQUEST_ERRORS.inc(endpoint="blob")
+            raise
+        metrics.REQUEST_LATENCY.observe(time.monotonic() - request_start, endpoint="blob")
+        metrics.RESPONSES.inc(endpoint="blob", code=response.status_code)
+        try:
+            if response.status_code != 200:
+                logger.warning(f"Blob fetch failed: HTTP {response.status_code} for {git_url}")
+                return None
+
+            content_length = response.headers.get("Content-Length")
+            if content_length and content_length.isdigit() and int(content_length) > max_bytes:
+                return _OVERSIZED
+
+            body = bytearray()
+            deadline = request_start + request_deadline()
+            for chunk in response.iter_content(chunk_size=_CHUNK_SIZE):
+                body.extend(chunk)
+                if len(body) > max_bytes:
+                    return _OVERSIZED
+                if time.monotonic() > deadline:
+                    metrics.REQUEST_TIMEOUTS.inc(endpoint="blob", phase="deadline")
+                    raise DeadlineExceeded(f"Blob not received within {request_deadline():.0f}s: {git_url}")
+            session.remember(response, bytes(body))
+            return bytes(body)
+        finally:
+            response.close()
+
+
+@traced("fetch_blobs")
+def fetch_blobs(
+    results: Iterable[Union[SearchHit, Dict[str, Any]]],
+    max_workers: int = DEFAULT_FETCH_WORKERS,
+    max_bytes: int = DEFAULT_MAX_BLOB_BYTES,
+    cache: BlobCache = blob_cache,
+    progress_callback: Optional[Callable[[int, int], None]] = None
+) -> Dict[str, str]:
+    """
+    Fetch the full content of every distinct blob in the search results.
+
+    Args:
+        results: Search hits carrying `sha` and `git_url`
+        max_workers: Maximum number of concurrent blob requests
+        max_bytes: Files larger than this are skipped
+        cache: Content-addressed cache to read from and populate
+        progress_callback: Called with (completed, total) as blobs finish
+
+    Returns:
+        Dict mapping blob sha to decoded file content
+    """
+    texts: Dict[str, str] = {}
+    pending: Dict[str, str] = {}
+    for hit in map(as_hit, results):
+        sha = hit.sha
+        git_url = hit.git_url
+        if not sha or not git_url or sha in texts or sha in pending:
+            continue
+        cached = cache.get(sha)
+        if cached is not None:
+            texts[sha] = cached
+        elif not cache.is_skipped(sha):
+            pending[sha] = git_url
+
+    logger.info(f"Blob fetch: {len(texts)} cached, {len(pending)} to fetch")
+    if not pending:
+        return texts
+
+    token_rotator = get_token_rotator()
+    tokens = token_rotator.allocate_tokens(1)
+    if not tokens:
+        logger.error("No tokens available for blob fetching")
+        return texts
+    pool_id = id(threading.current_thread())
+
+    try:
+        completed = 0
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(pending)))) as executor:
+            future_to_sha = {
+                executor.submit(in_scan_context(_fetch_blob), git_url, tokens[0], max_bytes): sha
+                for sha, git_url in pending.items()
+            }
+            for future in as_completed(future_to_sha):
+                sha = future_to_sha[future]
+                completed += 1
+                try:
+                    body = future.result()
+                except requests.exceptions.RequestException as e:
+                    logger.warning(f"Error fetching blob {sha}: {str(e)}")
+                    body = None
+
+                if body is None:
+                    pass
+                elif body is _OVERSIZED or b"\x00" in body[:8192]:
+                    # Oversized or binary content is never worth fetching again
+                    cache.mark_skipped(sha)
+                else:
+                    text = body.decode("utf-8", errors="replace")
+                    cache.put(sha, text)
+                    texts[sha] = text
+
+                if progress_callback:
+                    progress_callback(completed, len(pending))
+    finally:
+        token_rotator.release_tokens(pool_id)
+
+    logger.info(f"Blob fetch complete: {len(texts)} blobs available, HTTP cache: {get_cache_stats()}")
+    return texts
@@ -0,0 +1,60 @@
+"""
+Cooperative cancellation for scans.
+
+A `CancellationToken` is passed from the scan job down through
+`search_github`, `search_github_single` and the extended-search executor.
+Every pause in a scan (retry backoff, rate limit budget and concurrency waits)
+waits on the token instead of sleeping, so a cancel or an expired deadline
+wakes it immediately and the scan returns the results collected so far.
+"""
+
+import threading
+import time
+from typing import Optional
+
+CANCELLED = "cancelled"
+DEADLINE_EXCEEDED = "deadline exceeded"
+
+
+class CancellationToken:
+    """Signals that a scan should stop, either on request or at a deadline."""
+
+    def __init__(self, timeout: Optional[float] = None):
+        """
+        Args:
+            timeout: Seconds from now after which the scan is cancelled (no deadline if None)
+        """
+        self.deadline = time.monotonic() + timeout if timeout else None
+        self._event = threading.Event()
+        self._reason: Optional[str] = None
+
+    def cancel(self, reason: str = CANCELLED) -> None:
+        """Request cancellation and wake every waiting thread"""
+        if self._reason is None:
+            self._reason = reason
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        if not self._event.is_set() and self.deadline is not None and time.monotonic() >= self.deadline:
+            self.cancel(DEADLINE_EXCEEDED)
+        return self._event.is_set()
+
+    @property
+    def reason(self) -> Optional[str]:
+        """Why the scan was cancelled, or None if it was not"""
+        return self._reason if self.cancelled else None
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left until the deadline, or None if there is no deadline"""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def wait(self, seconds: float) -> bool:
+        """Sleep for up to seconds, returning early (True) if the scan is cancelled"""
+        remaining = self.remaining()
+        if remaining is not None and remaining < seconds:
+            self._event.wait(remaining)
+            return self.cancelled
+        return self._event.wait(seconds) or self.cancelled
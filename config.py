@@ -6,6 +6,8 @@ import logging
 from typing import List, Dict
 from concurrent.futures import ThreadPoolExecutor
 import threading
+import metrics
+from log_setup import log_throttled
 
 # Load environment variables
 load_dotenv()
@@ -59,7 +61,10 @@ class TokenRotator:
             pool_id = id(threading.current_thread())
             self._token_pools[pool_id] = allocated_tokens
             
-            logging.info(f"Allocated {len(allocated_tokens)} tokens to pool {pool_id}")
+            metrics.TOKEN_LEASES.inc(len(allocated_tokens))
+            metrics.TOKENS_LEASED.set(sum(len(pool) for pool in self._token_pools.values()))
+            log_throttled(logging.getLogger(__name__), logging.INFO, "token_allocate",
+                          f"Allocated {len(allocated_tokens)} tokens to pool {pool_id}")
             return allocated_tokens
     
     def release_tokens(self, pool_id: int):
@@ -68,7 +73,9 @@ class TokenRotator:
             if pool_id in self._token_pools:
                 released_count = len(self._token_pools[pool_id])
                 del self._token_pools[pool_id]
-                logging.info(f"Released {released_count} tokens from pool {pool_id}")
+                metrics.TOKENS_LEASED.set(sum(len(pool) for pool in self._token_pools.values()))
+                log_throttled(logging.getLogger(__name__), logging.INFO, "token_release",
+                              f"Released {released_count} tokens from pool {pool_id}")
     
     def get_available_token_count(self) -> int:
         """Get the count of available tokens not currently allocated to any pool."""
@@ -0,0 +1,233 @@
+"""
+Indexed local store for processed findings.
+
+Large scans produce tens of thousands of result records, too many to render
+or download in one piece. Findings are persisted to SQLite with indexes on
+repository, pattern, date and path, and the results explorer pages through
+them with server-side filtering and sorting.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FINDINGS_PATH = "findings.sqlite"
+
+# Sortable columns exposed to the UI, mapped to their SQL column
+SORT_COLUMNS = {
+    "Repository": "repository",
+    "File Path": "file_path",
+    "Last Modified": "last_modified",
+    "Found Date": "found_date",
+    "Unique Tokens": "unique_matches",
+}
+
+
+class FindingsStore:
+    """SQLite-backed store of processed result records, keyed by scan."""
+
+    def __init__(self, path: str = DEFAULT_FINDINGS_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        # Sharded workers on several hosts may write to the same store
+        self._conn = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._conn:
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS findings (
+                    id INTEGER PRIMARY KEY,
+                    scan_id TEXT NOT NULL,
+                    pattern TEXT NOT NULL,
+                    repository TEXT,
+                    file_path TEXT,
+                    html_url TEXT,
+                    last_modified TEXT,
+                    found_date TEXT,
+                    found_tokens TEXT NOT NULL,
+                    total_matches INTEGER NOT NULL,
+                    unique_matches INTEGER NOT NULL,
+                    fragments TEXT NOT NULL,
+                    shard_id INTEGER
+                );
+                CREATE INDEX IF NOT EXISTS idx_findings_scan ON findings (scan_id, pattern);
+                CREATE INDEX IF NOT EXISTS idx_findings_repository ON findings (repository COLLATE NOCASE);
+                CREATE INDEX IF NOT EXISTS idx_findings_pattern ON findings (pattern);
+                CREATE INDEX IF NOT EXISTS idx_findings_found_date ON findings (found_date);
+                CREATE INDEX IF NOT EXISTS idx_findings_last_modified ON findings (last_modified);
+                CREATE INDEX IF NOT EXISTS idx_findings_path ON findings (file_path COLLATE NOCASE);
+            """)
+            columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(findings)")}
+            if "shard_id" not in columns:
+                # Stores created before sharded scans wrote their findings
+                self._conn.execute("ALTER TABLE findings ADD COLUMN shard_id INTEGER")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_findings_shard ON findings (scan_id, shard_id)")
+
+    def has_scan(self, scan_id: str, pattern: str) -> bool:
+        """Check whether findings for this scan and pattern are already stored"""
+        with self.lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM findings WHERE scan_id = ? AND pattern = ? LIMIT 1",
+                (scan_id, pattern)
+            ).fetchone()
+        return row is not None
+
+    def add_findings(self, scan_id: str, pattern: str, processed: List[Dict[str, Any]]) -> int:
+        """Store processed result records for a scan and return how many were added"""
+        rows = _finding_rows(scan_id, pattern, processed)
+        with self.lock:
+            with self._conn:
+                self._insert(rows)
+        logger.info(f"Stored {len(rows)} findings for scan {scan_id}")
+        return len(rows)
+
+    def replace_shard_findings(
+        self,
+        scan_id: str,
+        shard_id: int,
+        processed_by_pattern: List[Tuple[str, List[Dict[str, Any]]]]
+    ) -> int:
+        """
+        Store the findings of one shard of a sharded scan, replacing any stored earlier.
+
+        A shard whose lease expired is scanned again by another worker, so the
+        same shard can be written more than once; its findings are kept once.
+
+        Returns:
+            Number of findings now stored for the shard
+        """
+        rows = []
+        for pattern, processed in processed_by_pattern:
+            rows += _finding_rows(scan_id, pattern, processed, shard_id)
+        with self.lock:
+            with self._conn:
+                self._conn.execute("DELETE FROM findings WHERE scan_id = ? AND shard_id = ?", (scan_id, shard_id))
+                self._insert(rows)
+        logger.info(f"Stored {len(rows)} findings for shard {shard_id} of scan {scan_id}")
+        return len(rows)
+
+    def _insert(self, rows: List[Tuple]) -> None:
+        self._conn.executemany("""
+            INSERT INTO findings (scan_id, pattern, repository, file_path, html_url, last_modified,
+                                  found_date, found_tokens, total_matches, unique_matches, fragments, shard_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, rows)
+
+    def query_findings(
+        self,
+        scan_id: Optional[str] = None,
+        pattern: Optional[str] = None,
+        repository: str = "",
+        path: str = "",
+        found_since: Optional[str] = None,
+        sort_by: str = "repository",
+        descending: bool = False,
+        page: int = 1,
+        page_size: int = 25
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        Get one page of findings matching the filters.
+
+        Args:
+            scan_id: Only findings from this scan
+            pattern: Only findings for this pattern
+            repository: Repository name prefix (case-insensitive)
+            path: Substring of the file path (case-insensitive)
+            found_since: Only findings found on or after this YYYY-MM-DD date
+            sort_by: Column from SORT_COLUMNS values
+            descending: Sort order
+            page: 1-based page number
+            page_size: Findings per page
+
+        Returns:
+            Tuple of (findings on the page, total number of matching findings)
+        """
+        if sort_by not in SORT_COLUMNS.values():
+            raise ValueError(f"Unsupported sort column: {sort_by}")
+
+        clauses = []
+        params: List[Any] = []
+        if scan_id:
+            clauses.append("scan_id = ?")
+            params.append(scan_id)
+        if pattern:
+            clauses.append("pattern = ?")
+            params.append(pattern)
+        if repository:
+            clauses.append("repository LIKE ? ESCAPE '\\'")
+            params.append(_escape_like(repository) + "%")
+        if path:
+            clauses.append("file_path LIKE ? ESCAPE '\\'")
+            params.append("%" + _escape_like(path) + "%")
+        if found_since:
+            clauses.append("found_date >= ?")
+            params.append(found_since)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        order = "DESC" if descending else "ASC"
+
+        with self.lock:
+            total = self._conn.execute(f"SELECT COUNT(*) FROM findings {where}", params).fetchone()[0]
+            rows = self._conn.execute(
+                f"SELECT * FROM findings {where} ORDER BY {sort_by} {order}, id LIMIT ? OFFSET ?",
+                params + [page_size, max(0, page - 1) * page_size]
+            ).fetchall()
+
+        findings = []
+        for row in rows:
+            finding = dict(row)
+            finding["found_tokens"] = json.loads(finding["found_tokens"])
+            finding["fragments"] = json.loads(finding["fragments"])
+            findings.append(finding)
+        return findings, total
+
+    def list_patterns(self) -> List[str]:
+        """Get every pattern with stored findings"""
+        with self.lock:
+            return [row[0] for row in self._conn.execute("SELECT DISTINCT pattern FROM findings ORDER BY pattern")]
+
+
+def _finding_rows(scan_id: str, pattern: str, processed: List[Dict[str, Any]],
+                  shard_id: Optional[int] = None) -> List[Tuple]:
+    rows = []
+    for result in processed:
+        try:
+            found_date = datetime.strptime(result.get("found_date", ""), "%d:%m:%Y").strftime("%Y-%m-%d")
+        except ValueError:
+            found_date = None
+        rows.append((
+            scan_id,
+            pattern,
+            result.get("repository"),
+            result.get("file_path"),
+            result.get("html_url"),
+            result.get("last_modified"),
+            found_date,
+            json.dumps(result.get("found_tokens", [])),
+            result.get("total_matches_in_file", 0),
+            result.get("unique_matches_in_file", 0),
+            json.dumps(result.get("fragments", [])),
+            shard_id
+        ))
+    return rows
+
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_findings_store() -> FindingsStore:
+    """Get the shared findings store, opening it on first use"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = FindingsStore(os.getenv("FINDINGS_DB_PATH", DEFAULT_FINDINGS_PATH))
+        return _store
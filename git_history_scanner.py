@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+Git history scanner.
+
+Secrets removed in later commits stay in a repository's history, and GitHub
+code search only indexes the default branch. This scanner reads a local
+clone's object database, loose objects and packfiles alike, through git's
+batch plumbing, and visits every unique blob exactly once keyed by its sha.
+Blobs are scanned in parallel worker processes with the token pattern catalog,
+and hits are mapped back to the commits and paths that introduced them.
+
+Usage:
+    python git_history_scanner.py path/to/clone --pattern-name "GSK Token"
+"""
+
+import argparse
+import atexit
+import logging
+import os
+import subprocess
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from local_scanner import (
+    DEFAULT_MAX_FILE_BYTES,
+    check_patterns,
+    compile_bytes_pattern,
+    is_binary,
+    resolve_pattern,
+    scan_buffer,
+)
+from log_setup import LOG_FORMAT, get_log_level
+from result_processor import add_match_statistics, build_result, save_results
+
+logger = logging.getLogger(__name__)
+
+BLOBS_PER_TASK = 512
+
+# Per-process state set up by _init_worker
+_worker_repo = None
+_worker_regex = None
+_worker_cat_file = None
+
+
+def _git(repo: str, *args: str) -> subprocess.Popen:
+    return subprocess.Popen(
+        ["git", "-C", repo] + list(args),
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL
+    )
+
+
+def iter_blobs(repo: str, max_blob_bytes: int) -> Iterator[Tuple[str, int]]:
+    """
+    Yield (sha, size) for every blob in the object database.
+
+    Each object appears once regardless of how many commits reference it,
+    which gives blob-sha deduplication for free.
+    """
+    process = _git(repo, "cat-file", "--batch-all-objects", "--unordered",
+                   "--batch-check=%(objectname) %(objecttype) %(objectsize)")
+    process.stdin.close()
+    for line in process.stdout:
+        sha, object_type, size = line.decode("ascii").split()
+        if object_type == "blob" and 0 < int(size) <= max_blob_bytes:
+            yield sha, int(size)
+    if process.wait() != 0:
+        raise RuntimeError(f"git cat-file failed for {repo}; is it a git repository?")
+
+
+def _close_cat_file() -> None:
+    if _worker_cat_file and _worker_cat_file.poll() is None:
+        _worker_cat_file.stdin.close()
+        _worker_cat_file.wait()
+
+
+def _init_worker(repo: str, pattern: str) -> None:
+    global _worker_repo, _worker_regex, _worker_cat_file
+    _worker_repo = repo
+    _worker_regex = compile_bytes_pattern(pattern)
+    # One long-lived cat-file process per worker serves every blob it scans
+    _worker_cat_file = _git(repo, "cat-file", "--batch")
+    atexit.register(_close_cat_file)
+
+
+def _read_blob(sha: str) -> bytes:
+    _worker_cat_file.stdin.write(sha.encode("ascii") + b"\n")
+    _worker_cat_file.stdin.flush()
+    header = _worker_cat_file.stdout.readline().split()
+    if len(header) < 3:
+        raise RuntimeError(f"Unexpected cat-file response for {sha}")
+    content = _worker_cat_file.stdout.read(int(header[2]))
+    _worker_cat_file.stdout.read(1)  # Trailing newline
+    return content
+
+
+def _scan_blobs(shas: List[str]) -> Tuple[int, int, List[Tuple[str, List[Any], List[str]]]]:
+    """
+    Scan a batch of blobs in a worker process.
+
+    Returns (blobs scanned, bytes scanned, [(sha, matches, fragments)]).
+    """
+    scanned = 0
+    scanned_bytes = 0
+    hits = []
+    for sha in shas:
+        content = _read_blob(sha)
+        if is_binary(content):
+            continue
+        scanned += 1
+        scanned_bytes += len(content)
+        collected, fragments = scan_buffer(content, _worker_regex)
+        if collected:
+            hits.append((sha, collected, fragments))
+    return scanned, scanned_bytes, hits
+
+
+def _iter_fields(stream, chunk_size: int = 65536) -> Iterator[bytes]:
+    """Yield the NUL-terminated fields of a `git -z` output stream"""
+    pending = b""
+    for chunk in iter(lambda: stream.read(chunk_size), b""):
+        fields = (pending + chunk).split(b"\0")
+        pending = fields.pop()
+        yield from fields
+    if pending:
+        yield pending
+
+
+def map_blobs_to_commits(repo: str, shas: set) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Find the commits and paths that introduced each of the given blobs.
+
+    Walks the raw diff of every commit reachable from any ref once. The output
+    is NUL-separated (-z) so paths come through verbatim, without the quoting
+    and escaping git applies to unusual characters in line-based output.
+    """
+    introductions: Dict[str, List[Dict[str, Any]]] = {sha: [] for sha in shas}
+    if not shas:
+        return introductions
+
+    process = _git(repo, "log", "--all", "--raw", "--no-abbrev", "--no-renames", "-z",
+                   "--format=commit %H %ct")
+    process.stdin.close()
+    commit = None
+    commit_time = None
+    fields = _iter_fields(process.stdout)
+    for raw_field in fields:
+        # A header that follows a commit's raw entries is set off by a newline
+        field = raw_field.decode("utf-8", errors="replace").lstrip("\n")
+        if field.startswith("commit "):
+            _, commit, commit_time = field.split()
+        elif field.startswith(":") and commit:
+            # Without renames every entry is its metadata field followed by one path field
+            path = next(fields, b"").decode("utf-8", errors="replace")
+            new_sha = field.split()[3]
+            if new_sha in introductions:
+                introductions[new_sha].append({
+                    "commit": commit,
+                    "path": path,
+                    "date": datetime.fromtimestamp(int(commit_time), tz=timezone.utc).strftime("%Y-%m-%d %H:%M:%S UTC")
+                })
+    process.wait()
+    return introductions
+
+
+def scan_history(
+    repo: str,
+    pattern: str,
+    workers: Optional[int] = None,
+    max_blob_bytes: int = DEFAULT_MAX_FILE_BYTES
+) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Scan every unique blob in a local clone for the pattern.
+
+    Args:
+        repo: Path to the clone (working tree or bare repository)
+        pattern: Regex pattern from the token catalog or a custom one
+        workers: Number of worker processes (default: one per core)
+        max_blob_bytes: Blobs larger than this are skipped
+
+    Returns:
+        Tuple of (processed results, one per blob, and scan stats)
+
+    Raises:
+        ValueError: If the pattern does not compile
+    """
+    check_patterns([pattern])
+    repo = os.path.abspath(repo)
+    repository = os.path.basename(repo.rstrip(os.sep)) or repo
+    start_time = time.time()
+    stats = {"blobs_scanned": 0, "bytes_scanned": 0}
+
+    shas = [sha for sha, _ in iter_blobs(repo, max_blob_bytes)]
+    stats["blobs_total"] = len(shas)
+    tasks = [shas[i:i + BLOBS_PER_TASK] for i in range(0, len(shas), BLOBS_PER_TASK)]
+
+    hits = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(repo, pattern)) as executor:
+        for scanned, scanned_bytes, task_hits in executor.map(_scan_blobs, tasks):
+            stats["blobs_scanned"] += scanned
+            stats["bytes_scanned"] += scanned_bytes
+            hits.extend(task_hits)
+
+    introductions = map_blobs_to_commits(repo, {sha for sha, _, _ in hits})
+    processed = []
+    for sha, collected, fragments in hits:
+        commits = introductions.get(sha, [])
+        # The oldest introduction is the one that first leaked the content
+        first = commits[-1] if commits else {}
+        result = build_result(
+            repository,
+            first.get("path", ""),
+            None,
+            first.get("date"),
+            collected,
+            fragments
+        )
+        result["blob_sha"] = sha
+        result["commits"] = commits
+        processed.append(result)
+
+    elapsed = max(time.time() - start_time, 1e-9)
+    stats["elapsed_seconds"] = elapsed
+    stats["blobs_per_second"] = stats["blobs_scanned"] / elapsed
+    stats["mb_per_second"] = stats["bytes_scanned"] / (1024 * 1024) / elapsed
+    logger.info(
+        f"History scan of {repo}: {stats['blobs_scanned']} unique blobs, "
+        f"{stats['bytes_scanned'] / (1024 * 1024):.1f} MB in {elapsed:.1f}s "
+        f"({stats['blobs_per_second']:.0f} blobs/s, {stats['mb_per_second']:.1f} MB/s), "
+        f"{len(processed)} blobs with matches"
+    )
+    return add_match_statistics(processed), stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scan every blob in a local clone's history with the token pattern catalog.")
+    parser.add_argument("repo", help="Path to a local clone")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--pattern", help="Regex pattern to search for")
+    group.add_argument("--pattern-name", help="Name of a pattern in token_patterns.json")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: one per core)")
+    parser.add_argument("--max-blob-size", type=float, default=DEFAULT_MAX_FILE_BYTES / (1024 * 1024),
+                        help="Skip blobs larger than this many MB (default: 50)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=get_log_level(), format=LOG_FORMAT)
+    pattern = resolve_pattern(args.pattern, args.pattern_name)
+    try:
+        check_patterns([pattern])
+    except ValueError as e:
+        raise SystemExit(str(e))
+    processed, stats = scan_history(args.repo, pattern, args.workers, int(args.max_blob_size * 1024 * 1024))
+
+    print(f"Scanned {stats['blobs_scanned']} unique blobs ({stats['bytes_scanned'] / (1024 * 1024):.1f} MB) "
+          f"at {stats['blobs_per_second']:.0f} blobs/s, {stats['mb_per_second']:.1f} MB/s")
+    if not processed:
+        print("No matching tokens found.")
+        return
+    tokens_file, detailed_file, save_error = save_results(processed, pattern)
+    if save_error:
+        raise SystemExit(f"Failed to save results: {save_error}")
+    print(f"Found matches in {len(processed)} blobs. Results saved to {tokens_file} and {detailed_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,45 +1,30 @@
 import time
 import requests
-from config import get_token_rotator
+from scheduler import get_scheduler
 import logging
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import FIRST_COMPLETED, wait
 from typing import List, Dict, Any
 import threading
 import streamlit as st
 from queue import Queue
-import threading
-import sys
 from contextlib import contextmanager
+from search_records import DedupCollector, SearchHit
+from cancellation import CancellationToken
+import metrics
+from tracing import span, traced
+from log_setup import log_throttled, setup_logging
+from request_guard import guarded_get
 
-# Configure logging with UTF-8 encoding
-class UTF8StreamHandler(logging.StreamHandler):
-    def emit(self, record):
-        try:
-            msg = self.format(record)
-            stream = self.stream
-            # Write with UTF-8 encoding
-            if sys.version_info >= (3, 7):
-                stream.buffer.write(msg.encode('utf-8'))
-                stream.buffer.write(self.terminator.encode('utf-8'))
-            else:
-                stream.buffer.write(bytes(msg + self.terminator, 'utf-8'))
-            self.flush()
-        except Exception:
-            self.handleError(record)
-
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(message)s',
-    handlers=[
-        UTF8StreamHandler(sys.stdout),
-        logging.FileHandler("github_search.log", encoding='utf-8')
-    ]
-)
+# Logging goes through a queue to a background writer (level from LOG_LEVEL)
+setup_logging()
 logger = logging.getLogger(__name__)
 
 # Initialize thread local storage
 thread_local = threading.local()
 
+# Seconds a cancelled extended search waits for workers to return partial results
+CANCEL_GRACE_SECONDS = 1.0
+
 # Initialize session state for UI updates
 if 'update_queue' not in st.session_state:
     st.session_state.update_queue = Queue()
@@ -118,7 +103,8 @@ def update_error(status_text, error_msg):
         'error_msg': error_msg
     })
 
-def search_github(query: str, limit: int, progress_bar=None, status_text=None, extended=False, cooldown_time=40):
+@traced("search_github")
+def search_github(query: str, limit: int, progress_bar=None, status_text=None, extended=False, cancel_token=None, collector=None, on_budget_wait=None):
     """
     Search GitHub code using the Search API.
     
@@ -127,18 +113,26 @@ def search_github(query: str, limit: int, progress_bar=None, status_text=None, e
     
     Otherwise, run a single query.
     
+    Requests are paced by the shared SearchScheduler: partitions run on its
+    persistent pool and each page goes out as soon as a token has budget.
+    
     Args:
         query: The search query
         limit: Maximum number of results to return
         progress_bar: Streamlit progress bar element to update
         status_text: Streamlit container for status updates
         extended: Whether to use extended search (multiple queries)
-        cooldown_time: Time in seconds to wait between batches (default: 40)
+        cancel_token: CancellationToken that stops the search early; partial results are returned
+        collector: DedupCollector that drops duplicate hits as pages arrive and
+            records per-partition overlap
+        on_budget_wait: Called with the expected wait in seconds when every token's budget is spent
     """
+    cancel_token = cancel_token or CancellationToken()
+    collector = collector or DedupCollector()
+    scheduler = get_scheduler()
     if extended:
         # Include all alphanumeric characters for complete coverage
         partition_chars = [".", "_"] + list("abcdefghijklmnopqrstuvwxyz019")
-        all_results = []
         total_chars = len(partition_chars)
         
         logger.info(f"Starting extended parallel search with {total_chars} filename patterns")
@@ -146,125 +140,65 @@ def search_github(query: str, limit: int, progress_bar=None, status_text=None, e
 📁 **Search Status:**
 Starting extended parallel search with {total_chars} filename patterns...
 (Using all alphanumeric characters to ensure complete coverage)
-Cooldown between batches: {cooldown_time} seconds
+Requests are paced by the remaining rate limit budget of {len(scheduler.budgets)} tokens
 """)
         process_ui_updates()
-
-        # Get token rotator and calculate parallel workers
-        token_rotator = get_token_rotator()
-        total_tokens = token_rotator.get_total_token_count()
-        parallel_workers = min(13, total_tokens - 7)  # Keep 3 tokens in reserve
-        batch_size = min(parallel_workers, 13)  # Limit concurrent requests to avoid connection issues
         
-        if total_tokens < (batch_size + 7):
-            logger.warning(f"Not enough tokens available for optimal parallel processing. Have {total_tokens} tokens, need {batch_size + 3}.")
-            batch_size = max(1, total_tokens - 7)
-            logger.info(f"Adjusted to {batch_size} parallel workers")
-        
-        if batch_size < 1:
-            logger.warning("Not enough tokens available for parallel processing. Falling back to sequential processing.")
-            return search_github(query, limit, progress_bar, status_text, extended=False)
-        
-        # Split patterns into batches
-        pattern_batches = [partition_chars[i:i + batch_size] for i in range(0, len(partition_chars), batch_size)]
+        # Every partition is queued at once; the scheduler decides when each page goes out
+        future_to_pattern = {
+            scheduler.submit(
+                search_github_single,
+                f"{query} filename:{char}",
+                limit,
+                progress_bar=None,
+                status_text=status_text,
+                current_pattern=f"Pattern {char}",
+                cancel_token=cancel_token,
+                collector=collector,
+                partition=f"filename:{char}",
+                on_budget_wait=on_budget_wait
+            ): char for char in partition_chars
+        }
         
-        for batch_idx, batch in enumerate(pattern_batches, 1):
-            logger.info(f"Processing batch {batch_idx}/{len(pattern_batches)} with {len(batch)} patterns")
-            update_markdown(status_text, f"""
-📁 **Batch Status:**
-Processing batch {batch_idx}/{len(pattern_batches)}
-Patterns in this batch: {len(batch)}
-""")
-            # Update overall progress bar based on batch completion
-            if progress_bar:
-                update_progress_bar(progress_bar, batch_idx / len(pattern_batches))
-
-            # Allocate tokens for this batch with retries
-            max_token_retries = 3
-            token_retry_count = 0
-            while token_retry_count < max_token_retries:
-                tokens = token_rotator.allocate_tokens(len(batch))
-                if len(tokens) == len(batch):
-                    break
-                logger.warning(f"Could only allocate {len(tokens)} tokens, needed {len(batch)}. Retrying in 5 seconds...")
-                time.sleep(5)
-                token_retry_count += 1
-            
-            if not tokens:
-                logger.error("Failed to allocate any tokens for batch")
-                continue
-            
-            if len(tokens) < len(batch):
-                logger.warning(f"Could only allocate {len(tokens)} tokens. Reducing batch size.")
-                batch = batch[:len(tokens)]
-            
-            # Process patterns in parallel with connection retries
-            batch_results = []
-            with ThreadPoolExecutor(max_workers=len(batch)) as executor:
-                future_to_pattern = {
-                    executor.submit(
-                        search_github_single,
-                        f"{query} filename:{char}",
-                        limit,
-                        progress_bar,
-                        status_text,
-                        f"Pattern {char} in batch {batch_idx}",
-                        token
-                    ): char for char, token in zip(batch, tokens)
-                }
-                
-                completed = 0
-                for future in as_completed(future_to_pattern):
-                    pattern = future_to_pattern[future]
-                    try:
-                        results = future.result()
-                        batch_results.extend(results)
-                        completed += 1
-                        
-                        update_markdown(status_text, f"""
+        completed = 0
+        new_results = 0
+        pending = set(future_to_pattern)
+        while pending:
+            # Poll so a cancel is noticed even while every partition is busy
+            done, pending = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+            if cancel_token.cancelled and pending:
+                # Give partitions a moment to hand back their partial results, then stop waiting
+                finished, pending = wait(pending, timeout=CANCEL_GRACE_SECONDS)
+                done |= finished
+            for future in done:
+                pattern = future_to_pattern[future]
+                try:
+                    # Only hits no other partition returned first
+                    new_results += len(future.result())
+                    completed += 1
+                    
+                    update_markdown(status_text, f"""
 📁 **Progress Status:**
-Batch {batch_idx}/{len(pattern_batches)}
-Completed patterns: {completed}/{len(batch)}
-Total results so far: {len(batch_results)}
+Completed patterns: {completed}/{total_chars}
+Unique results so far: {new_results}
 """)
-                            
-                    except Exception as e:
-                        logger.error(f"Error processing pattern '{pattern}': {str(e)}")
-            
-            # Release tokens back to the pool
-            token_rotator.release_tokens(id(threading.current_thread()))
-            
-            # Add batch results to all results
-            all_results.extend(batch_results)
-            
-            # Add a cooldown period between batches
-            if batch_idx < len(pattern_batches):
-                cooldown_msg = f"Batch complete. Cooling down for {cooldown_time} seconds before next batch..."
-                logger.info(cooldown_msg)
-                update_markdown(status_text, f"""
-⏳ **Cooldown:**
-{cooldown_msg}
-""")
-                time.sleep(cooldown_time)  # Using the configurable cooldown time
+                    if progress_bar:
+                        update_progress_bar(progress_bar, completed / total_chars)
+                except Exception as e:
+                    logger.error(f"Error processing pattern '{pattern}': {str(e)}")
+            if cancel_token.cancelled:
+                break
         
-        # Deduplicate results by unique (repository, file path) combination
-        deduped = {}
-        for item in all_results:
-            repo = item.get("repository", {}).get("full_name", "")
-            path = item.get("path", "")
-            key = (repo, path)
-            if key not in deduped:
-                deduped[key] = item
-                
-        final_results = list(deduped.values())
+        # Duplicates were dropped by the collector as pages arrived
+        final_results = collector.results()
+        total_fetched = collector.fetched
         summary_msg = f"""
 Extended parallel search completed:
-• Total results found (including duplicates): {len(all_results)}
+• Total results found (including duplicates): {total_fetched}
 • Total unique results (after deduplication): {len(final_results)}
-• Total patterns processed: {total_chars}
-• Total batches: {len(pattern_batches)}
-• Parallel workers per batch: {batch_size}
-• Average results per pattern: {len(all_results) / total_chars:.2f}
+• Total patterns processed: {completed}/{total_chars}
+• Final search concurrency: {int(scheduler.limiter.limit)}
+• Average results per pattern: {total_fetched / total_chars:.2f}
 (Duplicates happen when the same file matches in multiple pattern searches)
 """
         logger.info(summary_msg)
@@ -274,199 +208,229 @@ Extended parallel search completed:
         process_ui_updates()  # Process any queued updates
         return final_results
     else:
-        return search_github_single(query, limit, progress_bar, status_text)
+        return search_github_single(query, limit, progress_bar, status_text, cancel_token=cancel_token, collector=collector,
+                                    on_budget_wait=on_budget_wait)
 
-def search_github_single(query: str, limit: int, progress_bar=None, status_text=None, current_pattern="", token=None):
+@traced("search_github_single")
+def search_github_single(query: str, limit: int, progress_bar=None, status_text=None, current_pattern="", cancel_token=None, stop_when=None, collector=None, partition="", on_budget_wait=None):
+    """
+    Fetch the pages of one search query.
+
+    Each page request leases a token with budget from the shared SearchScheduler,
+    which waits for the rate limit to recover when every token is spent, and
+    goes through `request_guard.guarded_get`, so a stuck connection times out
+    and is retried instead of hanging the partition.
+
+    stop_when, if given, is called with the hits of each page as it arrives and
+    stops paging when it returns True (e.g. once already-seen results appear in
+    an indexed-order query).
+
+    If a DedupCollector is given, each page goes through it under the partition
+    name and only hits it has not collected before are returned.
+
+    on_budget_wait, if given, is called with the expected wait in seconds
+    whenever every token's budget is spent, so the UI can show it.
+    """
+    cancel_token = cancel_token or CancellationToken()
+    scheduler = get_scheduler()
+    if not scheduler.budgets:
+        error_msg = "No tokens available for allocation"
+        logger.error(error_msg)
+        update_error(status_text, error_msg)
+        return []
     base_url = "https://api.github.com/search/code"
     session = requests.Session()  # Use session for connection pooling
+    token_msg = "Waiting for a token with rate limit budget"
     
-    token_allocated_internally = False
-    pool_id_internal = None
-    token_rotator = get_token_rotator() # Get rotator instance
-
-    # Use provided token or get from rotator
-    if token is None:
-        allocated_tokens = token_rotator.allocate_tokens(1)
-        if not allocated_tokens:  # No tokens available
-            error_msg = "No tokens available for allocation"
-            logger.error(error_msg)
-            update_error(status_text, error_msg)
-            return []
-        token = allocated_tokens[0]
-        token_allocated_internally = True
-        pool_id_internal = id(threading.current_thread()) # associate with current thread
+    def report_budget_wait(seconds):
+        update_status(status_text, current_pattern, token_msg,
+                      f"⏳ Cooling down for {int(seconds) + 1} seconds until the rate limit budget resets")
+        if on_budget_wait:
+            on_budget_wait(seconds)
     
-    try:
-        # Mask token for logging (without emoji)
-        masked_token = f"...{token[-8:]}"
-        token_msg = f"Using GitHub token: {masked_token}"
-        logger.info(token_msg)
-        update_status(status_text, current_pattern, token_msg)
-        process_ui_updates()
-        
-        # Configure session with retry strategy
-        session.mount('https://', requests.adapters.HTTPAdapter(
-            max_retries=requests.adapters.Retry(
-                total=5,
-                backoff_factor=1,
-                status_forcelist=[500, 502, 503, 504]
-            )
-        ))
+    # Configure session with retry strategy
+    session.mount('https://', requests.adapters.HTTPAdapter(
+        max_retries=requests.adapters.Retry(
+            total=5,
+            backoff_factor=1,
+            status_forcelist=[500, 502, 503, 504]
+        )
+    ))
 
-        # Extract sort parameters from query if present
-        sort_param = None
-        order_param = "desc"
-        if " sort:" in query:
-            sort_parts = query.split(" sort:")[1].split(" ")[0].split("-")
-            if len(sort_parts) == 2:
-                sort_param = sort_parts[0]
-                order_param = sort_parts[1]
-            query = query.split(" sort:")[0]
+    # Extract sort parameters from query if present
+    sort_param = None
+    order_param = "desc"
+    if " sort:" in query:
+        sort_parts = query.split(" sort:")[1].split(" ")[0].split("-")
+        if len(sort_parts) == 2:
+            sort_param = sort_parts[0]
+            order_param = sort_parts[1]
+        query = query.split(" sort:")[0]
 
-        # Determine per_page based on limit
-        if isinstance(limit, int) and limit > 0:
-            per_page_val = min(100, limit) 
-        else: # Handles "all" or other non-positive int cases, defaults to max per_page
-            per_page_val = 100
+    # Determine per_page based on limit
+    if isinstance(limit, int) and limit > 0:
+        per_page_val = min(100, limit) 
+    else: # Handles "all" or other non-positive int cases, defaults to max per_page
+        per_page_val = 100
 
-        params = {
-            "q": query,
-            "per_page": per_page_val
-        }
-        if sort_param:
-            params["sort"] = sort_param
-            params["order"] = order_param
+    params = {
+        "q": query,
+        "per_page": per_page_val
+    }
+    if sort_param:
+        params["sort"] = sort_param
+        params["order"] = order_param
 
-        headers = {
-            "Accept": "application/vnd.github.v3.text-match+json",
-            "X-GitHub-Api-Version": "2022-11-28",
-            "Authorization": f"Bearer {token}"
-        }
+    headers = {
+        "Accept": "application/vnd.github.v3.text-match+json",
+        "X-GitHub-Api-Version": "2022-11-28"
+    }
 
-        results = []
-        page = 1
-        total_fetched = 0
-        max_retries = 10
-        initial_retry_delay = 2
-        current_token = token  # Initialize current_token with the provided or allocated token
+    results = []
+    page = 1
+    total_fetched = 0
+    max_retries = 10
+    initial_retry_delay = 2
+    response = None
 
-        while True:
-            params["page"] = page
-            retry_count = 0
-            retry_delay = initial_retry_delay
+    while not cancel_token.cancelled:
+        params["page"] = page
+        page_hits = []
+        retry_count = 0
+        retry_delay = initial_retry_delay
 
-            while retry_count < max_retries:
+        while retry_count < max_retries and not cancel_token.cancelled:
+            try:
+                # Lease the token with the most budget left, waiting if all are spent
+                with span("budget_wait"):
+                    current_token = scheduler.acquire(cancel_token, report_budget_wait)
+                if current_token is None:
+                    break
+                # Mask token for logging (without emoji)
+                masked_token = f"...{current_token[-8:]}"
+                token_msg = f"Using GitHub token: {masked_token}"
+                log_throttled(logger, logging.INFO, "token_use", token_msg)
+                headers["Authorization"] = f"Bearer {current_token}"
+                
+                response = None
+                rate_limited = False
+                metrics.REQUESTS_SENT.inc(endpoint="search")
+                request_start = time.monotonic()
                 try:
-                    # Only get a new token if we've retried more than once with the current token
-                    if retry_count > 0:
-                        token_rotator = get_token_rotator()
-                        tokens = token_rotator.allocate_tokens(1)
-                        if not tokens:  # No tokens available
-                            error_msg = "No tokens available for retry"
-                            logger.error(error_msg)
-                            update_error(status_text, error_msg)
-                            time.sleep(retry_delay)
-                            retry_delay *= 2
-                            retry_count += 1
-                            continue
-                        current_token = tokens[0]
-                        # Mask token for logging (without emoji)
-                        masked_token = f"...{current_token[-8:]}"
-                        token_msg = f"Switching to new token: {masked_token}"
-                        logger.info(token_msg)
-                        update_status(status_text, current_pattern, token_msg)
-                    
-                    headers["Authorization"] = f"Bearer {current_token}"
+                    with span("http_request", page=page):
+                        # Connect/read timeouts, a total deadline and the stall watchdog; hedged if enabled
+                        response = guarded_get(session, base_url, "search", f"{partition or query} page {page}",
+                                               scheduler=scheduler, headers=headers, params=params)
+                except requests.exceptions.RequestException:
+                    metrics.REQUEST_ERRORS.inc(endpoint="search")
+                    raise
+                finally:
+                    # Feeds the token's budget and the adaptive concurrency limit
+                    rate_limited = scheduler.release(current_token, response)
+                metrics.REQUEST_LATENCY.observe(time.monotonic() - request_start, endpoint="search")
+                metrics.RESPONSES.inc(endpoint="search", code=response.status_code)
+                
+                if response.status_code == 200:
+                    with span("json_decode"):
+                        data = response.json()
+                    items = data.get("items", [])
+                    # Keep only the fields result processing needs, drop the raw payload
+                    page_hits = [SearchHit.from_item(item) for item in items]
+                    if isinstance(limit, int) and limit > 0:
+                        page_hits = page_hits[:max(0, limit - total_fetched)]
+                    results.extend(collector.add(partition or query, page_hits) if collector else page_hits)
+                    total_fetched += len(items)
+                    metrics.PAGES_FETCHED.inc()
+                    metrics.ITEMS_FETCHED.inc(len(items))
                     
-                    time.sleep(1)  # Basic rate limit protection
-                    response = session.get(base_url, headers=headers, params=params)
+                    progress_msg = f"Progress: {total_fetched} results (page {page}, +{len(items)} items)"
+                    log_throttled(logger, logging.INFO, f"progress:{query}", progress_msg)
+                    # Keep emoji only in UI updates, not in logs
+                    update_status(status_text, current_pattern, token_msg, f"📊 {progress_msg}")
+                    if progress_bar and isinstance(limit, int) and limit > 0: # Check if limit is a positive int
+                        update_progress_bar(progress_bar, min(total_fetched / limit, 1.0))
                     
-                    if response.status_code == 200:
-                        data = response.json()
-                        items = data.get("items", [])
-                        results.extend(items)
-                        total_fetched += len(items)
-                        
-                        progress_msg = f"Progress: {total_fetched} results (page {page}, +{len(items)} items)"
-                        logger.info(progress_msg)
-                        # Keep emoji only in UI updates, not in logs
-                        update_status(status_text, current_pattern, token_msg, f"📊 {progress_msg}")
-                        if progress_bar and isinstance(limit, int) and limit > 0: # Check if limit is a positive int
-                            update_progress_bar(progress_bar, min(total_fetched / limit, 1.0))
-                        
-                        break
-                    elif response.status_code == 403:
-                        error_msg = f"Rate limit hit with token {masked_token}, attempt ({retry_count + 1}/{max_retries})"
-                        if retry_count > 1:
-                            error_msg += " - Will try with next token"
-                        logger.warning(error_msg)
-                        # Keep emoji only in UI updates
-                        update_status(status_text, current_pattern, token_msg, f"⚠️ {error_msg}")
-                        time.sleep(retry_delay)
-                        retry_delay *= 2
-                        retry_count += 1
-                        continue
-                    else:
-                        error_msg = f"Error: HTTP {response.status_code} - {response.text}"
-                        logger.error(error_msg)
-                        # Keep emoji only in UI updates
-                        update_error(status_text, f"❌ {error_msg}")
-                        break
-                except requests.exceptions.JSONDecodeError as jde:
-                    logger.error(f"JSON Decode Error: {str(jde)} for query: {query} - Response text: {response.text if 'response' in locals() else 'Response object not available'}", exc_info=True)
-                    update_error(status_text, f"❌ Error decoding API response: {str(jde)}")
-                    # Decide if this is a retryable offense or break. Usually indicates malformed response.
-                    break # Assuming malformed JSON means we can't proceed with this request.
-                except requests.exceptions.RequestException as re: # More specific for network/request related issues
-                    if retry_count < max_retries:
-                        error_msg = f"⚠️ Request Exception, retrying... ({retry_count + 1}/{max_retries}): {str(re)}"
-                        logger.error(error_msg, exc_info=True)
-                        update_status(status_text, current_pattern, token_msg, error_msg)
-                        time.sleep(retry_delay)
-                        retry_delay *= 2
-                        retry_count += 1
-                        continue
-                    else:
-                        error_msg = f"❌ Request Exception: {str(re)}"
-                        logger.error(error_msg, exc_info=True)
-                        update_error(status_text, error_msg)
-                        break
-                except Exception as e: # General catch-all for other unexpected errors
-                    if retry_count < max_retries:
-                        error_msg = f"⚠️ Unexpected error, retrying... ({retry_count + 1}/{max_retries}): {str(e)}"
-                        logger.error(error_msg, exc_info=True)
-                        update_status(status_text, current_pattern, token_msg, error_msg)
-                        time.sleep(retry_delay)
-                        retry_delay *= 2
-                        retry_count += 1
-                        continue
-                    else:
-                        error_msg = f"❌ Unexpected error: {str(e)}"
-                        logger.error(error_msg, exc_info=True)
-                        update_error(status_text, error_msg)
-                        break
+                    break
+                elif rate_limited:
+                    # The scheduler rests this token until its budget recovers, the retry leases another
+                    error_msg = f"Rate limit hit with token {masked_token}, attempt ({retry_count + 1}/{max_retries})"
+                    logger.warning(error_msg)
+                    # Keep emoji only in UI updates
+                    update_status(status_text, current_pattern, token_msg, f"⚠️ {error_msg}")
+                    metrics.RATE_LIMIT_WAITS.inc()
+                    metrics.RETRIES.inc()
+                    retry_count += 1
+                    continue
+                else:
+                    error_msg = f"Error: HTTP {response.status_code} - {response.text}"
+                    logger.error(error_msg)
+                    # Keep emoji only in UI updates
+                    update_error(status_text, f"❌ {error_msg}")
+                    break
+            except requests.exceptions.JSONDecodeError as jde:
+                logger.error(f"JSON Decode Error: {str(jde)} for query: {query} - Response text: {response.text if response is not None else 'Response object not available'}", exc_info=True)
+                update_error(status_text, f"❌ Error decoding API response: {str(jde)}")
+                # Decide if this is a retryable offense or break. Usually indicates malformed response.
+                break # Assuming malformed JSON means we can't proceed with this request.
+            except requests.exceptions.RequestException as re: # More specific for network/request related issues
+                if retry_count < max_retries:
+                    error_msg = f"⚠️ Request Exception, retrying... ({retry_count + 1}/{max_retries}): {str(re)}"
+                    logger.error(error_msg, exc_info=True)
+                    update_status(status_text, current_pattern, token_msg, error_msg)
+                    with span("retry_wait"):
+                        cancel_token.wait(retry_delay)
+                    retry_delay *= 2
+                    metrics.RETRIES.inc()
+                    retry_count += 1
+                    continue
+                else:
+                    error_msg = f"❌ Request Exception: {str(re)}"
+                    logger.error(error_msg, exc_info=True)
+                    update_error(status_text, error_msg)
+                    break
+            except Exception as e: # General catch-all for other unexpected errors
+                if retry_count < max_retries:
+                    error_msg = f"⚠️ Unexpected error, retrying... ({retry_count + 1}/{max_retries}): {str(e)}"
+                    logger.error(error_msg, exc_info=True)
+                    update_status(status_text, current_pattern, token_msg, error_msg)
+                    with span("retry_wait"):
+                        cancel_token.wait(retry_delay)
+                    retry_delay *= 2
+                    metrics.RETRIES.inc()
+                    retry_count += 1
+                    continue
+                else:
+                    error_msg = f"❌ Unexpected error: {str(e)}"
+                    logger.error(error_msg, exc_info=True)
+                    update_error(status_text, error_msg)
+                    break
 
-            if retry_count >= max_retries:
-                warning_msg = "⚠️ Max retries reached, moving to next page..."
-                logger.warning(warning_msg)
-                update_status(status_text, current_pattern, token_msg, warning_msg)
-                break
+        if cancel_token.cancelled or response is None:
+            break
 
-            if limit != "all" and total_fetched >= limit:
-                results = results[:limit]
-                break
-            
-            if not response.links.get("next"):
-                break
-            
-            page += 1
+        if retry_count >= max_retries:
+            warning_msg = "⚠️ Max retries reached, moving to next page..."
+            logger.warning(warning_msg)
+            update_status(status_text, current_pattern, token_msg, warning_msg)
+            break
 
+        if limit != "all" and total_fetched >= limit:
+            results = results[:limit]
+            break
+
+        if stop_when and stop_when(page_hits):
+            break
+        
+        if not response.links.get("next"):
+            break
+        
+        page += 1
+
+    if cancel_token.cancelled:
+        final_msg = f"Search stopped ({cancel_token.reason}). Partial results: {len(results)}"
+    else:
         final_msg = f"Search completed. Total results: {len(results)}"
-        logger.info(final_msg)
-        update_status(status_text, current_pattern, token_msg, f"✅ {final_msg}")
-        process_ui_updates()
-        return results
-    finally:
-        if token_allocated_internally and pool_id_internal is not None:
-            token_rotator.release_tokens(pool_id_internal)
-            logger.info(f"Internally allocated token released for pool {pool_id_internal} in search_github_single")
+    logger.info(final_msg)
+    update_status(status_text, current_pattern, token_msg, f"✅ {final_msg}")
+    process_ui_updates()
+    return results
@@ -0,0 +1,212 @@
+"""
+Conditional-request cache for non-search GitHub REST endpoints.
+
+Responses are stored together with their ETag / Last-Modified validators in a
+local SQLite file. Later requests for the same URL are sent with
+If-None-Match / If-Modified-Since, and a 304 Not Modified answer is served from
+the local store. GitHub does not count 304 responses against the core rate
+limit, so repeated scans stop spending budget on unchanged resources.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = "github_http_cache.sqlite"
+MAX_CACHED_BODY_BYTES = 5 * 1024 * 1024
+
+# Search results change constantly and are never worth revalidating
+_UNCACHED_PREFIXES = ("/search/",)
+
+
+def endpoint_key(url: str) -> str:
+    """Reduce a request URL to an endpoint template such as /repos/:owner/:repo/git/blobs"""
+    segments = [s for s in urlsplit(url).path.split("/") if s]
+    if not segments:
+        return "/"
+    if segments[0] == "repos" and len(segments) >= 3:
+        rest = segments[3:]
+        depth = 2 if rest and rest[0] == "git" else 1
+        return "/".join(["/repos/:owner/:repo"] + rest[:depth])
+    if segments[0] in ("users", "orgs") and len(segments) >= 2:
+        return f"/{segments[0]}/:name" + "".join(f"/{s}" for s in segments[2:3])
+    return f"/{segments[0]}"
+
+
+class ConditionalCache:
+    """SQLite store of response bodies and validators with per-endpoint statistics."""
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.stats: Dict[str, Dict[str, int]] = {}
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    cache_key TEXT PRIMARY KEY,
+                    etag TEXT,
+                    last_modified TEXT,
+                    status INTEGER NOT NULL,
+                    headers TEXT NOT NULL,
+                    body BLOB NOT NULL,
+                    stored_at REAL NOT NULL
+                )
+            """)
+
+    def lookup(self, cache_key: str) -> Optional[Dict[str, Any]]:
+        """Get the stored response for a cache key"""
+        with self.lock:
+            row = self._conn.execute(
+                "SELECT etag, last_modified, status, headers, body FROM responses WHERE cache_key = ?",
+                (cache_key,)
+            ).fetchone()
+        if not row:
+            return None
+        return {
+            "etag": row[0],
+            "last_modified": row[1],
+            "status": row[2],
+            "headers": json.loads(row[3]),
+            "body": bytes(row[4])
+        }
+
+    def store(self, cache_key: str, response: requests.Response, body: bytes) -> None:
+        """Store a response body if it carries a validator"""
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if not (etag or last_modified) or len(body) > MAX_CACHED_BODY_BYTES:
+            return
+        headers = {k: v for k, v in response.headers.items()
+                   if k.lower() not in ("content-encoding", "transfer-encoding", "content-length")}
+        with self.lock:
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (cache_key, etag, last_modified, response.status_code,
+                     json.dumps(headers), sqlite3.Binary(body), time.time())
+                )
+
+    def record(self, endpoint: str, hit: bool, bytes_saved: int = 0) -> None:
+        """Count a revalidated request for an endpoint"""
+        with self.lock:
+            stats = self.stats.setdefault(endpoint, {"requests": 0, "hits": 0, "misses": 0, "bytes_saved": 0})
+            stats["requests"] += 1
+            stats["hits" if hit else "misses"] += 1
+            stats["bytes_saved"] += bytes_saved
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Get per-endpoint request counts, hit ratios and bytes saved"""
+        with self.lock:
+            return {
+                endpoint: dict(stats, hit_ratio=stats["hits"] / stats["requests"] if stats["requests"] else 0.0)
+                for endpoint, stats in self.stats.items()
+            }
+
+
+class ConditionalSession(requests.Session):
+    """
+    A requests session that revalidates GET requests against a ConditionalCache.
+
+    Non-streamed 200 responses are stored automatically. Callers that stream a
+    body should hand it back through remember() once it has been read.
+    """
+
+    def __init__(self, cache: ConditionalCache):
+        super().__init__()
+        self.cache = cache
+
+    @staticmethod
+    def cache_key(url: str, params=None, headers=None) -> str:
+        prepared = requests.PreparedRequest()
+        prepared.prepare_url(url, params)
+        accept = (headers or {}).get("Accept", "")
+        return f"{prepared.url} {accept}"
+
+    def request(self, method, url, params=None, headers=None, **kwargs):
+        if method.upper() != "GET" or urlsplit(url).path.startswith(_UNCACHED_PREFIXES):
+            return super().request(method, url, params=params, headers=headers, **kwargs)
+
+        key = self.cache_key(url, params, headers)
+        entry = self.cache.lookup(key)
+        headers = dict(headers or {})
+        if entry:
+            if entry["etag"]:
+                headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"]:
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        response = super().request(method, url, params=params, headers=headers, **kwargs)
+        endpoint = endpoint_key(url)
+
+        if response.status_code == 304 and entry:
+            self.cache.record(endpoint, hit=True, bytes_saved=len(entry["body"]))
+            response.close()
+            return self._from_cache(response, entry)
+
+        self.cache.record(endpoint, hit=False)
+        response.cache_key = key
+        if response.status_code == 200 and not kwargs.get("stream"):
+            self.cache.store(key, response, response.content)
+        return response
+
+    def remember(self, response: requests.Response, body: bytes) -> None:
+        """Store the body of a streamed response once the caller has read it"""
+        key = getattr(response, "cache_key", None)
+        if key and response.status_code == 200 and not getattr(response, "from_cache", False):
+            self.cache.store(key, response, body)
+
+    @staticmethod
+    def _from_cache(response: requests.Response, entry: Dict[str, Any]) -> requests.Response:
+        """Build a 200 response from a stored entry"""
+        cached = requests.Response()
+        cached.status_code = entry["status"]
+        cached.reason = "OK"
+        cached.headers = CaseInsensitiveDict(entry["headers"])
+        cached.headers["Content-Length"] = str(len(entry["body"]))
+        cached._content = entry["body"]
+        cached._content_consumed = True
+        cached.url = response.url
+        cached.request = response.request
+        cached.encoding = requests.utils.get_encoding_from_headers(cached.headers)
+        cached.from_cache = True
+        return cached
+
+
+# Shared cache for every conditional session in the process, opened on first use
+_http_cache = None
+_http_cache_lock = threading.Lock()
+
+thread_local = threading.local()
+
+
+def get_http_cache() -> ConditionalCache:
+    """Get the process-wide conditional cache, creating its SQLite file on first use"""
+    global _http_cache
+    with _http_cache_lock:
+        if _http_cache is None:
+            _http_cache = ConditionalCache(os.getenv("HTTP_CACHE_PATH", DEFAULT_CACHE_PATH))
+        return _http_cache
+
+
+def get_session() -> ConditionalSession:
+    """Get a conditional session for the current thread, backed by the shared cache"""
+    if not hasattr(thread_local, "session"):
+        thread_local.session = ConditionalSession(get_http_cache())
+    return thread_local.session
+
+
+def get_cache_stats() -> Dict[str, Dict[str, Any]]:
+    """Get per-endpoint hit ratios and bytes saved for the shared cache"""
+    # Asking for statistics should not create the cache file when nothing has been fetched yet
+    return _http_cache.get_stats() if _http_cache is not None else {}
@@ -0,0 +1,168 @@
+"""
+Concurrent scan jobs with isolated state.
+
+Each scan runs as a job with its own `ThreadSafeState`, so several scans can
+run in one process and every browser session can attach to any of them
+without sharing progress or results. Jobs wait in a priority queue until one
+of the MAX_CONCURRENT_SCANS job slots is free. Search API requests from all
+jobs additionally go through the process-wide `SearchScheduler`, which
+shares the token budgets and the MAX_CONCURRENT_REQUESTS limit between jobs,
+so a large job cannot starve the others of requests.
+"""
+
+import heapq
+import itertools
+import logging
+import os
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from cancellation import CancellationToken
+from thread_safe_api import ThreadSafeState, thread_safe_search_github
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_CONCURRENT_SCANS = 2
+# Finished jobs kept for attaching to, oldest are dropped first
+MAX_FINISHED_JOBS = 20
+
+
+@dataclass
+class ScanJob:
+    """A queued, running or finished scan and its state."""
+    job_id: str
+    label: str
+    pattern: str
+    priority: int
+    search_args: Dict[str, Any]
+    state: ThreadSafeState = field(default_factory=ThreadSafeState)
+    cancel_token: CancellationToken = field(default_factory=CancellationToken)
+    submitted_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    thread: Optional[threading.Thread] = None
+    error: Optional[str] = None
+
+    @property
+    def status(self) -> str:
+        if self.started_at is None:
+            return "queued"
+        if self.finished_at is None:
+            return "cancelling" if self.cancel_token.cancelled else "running"
+        if self.error:
+            return "failed"
+        return self.cancel_token.reason or "finished"
+
+
+class JobManager:
+    """Runs scan jobs by priority with a global limit on concurrent scans."""
+
+    def __init__(self, max_concurrent_scans: int = DEFAULT_MAX_CONCURRENT_SCANS):
+        self.max_concurrent_scans = max(1, max_concurrent_scans)
+        self.lock = threading.Lock()
+        self.jobs: Dict[str, ScanJob] = {}
+        # (-priority, submission order, job id), so higher priority runs first and ties run in order
+        self.queue: List[Tuple[int, int, str]] = []
+        self.sequence = itertools.count()
+        self.running = 0
+
+    def submit(self, label: str, pattern: str, priority: int = 0, deadline: Optional[float] = None,
+               **search_args) -> ScanJob:
+        """
+        Queue a scan and start it as soon as a job slot is free.
+
+        Args:
+            label: Name shown in the job list
+            pattern: Regex pattern the job's results are matched against
+            priority: Jobs with a higher priority are started first
+            deadline: Seconds after submission at which the scan is stopped (no deadline if None)
+            search_args: Keyword arguments for thread_safe_search_github
+
+        Returns:
+            The new job
+        """
+        job = ScanJob(uuid.uuid4().hex[:8], label, pattern, priority, search_args,
+                      cancel_token=CancellationToken(deadline))
+        job.state.reset()
+        with self.lock:
+            self.jobs[job.job_id] = job
+            heapq.heappush(self.queue, (-priority, next(self.sequence), job.job_id))
+            self._prune_finished()
+        logger.info(f"Queued scan job {job.job_id} ({label}) with priority {priority}")
+        self._dispatch()
+        return job
+
+    def cancel(self, job_id: str) -> None:
+        """Cancel a job; a running scan stops within about a second and keeps its partial results"""
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return
+            job.cancel_token.cancel()
+            if job.started_at is None:
+                # Never started, so it is finished as soon as it leaves the queue
+                job.started_at = job.finished_at = time.time()
+                job.state.set_results([])
+        logger.info(f"Cancelled scan job {job_id}")
+
+    def get_job(self, job_id: Optional[str]) -> Optional[ScanJob]:
+        with self.lock:
+            return self.jobs.get(job_id) if job_id else None
+
+    def list_jobs(self) -> List[ScanJob]:
+        """Get all jobs, newest first"""
+        with self.lock:
+            return sorted(self.jobs.values(), key=lambda job: job.submitted_at, reverse=True)
+
+    def _dispatch(self) -> None:
+        """Start queued jobs while job slots are free"""
+        with self.lock:
+            while self.queue and self.running < self.max_concurrent_scans:
+                _, _, job_id = heapq.heappop(self.queue)
+                job = self.jobs.get(job_id)
+                if job is None or job.started_at is not None:
+                    continue
+                self.running += 1
+                job.started_at = time.time()
+                job.state.set_running(True)
+                job.thread = threading.Thread(target=self._run, args=(job,), name=f"scan-{job_id}", daemon=True)
+                job.thread.start()
+
+    def _run(self, job: ScanJob) -> None:
+        try:
+            thread_safe_search_github(state=job.state, cancel_token=job.cancel_token, **job.search_args)
+        except Exception as e:
+            logger.error(f"Error in scan job {job.job_id}: {str(e)}", exc_info=True)
+            job.state.set_error(f"An unexpected error occurred: {str(e)}")
+        finally:
+            job.state.set_running(False)
+            with self.lock:
+                job.error = job.state.get_error()
+                job.finished_at = time.time()
+                self.running -= 1
+            logger.info(f"Scan job {job.job_id} {job.status}")
+            self._dispatch()
+
+    def _prune_finished(self) -> None:
+        finished = sorted(
+            (job for job in self.jobs.values() if job.finished_at is not None),
+            key=lambda job: job.finished_at
+        )
+        for job in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self.jobs[job.job_id]
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_job_manager() -> JobManager:
+    """Get the process-wide job manager shared by all sessions"""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = JobManager(int(os.getenv("MAX_CONCURRENT_SCANS", DEFAULT_MAX_CONCURRENT_SCANS)))
+        return _manager
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+Local filesystem scanner.
+
+Runs the token pattern catalog against a checked-out repository or a build
+artifact directory without any API calls. Files are scanned in parallel
+across cores, large files are memory-mapped instead of being copied into
+Python strings, and binary or oversized files are skipped. Findings use the
+same record format as `process_results`, so they can be saved and reviewed
+with the same tools.
+
+Usage:
+    python local_scanner.py PATH --pattern-name "GSK Token"
+    python local_scanner.py PATH --pattern "gsk_[A-Za-z0-9]{52}"
+"""
+
+import argparse
+import logging
+import mmap
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from log_setup import LOG_FORMAT, get_log_level
+from result_processor import add_match_statistics, build_result, save_results
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_FILE_BYTES = 50 * 1024 * 1024
+MMAP_THRESHOLD = 1024 * 1024  # Files at least this large are memory-mapped
+BINARY_SNIFF_BYTES = 8192
+FRAGMENT_CONTEXT = 80  # Characters of context kept on each side of a match
+MAX_FRAGMENTS_PER_FILE = 20
+
+# Version control metadata is never part of the scanned content
+SKIP_DIRS = {".git", ".hg", ".svn"}
+
+# Per-process state set up by _init_worker
+_worker_regexes: List["re.Pattern"] = []
+_worker_max_file_bytes = DEFAULT_MAX_FILE_BYTES
+
+
+def iter_files(root: str) -> Iterator[str]:
+    """Yield every regular file below root, skipping version control directories."""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if d not in SKIP_DIRS]
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            if not os.path.islink(path):
+                yield path
+
+
+def compile_bytes_pattern(pattern: str) -> "re.Pattern":
+    """
+    Compile a catalog pattern for matching raw file bytes.
+
+    Matching bytes avoids decoding whole files. Character classes such as \\w
+    then only cover ASCII, which is what the catalog patterns describe anyway.
+    """
+    return re.compile(pattern.encode("utf-8"))
+
+
+def check_patterns(patterns: Sequence[str]) -> None:
+    """
+    Compile the patterns in this process before they are sent to scanner processes.
+
+    An invalid pattern would otherwise fail in every worker's initializer and
+    only surface as a BrokenProcessPool.
+
+    Raises:
+        ValueError: Naming the first pattern that does not compile for bytes
+    """
+    for pattern in patterns:
+        try:
+            compile_bytes_pattern(pattern)
+        except re.error as e:
+            raise ValueError(f"Invalid pattern {pattern!r}: {str(e)}") from e
+
+
+def _decode(value) -> Any:
+    if isinstance(value, tuple):
+        return tuple(_decode(v) for v in value)
+    return value.decode("utf-8", errors="replace") if value is not None else ""
+
+
+def findall_value(match: "re.Match"):
+    """Return what re.findall would have returned for this match."""
+    if match.re.groups == 0:
+        return match.group(0)
+    if match.re.groups == 1:
+        return match.group(1)
+    return match.groups(default=match.string[:0])
+
+
+def scan_buffer(buffer, regex: "re.Pattern") -> Tuple[List[Any], List[str]]:
+    """
+    Run a bytes regex over a buffer and collect decoded matches and context fragments.
+
+    The buffer may be bytes or an mmap object.
+    """
+    collected = []
+    fragments = []
+    for match in regex.finditer(buffer):
+        collected.append(_decode(findall_value(match)))
+        if len(fragments) < MAX_FRAGMENTS_PER_FILE:
+            start = max(0, match.start() - FRAGMENT_CONTEXT)
+            end = match.end() + FRAGMENT_CONTEXT
+            fragments.append(bytes(buffer[start:end]).decode("utf-8", errors="replace"))
+    return collected, fragments
+
+
+def is_binary(head: bytes) -> bool:
+    """Treat content with NUL bytes near the start as binary."""
+    return b"\x00" in head[:BINARY_SNIFF_BYTES]
+
+
+def _init_worker(patterns: Sequence[str], max_file_bytes: int) -> None:
+    global _worker_regexes, _worker_max_file_bytes
+    _worker_regexes = [compile_bytes_pattern(pattern) for pattern in patterns]
+    _worker_max_file_bytes = max_file_bytes
+
+
+def _scan_file(path: str) -> Tuple[str, int, Dict[int, Dict[str, Any]]]:
+    """
+    Scan a single file with every worker pattern in a worker process.
+
+    The file is read once however many patterns there are. Returns (outcome,
+    bytes scanned, match info keyed by pattern index).
+    """
+    found = {}
+    try:
+        size = os.path.getsize(path)
+        if size > _worker_max_file_bytes:
+            return "skipped_oversized", 0, found
+        if size == 0:
+            return "scanned", 0, found
+
+        with open(path, "rb") as f:
+            head = f.read(BINARY_SNIFF_BYTES)
+            if is_binary(head):
+                return "skipped_binary", 0, found
+            if size >= MMAP_THRESHOLD:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                    matches = [scan_buffer(buffer, regex) for regex in _worker_regexes]
+            else:
+                buffer = head + f.read()
+                matches = [scan_buffer(buffer, regex) for regex in _worker_regexes]
+        mtime = os.path.getmtime(path) if any(collected for collected, _ in matches) else None
+    except (IOError, OSError, ValueError) as e:
+        logger.warning(f"Could not scan {path}: {str(e)}")
+        return "errors", 0, found
+
+    for index, (collected, fragments) in enumerate(matches):
+        if collected:
+            found[index] = {
+                "collected": collected,
+                "fragments": fragments,
+                "mtime": mtime
+            }
+    return "scanned", size, found
+
+
+def create_scan_pool(
+    patterns: Sequence[str],
+    workers: Optional[int] = None,
+    max_file_bytes: int = DEFAULT_MAX_FILE_BYTES
+) -> ProcessPoolExecutor:
+    """Start scanner processes that match every file against the patterns, which must compile"""
+    check_patterns(patterns)
+    return ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(patterns, max_file_bytes))
+
+
+def scan_directory(
+    root: str,
+    pattern: str,
+    workers: Optional[int] = None,
+    max_file_bytes: int = DEFAULT_MAX_FILE_BYTES
+) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Scan every file below root for the pattern.
+
+    Args:
+        root: Directory to scan
+        pattern: Regex pattern from the token catalog or a custom one
+        workers: Number of worker processes (default: one per core)
+        max_file_bytes: Files larger than this are skipped
+
+    Returns:
+        Tuple of (processed results in the process_results format, scan stats)
+
+    Raises:
+        ValueError: If the pattern does not compile
+    """
+    with create_scan_pool([pattern], workers, max_file_bytes) as executor:
+        processed, stats = scan_directory_patterns(root, [pattern], executor)
+    return processed[0], stats
+
+
+def scan_directory_patterns(
+    root: str,
+    patterns: Sequence[str],
+    executor: ProcessPoolExecutor
+) -> Tuple[List[List[Dict[str, Any]]], Dict[str, Any]]:
+    """
+    Scan every file below root for several patterns in a single pass.
+
+    Args:
+        root: Directory to scan
+        patterns: Regex patterns, in the order the executor's workers were initialized with
+        executor: Pool from create_scan_pool(patterns), which can be reused across directories
+
+    Returns:
+        Tuple of (processed results per pattern in the process_results format, scan stats)
+    """
+    root = os.path.abspath(root)
+    repository = os.path.basename(root.rstrip(os.sep)) or root
+    stats = {
+        "scanned": 0,
+        "skipped_binary": 0,
+        "skipped_oversized": 0,
+        "errors": 0,
+        "bytes_scanned": 0
+    }
+    processed = [[] for _ in patterns]
+    start_time = time.time()
+
+    paths = list(iter_files(root))
+    for path, (outcome, size, found) in zip(paths, executor.map(_scan_file, paths, chunksize=32)):
+        stats[outcome] += 1
+        stats["bytes_scanned"] += size
+        for index, match in found.items():
+            last_modified = datetime.fromtimestamp(match["mtime"], tz=timezone.utc).strftime("%Y-%m-%d %H:%M:%S UTC")
+            processed[index].append(build_result(
+                repository,
+                Path(os.path.relpath(path, root)).as_posix(),
+                Path(path).as_uri(),
+                last_modified,
+                match["collected"],
+                match["fragments"]
+            ))
+
+    elapsed = max(time.time() - start_time, 1e-9)
+    stats["elapsed_seconds"] = elapsed
+    stats["files_per_second"] = stats["scanned"] / elapsed
+    stats["mb_per_second"] = stats["bytes_scanned"] / (1024 * 1024) / elapsed
+    logger.info(
+        f"Local scan of {root}: {stats['scanned']} files, {stats['bytes_scanned'] / (1024 * 1024):.1f} MB "
+        f"in {elapsed:.1f}s ({stats['files_per_second']:.0f} files/s, {stats['mb_per_second']:.1f} MB/s), "
+        f"{sum(len(results) for results in processed)} files with matches"
+    )
+    return [add_match_statistics(results) for results in processed], stats
+
+
+def resolve_pattern(pattern: Optional[str], pattern_name: Optional[str]) -> str:
+    """Resolve a CLI pattern argument or catalog name to a regex."""
+    if pattern:
+        return pattern
+    from token_patterns import read_token_patterns
+    patterns = read_token_patterns()
+    if pattern_name not in patterns:
+        raise SystemExit(f"Unknown pattern name: {pattern_name}")
+    return patterns[pattern_name]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scan a local directory with the token pattern catalog.")
+    parser.add_argument("path", help="Directory to scan")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--pattern", help="Regex pattern to search for")
+    group.add_argument("--pattern-name", help="Name of a pattern in token_patterns.json")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: one per core)")
+    parser.add_argument("--max-file-size", type=float, default=DEFAULT_MAX_FILE_BYTES / (1024 * 1024),
+                        help="Skip files larger than this many MB (default: 50)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=get_log_level(), format=LOG_FORMAT)
+    pattern = resolve_pattern(args.pattern, args.pattern_name)
+    try:
+        check_patterns([pattern])
+    except ValueError as e:
+        raise SystemExit(str(e))
+    processed, stats = scan_directory(args.path, pattern, args.workers, int(args.max_file_size * 1024 * 1024))
+
+    print(f"Scanned {stats['scanned']} files ({stats['bytes_scanned'] / (1024 * 1024):.1f} MB) "
+          f"at {stats['files_per_second']:.0f} files/s, {stats['mb_per_second']:.1f} MB/s")
+    print(f"Skipped {stats['skipped_binary']} binary and {stats['skipped_oversized']} oversized files, "
+          f"{stats['errors']} errors")
+    if not processed:
+        print("No matching tokens found.")
+        return
+    tokens_file, detailed_file, save_error = save_results(processed, pattern)
+    if save_error:
+        raise SystemExit(f"Failed to save results: {save_error}")
+    print(f"Found matches in {len(processed)} files. Results saved to {tokens_file} and {detailed_file}")
+
+
+if __name__ == "__main__":
+    main()
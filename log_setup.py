@@ -0,0 +1,108 @@
+"""
+Non-blocking logging configuration.
+
+Records are put on a queue by a `QueueHandler` and written to the console and
+a size-rotated log file by a `QueueListener` on a background thread, so search
+and worker threads never block on console or file I/O. The level comes from
+LOG_LEVEL; the log file location and rotation from LOG_FILE, LOG_MAX_BYTES and
+LOG_BACKUP_COUNT.
+
+Messages logged on hot paths (every page, token switch or pool allocation)
+go through `log_throttled`, which emits at most one message per key and
+interval and reports how many were suppressed in between.
+"""
+
+import atexit
+import logging
+import os
+import sys
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from queue import SimpleQueue
+from typing import Dict, Optional, Tuple
+
+LOG_FORMAT = '%(asctime)s - %(message)s'
+DEFAULT_LOG_FILE = "github_search.log"
+DEFAULT_MAX_BYTES = 10 * 1024 * 1024
+DEFAULT_BACKUP_COUNT = 5
+
+
+class UTF8StreamHandler(logging.StreamHandler):
+    """Console handler that writes UTF-8 regardless of the console encoding"""
+    def emit(self, record):
+        try:
+            msg = self.format(record)
+            stream = self.stream
+            buffer = getattr(stream, "buffer", None)
+            if buffer is not None:
+                buffer.write(msg.encode('utf-8'))
+                buffer.write(self.terminator.encode('utf-8'))
+            else:
+                stream.write(msg + self.terminator)
+            self.flush()
+        except Exception:
+            self.handleError(record)
+
+
+_listener: Optional[QueueListener] = None
+_setup_lock = threading.Lock()
+
+
+def get_log_level() -> int:
+    """Get the log level configured through LOG_LEVEL (INFO if unset or invalid)"""
+    level = logging.getLevelName(os.getenv("LOG_LEVEL", "INFO").strip().upper())
+    return level if isinstance(level, int) else logging.INFO
+
+
+def setup_logging() -> None:
+    """Route all logging through a queue to a background writer; safe to call repeatedly"""
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            return
+
+        formatter = logging.Formatter(LOG_FORMAT)
+        handlers = [UTF8StreamHandler(sys.stdout)]
+        log_file = os.getenv("LOG_FILE", DEFAULT_LOG_FILE)
+        if log_file:
+            handlers.append(RotatingFileHandler(
+                log_file,
+                maxBytes=int(os.getenv("LOG_MAX_BYTES", DEFAULT_MAX_BYTES)),
+                backupCount=int(os.getenv("LOG_BACKUP_COUNT", DEFAULT_BACKUP_COUNT)),
+                encoding='utf-8'
+            ))
+        for handler in handlers:
+            handler.setFormatter(formatter)
+
+        queue = SimpleQueue()
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(QueueHandler(queue))
+        root.setLevel(get_log_level())
+
+        _listener = QueueListener(queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
+
+
+# key -> (time of the last emitted message, messages suppressed since)
+_throttle_state: Dict[str, Tuple[float, int]] = {}
+_throttle_lock = threading.Lock()
+
+
+def log_throttled(logger: logging.Logger, level: int, key: str, message: str, interval: float = 5.0) -> None:
+    """Log at most one message per key every interval seconds"""
+    if not logger.isEnabledFor(level):
+        return
+    now = time.monotonic()
+    with _throttle_lock:
+        last, suppressed = _throttle_state.get(key, (float("-inf"), 0))
+        if now - last < interval:
+            _throttle_state[key] = (last, suppressed + 1)
+            return
+        _throttle_state[key] = (now, 0)
+    if suppressed:
+        message = f"{message} ({suppressed} similar messages suppressed)"
+    logger.log(level, message)
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Batch regex evaluation over concatenated text buffers.
+
+Calling `findall` once per fragment costs more Python overhead than the
+matching itself when fragments are short and there are 100k of them. Batch
+mode joins the texts into large buffers with a separator character that no
+part of the pattern can match, runs `finditer` once per buffer and maps every
+match back to its text with a precomputed offset array and `bisect`.
+
+Since no match can contain the separator, no match crosses from one text into
+the next, and the per-text matches are the same as with `findall`. Patterns
+for which this cannot be shown fall back to per-text matching: patterns that
+can match the empty string, use anchors other than word boundaries, clear
+inline flags, or have a part that matches every candidate separator.
+
+Run this module directly to compare batch and per-text matching:
+    python match_batches.py --pattern-name "GSK Token" --items 100000
+"""
+
+import argparse
+import re
+import time
+from bisect import bisect_right
+from functools import lru_cache
+from itertools import accumulate
+from operator import add
+from typing import Any, Dict, List, Optional, Sequence
+
+try:  # Python 3.11+ moved the regex parser into the re package
+    from re import _parser as sre_parse
+    from re import _compiler as sre_compile
+    from re import _constants as sre_constants
+except ImportError:  # pragma: no cover - older interpreters
+    import sre_parse
+    import sre_compile
+    import sre_constants
+
+# Tried in order; both are non-word characters, so \b and \B see a text edge either way
+SEPARATORS = ("\n", "\x00")
+# Characters per buffer, so a batch never holds a second copy of every text at once
+MAX_BUFFER_CHARS = 1 << 20
+# Mapping a match back costs more than a findall call, so when more than this
+# share of the texts in a small first buffer match, the rest are matched per text
+DENSE_MATCH_RATIO = 0.2
+PROBE_BUFFER_CHARS = 1 << 16
+
+# Ops that consume a character and must not be able to consume the separator
+_CHARACTER_OPS = tuple(
+    getattr(sre_constants, name)
+    for name in ("LITERAL", "NOT_LITERAL", "ANY", "IN", "CATEGORY")
+    if hasattr(sre_constants, name)
+)
+_WORD_BOUNDARIES = tuple(
+    getattr(sre_constants, name)
+    for name in ("AT_BOUNDARY", "AT_NON_BOUNDARY")
+    if hasattr(sre_constants, name)
+)
+
+
+def _crosses(items, state, flags: int, separator: str) -> bool:
+    """Whether any part of a parsed regex could match the separator or a text edge differently"""
+    for op, av in items:
+        if op in _CHARACTER_OPS:
+            single = sre_parse.SubPattern(state, [(op, av)])
+            if sre_compile.compile(single, flags).match(separator):
+                return True
+        elif op is sre_constants.AT:
+            if av not in _WORD_BOUNDARIES:
+                return True
+        elif op is sre_constants.SUBPATTERN:
+            _, add_flags, del_flags, sub = av
+            if del_flags or _crosses(sub, state, flags | add_flags, separator):
+                return True
+        else:
+            for arg in (av if isinstance(av, (list, tuple)) else (av,)):
+                subs = arg if isinstance(arg, list) else [arg]
+                if any(isinstance(sub, sre_parse.SubPattern) and _crosses(sub, state, flags, separator)
+                       for sub in subs):
+                    return True
+    return False
+
+
+@lru_cache(maxsize=256)
+def batch_separator(pattern: str) -> Optional[str]:
+    """Get a separator the pattern cannot match across, or None if it needs per-text matching"""
+    try:
+        parsed = sre_parse.parse(pattern)
+    except (re.error, RecursionError):
+        return None
+    if parsed.getwidth()[0] == 0:
+        return None  # Empty matches would also be found at every separator
+    for separator in SEPARATORS:
+        if not _crosses(parsed, parsed.state, 0, separator):
+            return separator
+    return None
+
+
+def batch_findall(regex: re.Pattern, texts: Sequence[str], separator: str) -> Dict[int, list]:
+    """
+    Match every text in a few large buffers.
+
+    Returns:
+        For each text with matches, its index mapped to the matches in the same
+        form as `regex.findall(text)`
+    """
+    found: Dict[int, list] = {}
+    # ends[i] is where text i + 1 starts in one virtual buffer of all texts
+    step = len(separator)
+    ends = list(map(add, accumulate(map(len, texts)), range(step, (len(texts) + 1) * step, step)))
+    groups = regex.groups
+    first = 0
+    base = 0
+    while first < len(texts):
+        limit = PROBE_BUFFER_CHARS if first == 0 else MAX_BUFFER_CHARS
+        last = max(first + 1, bisect_right(ends, base + limit))
+        buffer = separator.join(texts[first:last])
+        for match in regex.finditer(buffer):
+            index = bisect_right(ends, base + match.start())
+            if groups == 0:
+                value = match.group()
+            else:
+                values = match.groups("")
+                value = values[0] if groups == 1 else values
+            found.setdefault(index, []).append(value)
+        base = ends[last - 1]
+        if first == 0 and len(found) > DENSE_MATCH_RATIO * last:
+            for index, matches in enumerate(map(regex.findall, texts[last:]), last):
+                if matches:
+                    found[index] = matches
+            break
+        first = last
+    return found
+
+
+def benchmark(texts: List[str], pattern: str, rounds: int = 5) -> Dict[str, Any]:
+    """Time per-text and batch matching and check they agree"""
+    regex = re.compile(pattern)
+    separator = batch_separator(pattern)
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        per_text = [regex.findall(text) for text in texts]
+    per_text_seconds = (time.perf_counter() - start) / rounds
+
+    found = None
+    batch_seconds = None
+    if separator is not None:
+        start = time.perf_counter()
+        for _ in range(rounds):
+            found = batch_findall(regex, texts, separator)
+        batch_seconds = (time.perf_counter() - start) / rounds
+
+    return {
+        "texts": len(texts),
+        "separator": separator,
+        "mismatches": sum(matches != found.get(index, []) for index, matches in enumerate(per_text)) if found is not None else 0,
+        "per_text_seconds": per_text_seconds,
+        "batch_seconds": batch_seconds
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare batch and per-text regex matching.")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--pattern", help="Regex pattern to match")
+    group.add_argument("--pattern-name", help="Name of a pattern in token_patterns.json")
+    parser.add_argument("--items", type=int, default=100000, help="Number of synthetic fragments (default: 100000)")
+    parser.add_argument("--rounds", type=int, default=5, help="Timing rounds to average (default: 5)")
+    args = parser.parse_args()
+
+    # Imported here, local_scanner imports result_processor which imports this module
+    from local_scanner import resolve_pattern
+    from search_records import make_sample_item
+    pattern = resolve_pattern(args.pattern, args.pattern_name)
+    texts = [tm["fragment"] for i in range(args.items) for tm in make_sample_item(i)["text_matches"]]
+
+    result = benchmark(texts, pattern, args.rounds)
+    print(f"{result['texts']} fragments")
+    print(f"Per-text matching: {result['per_text_seconds'] * 1000:8.1f} ms")
+    if result["batch_seconds"] is None:
+        print("Pattern can match across every separator, batch mode falls back to per-text matching")
+    else:
+        print(f"Batch matching:    {result['batch_seconds'] * 1000:8.1f} ms "
+              f"({result['per_text_seconds'] / max(result['batch_seconds'], 1e-9):.1f}x, "
+              f"separator {result['separator']!r})")
+        print(f"Texts with different matches: {result['mismatches']}")
+
+
+if __name__ == "__main__":
+    main()
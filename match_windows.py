@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+"""
+Windowed regex matching around code search highlights.
+
+Every `text_matches` entry carries `matches[].indices`, the spans of the query
+terms GitHub highlighted inside the fragment. When the search query was
+derived from the literals a pattern requires, every match of the pattern
+contains one of those terms, so it lies within the pattern's maximum match
+length of a highlighted term. For such anchored patterns only these windows
+are searched instead of the whole fragment, and fragments without the terms
+are skipped.
+
+A fragment falls back to full scanning when the pattern starts with a literal
+(which the regex engine finds as fast as windows could), has no bounded width,
+uses anchors, lookarounds or backreferences (which would see the window
+edges), when an anchor term occurs outside the highlights, or when the windows
+would cover the fragment anyway.
+
+Run this module directly to compare windowed and full matching on recorded
+code search responses (JSON bodies with an "items" list), such as the set in
+tests/fixtures/code_search:
+    python match_windows.py --pattern-name "Mailchimp API Key" --fixtures tests/fixtures/code_search/mailchimp.json
+
+Record a sanitized response for a query with the first configured token;
+repositories are renamed and the tokens in the fragments replaced:
+    python match_windows.py --pattern-name "Mailchimp API Key" --record '"-us"' --output mailchimp.json
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import re
+import time
+from functools import lru_cache
+from typing import Any, Dict, List, NamedTuple, Optional, Pattern, Sequence, Tuple
+
+from search_query import plan_query
+from search_records import SearchHit, make_sample_item
+
+try:  # Python 3.11+ moved the regex parser into the re package
+    from re import _parser as sre_parse
+    from re import _constants as sre_constants
+except ImportError:  # pragma: no cover - older interpreters
+    import sre_parse
+    import sre_constants
+
+# Widths beyond this are not worth windowing, the windows would cover most fragments
+MAX_WINDOW_WIDTH = 4096
+
+# Below this length a full scan is as fast as finding the windows (measured on tests/fixtures/code_search)
+MIN_WINDOWED_LENGTH = 1024
+
+# Ops whose result depends on text outside the match, which a window edge would cut off
+_CONTEXT_OPS = tuple(
+    getattr(sre_constants, name)
+    for name in ("AT", "ASSERT", "ASSERT_NOT", "GROUPREF", "GROUPREF_EXISTS")
+    if hasattr(sre_constants, name)
+)
+
+
+class WindowPlan(NamedTuple):
+    """How to match a pattern in windows around highlighted anchor terms."""
+    regex: Pattern
+    max_width: int
+    terms: Tuple[str, ...]  # Lowercase literals every match contains one of
+
+
+def _uses_context(items) -> bool:
+    """Whether a parsed regex contains anchors, lookarounds or backreferences"""
+    for op, av in items:
+        if op in _CONTEXT_OPS:
+            return True
+        for arg in (av if isinstance(av, (list, tuple)) else (av,)):
+            if isinstance(arg, sre_parse.SubPattern) and _uses_context(arg):
+                return True
+            if isinstance(arg, list) and any(isinstance(a, sre_parse.SubPattern) and _uses_context(a) for a in arg):
+                return True
+    return False
+
+
+def _starts_with_literal(items) -> bool:
+    """Whether a parsed regex begins with a literal character, looking into leading groups"""
+    if not items:
+        return False
+    op, av = items[0]
+    if op is sre_constants.SUBPATTERN:
+        return _starts_with_literal(av[-1])
+    return op is sre_constants.LITERAL
+
+
+@lru_cache(maxsize=256)
+def window_plan(pattern: str) -> Optional[WindowPlan]:
+    """Get the window plan for a pattern, or None if it always needs full scanning"""
+    plan = plan_query(pattern)
+    if plan is None:
+        return None
+    try:
+        regex = re.compile(pattern)
+        parsed = sre_parse.parse(pattern)
+    except (re.error, RecursionError):
+        return None
+    max_width = parsed.getwidth()[1]
+    if max_width > MAX_WINDOW_WIDTH or _uses_context(parsed):
+        return None
+    if _starts_with_literal(parsed):
+        return None  # The regex engine already skips ahead to a literal prefix, windows only add overhead
+    return WindowPlan(regex, max_width, tuple(dict.fromkeys(t.lower() for t in plan.terms)))
+
+
+def windowed_findall(text: str, plan: WindowPlan, indices: Sequence[Tuple[int, int]]) -> Optional[list]:
+    """
+    Find the pattern's matches in the windows around the highlighted anchor terms.
+
+    Returns:
+        The matches in the same form as `findall`, or None if the fragment needs full scanning
+    """
+    if not indices or len(text) < MIN_WINDOWED_LENGTH:
+        return None
+    lower = text.lower()
+    if len(lower) != len(text):
+        return None  # Case folding changed the length, the indices no longer line up
+    occurrences = []
+    for term in plan.terms:
+        at = lower.find(term)
+        while at != -1:
+            occurrences.append((at, at + len(term)))
+            at = lower.find(term, at + 1)
+    if not occurrences:
+        return []  # Every match contains an anchor term
+
+    windows = []
+    for start, end in sorted(occurrences):
+        # An anchor term GitHub did not highlight means the indices do not describe this fragment
+        if not any(low < end and start < high for low, high in indices):
+            return None
+        # A match containing the term starts at most max_width before its end and ends at most max_width after its start
+        low, high = max(0, end - plan.max_width), min(len(text), start + plan.max_width)
+        if windows and low <= windows[-1][1]:
+            windows[-1][1] = max(windows[-1][1], high)
+        else:
+            windows.append([low, high])
+    if sum(high - low for low, high in windows) >= len(text):
+        return None
+
+    matches = []
+    for low, high in windows:
+        matches.extend(plan.regex.findall(text, low, high))
+    return matches
+
+
+def load_fixtures(paths: Sequence[str]) -> List[SearchHit]:
+    """Load search hits from recorded code search responses or lists of items"""
+    hits = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        items = data.get("items", []) if isinstance(data, dict) else data
+        hits.extend(SearchHit.from_item(item) for item in items)
+    return hits
+
+
+def _replace_like(value: str, seed: int) -> str:
+    """A deterministic stand-in with the same character classes, so a hex token stays hex"""
+    out = []
+    for offset, char in enumerate(value):
+        step = (seed + offset * 7) % 26
+        if char.isdigit():
+            out.append(str((int(char) + step) % 10))
+        elif "a" <= char <= "f" or "A" <= char <= "F":
+            base = "a" if char.islower() else "A"
+            out.append(chr(ord(base) + (ord(char) - ord(base) + step) % 6))
+        elif char.isascii() and char.isalpha():
+            base = "g" if char.islower() else "G"
+            out.append(chr(ord(base) + (ord(char) - ord(base) + step) % 20))
+        else:
+            out.append(char)
+    return "".join(out)
+
+
+def sanitize_item(item: Dict[str, Any], pattern: str, index: int) -> Optional[Dict[str, Any]]:
+    """
+    Strip a code search item down to what matching needs, for committing as a fixture.
+
+    The repository becomes ownerN/repoN and every character of a pattern match
+    outside the query's anchor terms is replaced by another of its class, so
+    fragments keep their shape and highlight indices but no longer carry the
+    token. Returns None if a replaced fragment would match differently.
+    """
+    regex = re.compile(pattern)
+    plan = plan_query(pattern)
+    terms = [t.lower() for t in plan.terms] if plan else []
+    name = f"owner{index}/repo{index}"
+    sha = hashlib.sha1(f"{item.get('sha')}:{index}".encode("utf-8")).hexdigest()
+    text_matches = []
+    for text_match in item.get("text_matches", []):
+        fragment = text_match.get("fragment", "")
+        lower = fragment.lower()
+        keep = set()
+        for term in terms:
+            at = lower.find(term)
+            while at != -1:
+                keep.update(range(at, at + len(term)))
+                at = lower.find(term, at + 1)
+        chars = list(fragment)
+        for match in regex.finditer(fragment):
+            for position in range(match.start(), match.end()):
+                if position not in keep:
+                    chars[position] = _replace_like(fragment[position], position + index)
+        sanitized = "".join(chars)
+        if len(regex.findall(sanitized)) != len(regex.findall(fragment)):
+            return None
+        text_matches.append({
+            "fragment": sanitized,
+            "matches": [
+                {"text": sanitized[m["indices"][0]:m["indices"][1]], "indices": m["indices"]}
+                for m in text_match.get("matches", []) if len(m.get("indices") or ()) == 2
+            ]
+        })
+    path = item.get("path")
+    return {
+        "name": item.get("name"),
+        "path": path,
+        "sha": sha,
+        "git_url": f"https://api.github.com/repos/{name}/git/blobs/{sha}",
+        "html_url": f"https://github.com/{name}/blob/{sha}/{path}",
+        "repository": {"full_name": name},
+        "text_matches": text_matches
+    }
+
+
+def record_fixture(query: str, pattern: str, output: str, per_page: int = 100) -> int:
+    """Run one code search page with the first configured token and save it sanitized; returns the item count"""
+    import requests
+    from config import get_github_tokens
+    from request_guard import request_timeouts
+
+    tokens = get_github_tokens()
+    if not tokens:
+        raise SystemExit("No GitHub token configured (GITHUB_TOKEN or GITHUB_TOKENS)")
+    response = requests.get(
+        "https://api.github.com/search/code",
+        headers={
+            "Accept": "application/vnd.github.v3.text-match+json",
+            "X-GitHub-Api-Version": "2022-11-28",
+            "Authorization": f"Bearer {tokens[0]}"
+        },
+        params={"q": query, "per_page": per_page},
+        timeout=request_timeouts()
+    )
+    response.raise_for_status()
+    items = [sanitize_item(item, pattern, index) for index, item in enumerate(response.json().get("items", []))]
+    items = [item for item in items if item is not None]
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({"query": query, "pattern": pattern, "items": items}, f, indent=1)
+    return len(items)
+
+
+def make_sample_hit(index: int) -> SearchHit:
+    """Build a search hit whose fragment has code around the highlight, like real fragments"""
+    item = make_sample_item(index)
+    padding = "".join(f"SETTING_{n} = os.getenv('SETTING_{n}', 'default-value-{n}')\n" for n in range(16))
+    for text_match in item["text_matches"]:
+        text_match["fragment"] = padding + text_match["fragment"] + padding
+        for match in text_match["matches"]:
+            match["indices"] = [i + len(padding) for i in match["indices"]]
+    return SearchHit.from_item(item)
+
+
+def benchmark(hits: List[SearchHit], pattern: str, rounds: int = 5) -> Dict[str, Any]:
+    """Time full and windowed matching over every fragment and check they agree"""
+    fragments = [(text, indices) for hit in hits for text, indices in zip(hit.fragments, hit.match_indices)]
+    regex = re.compile(pattern)
+    plan = window_plan(pattern)
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        full = [regex.findall(text) for text, _ in fragments]
+    full_seconds = (time.perf_counter() - start) / rounds
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        windowed = []
+        fallbacks = 0
+        for text, indices in fragments:
+            found = windowed_findall(text, plan, indices) if plan else None
+            if found is None:
+                fallbacks += 1
+                found = regex.findall(text)
+            windowed.append(found)
+    windowed_seconds = (time.perf_counter() - start) / rounds
+
+    return {
+        "fragments": len(fragments),
+        "windowed": len(fragments) - fallbacks,
+        "fallbacks": fallbacks,
+        "mismatches": sum(sorted(a) != sorted(b) for a, b in zip(full, windowed)),
+        "full_seconds": full_seconds,
+        "windowed_seconds": windowed_seconds
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare windowed and full-fragment regex matching.")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--pattern", help="Regex pattern to match")
+    group.add_argument("--pattern-name", help="Name of a pattern in token_patterns.json")
+    parser.add_argument("--fixtures", nargs="*", default=[],
+                        help="Recorded code search responses (globs allowed); synthetic items if omitted")
+    parser.add_argument("--items", type=int, default=20000, help="Number of synthetic items (default: 20000)")
+    parser.add_argument("--rounds", type=int, default=5, help="Timing rounds to average (default: 5)")
+    parser.add_argument("--record", metavar="QUERY", help="Record a sanitized code search response for QUERY instead")
+    parser.add_argument("--output", default="code_search.json", help="Where --record writes (default: code_search.json)")
+    args = parser.parse_args()
+
+    # Imported here, local_scanner imports result_processor which imports this module
+    from local_scanner import resolve_pattern
+    pattern = resolve_pattern(args.pattern, args.pattern_name)
+    if args.record:
+        count = record_fixture(args.record, pattern, args.output)
+        print(f"Recorded {count} sanitized items to {args.output}")
+        return
+    paths = [path for spec in args.fixtures for path in sorted(glob.glob(spec))]
+    hits = load_fixtures(paths) if paths else [make_sample_hit(i) for i in range(args.items)]
+
+    if window_plan(pattern) is None:
+        print("Pattern cannot be windowed, every fragment falls back to full scanning")
+    result = benchmark(hits, pattern, args.rounds)
+    print(f"{result['fragments']} fragments, {result['windowed']} windowed, {result['fallbacks']} full scans")
+    print(f"Full matching:     {result['full_seconds'] * 1000:8.1f} ms")
+    print(f"Windowed matching: {result['windowed_seconds'] * 1000:8.1f} ms "
+          f"({result['full_seconds'] / max(result['windowed_seconds'], 1e-9):.1f}x)")
+    print(f"Fragments with different matches: {result['mismatches']}")
+
+
+if __name__ == "__main__":
+    main()
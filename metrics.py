@@ -0,0 +1,270 @@
+"""
+Scan throughput and API health metrics in Prometheus text format.
+
+Counters, gauges and histograms are collected in `github_api`, `config` and
+`result_processor`, and can be exposed through a local HTTP endpoint
+(METRICS_PORT) or written periodically to a node_exporter textfile collector
+file (METRICS_TEXTFILE). Rates such as pages/s, items/s and matches/s come
+from applying `rate()` to the corresponding counters in Prometheus.
+"""
+
+import logging
+import math
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+DEFAULT_LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _label_key(labels: Dict[str, object]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key: LabelKey, extra: Sequence[Tuple[str, str]] = ()) -> str:
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape_label_value(v)}"' for k, v in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    """A monotonically increasing value, optionally split by labels."""
+    metric_type = "counter"
+
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self.lock = threading.Lock()
+        self.values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = _label_key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        with self.lock:
+            return self.values.get(_label_key(labels), 0)
+
+    def render(self) -> List[str]:
+        with self.lock:
+            return [f"{self.name}{_format_labels(k)} {_format_value(v)}" for k, v in sorted(self.values.items())]
+
+
+class Gauge(Counter):
+    """A value that can go up and down."""
+    metric_type = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        with self.lock:
+            self.values[_label_key(labels)] = value
+
+
+class Histogram:
+    """Observations counted into cumulative buckets, with their sum and count."""
+    metric_type = "histogram"
+
+    def __init__(self, name: str, documentation: str, buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self.lock = threading.Lock()
+        # label key -> [bucket counts..., sum, count]
+        self.values: Dict[LabelKey, List[float]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = _label_key(labels)
+        with self.lock:
+            series = self.values.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def count(self, **labels) -> int:
+        with self.lock:
+            series = self.values.get(_label_key(labels))
+            return int(series[-1]) if series else 0
+
+    def quantile(self, q: float, **labels) -> Optional[float]:
+        """Estimate a quantile by linear interpolation within its bucket, as histogram_quantile does"""
+        with self.lock:
+            series = list(self.values.get(_label_key(labels), ()))
+        if not series or not series[-1]:
+            return None
+        rank = q * series[-1]
+        lower, below = 0.0, 0
+        for bound, count in zip(self.buckets, series):
+            if count >= rank:
+                if math.isinf(bound):
+                    return lower  # Above the highest finite bucket
+                if count == below:
+                    return bound
+                return lower + (bound - lower) * (rank - below) / (count - below)
+            lower, below = bound, count
+        return lower
+
+    def render(self) -> List[str]:
+        lines = []
+        with self.lock:
+            for key, series in sorted(self.values.items()):
+                for bound, count in zip(self.buckets, series):
+                    lines.append(f"{self.name}_bucket{_format_labels(key, [('le', _format_value(bound))])} {_format_value(count)}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(series[-2])}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {_format_value(series[-1])}")
+        return lines
+
+
+class MetricsRegistry:
+    """Holds every metric and renders them in Prometheus text exposition format."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics: Dict[str, object] = {}
+
+    def _register(self, metric):
+        with self.lock:
+            return self.metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, documentation: str) -> Counter:
+        return self._register(Counter(name, documentation))
+
+    def gauge(self, name: str, documentation: str) -> Gauge:
+        return self._register(Gauge(name, documentation))
+
+    def histogram(self, name: str, documentation: str, buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, buckets))
+
+    def render(self) -> str:
+        with self.lock:
+            metrics = list(self.metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.metric_type}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+# GitHub API
+REQUESTS_SENT = registry.counter("gitsentry_requests_total", "GitHub API requests sent, by endpoint")
+RESPONSES = registry.counter("gitsentry_responses_total", "GitHub API responses, by endpoint and status code")
+REQUEST_ERRORS = registry.counter("gitsentry_request_errors_total", "GitHub API requests that failed without a response")
+REQUEST_LATENCY = registry.histogram("gitsentry_request_latency_seconds", "GitHub API request latency, by endpoint")
+RETRIES = registry.counter("gitsentry_retries_total", "Search requests retried")
+RATE_LIMIT_WAITS = registry.counter("gitsentry_rate_limit_waits_total", "Waits caused by rate limit responses")
+RATE_LIMIT_WAIT_SECONDS = registry.counter("gitsentry_rate_limit_wait_seconds_total", "Seconds spent waiting for rate limit budget")
+SEARCH_CONCURRENCY = registry.gauge("gitsentry_search_concurrency_limit", "Search requests allowed in flight by the adaptive limiter")
+TOKEN_LEASES = registry.counter("gitsentry_token_leases_total", "Tokens leased from the token rotator")
+TOKENS_LEASED = registry.gauge("gitsentry_tokens_leased", "Tokens currently leased from the token rotator")
+REQUEST_TIMEOUTS = registry.counter("gitsentry_request_timeouts_total", "GitHub API requests that timed out, by endpoint and phase")
+STALLED_REQUESTS = registry.gauge("gitsentry_stalled_requests", "Requests in flight longer than the stall threshold")
+HEDGED_REQUESTS = registry.counter("gitsentry_hedged_requests_total", "Duplicate requests sent after the p95 latency, by endpoint")
+HEDGE_WINS = registry.counter("gitsentry_hedge_wins_total", "Hedged requests that answered before the original, by endpoint")
+
+# Scan throughput
+PAGES_FETCHED = registry.counter("gitsentry_pages_fetched_total", "Search result pages fetched")
+ITEMS_FETCHED = registry.counter("gitsentry_items_fetched_total", "Search items fetched")
+ITEMS_PROCESSED = registry.counter("gitsentry_items_processed_total", "Search items run through the pattern matcher")
+MATCHES_FOUND = registry.counter("gitsentry_matches_found_total", "Pattern matches found in processed items")
+ALERTS_SENT = registry.counter("gitsentry_alerts_sent_total", "Alerts delivered, by sink")
+ALERT_SEND_FAILURES = registry.counter("gitsentry_alert_send_failures_total", "Failed alert batch sends, by sink")
+ALERTS_SPILLED = registry.counter("gitsentry_alerts_spilled_total", "Alerts written to a sink's spill file, by sink")
+ALERT_QUEUE_DEPTH = registry.gauge("gitsentry_alert_queue_depth", "Alerts waiting in a sink's queue, by sink")
+PROCESSING_SECONDS = registry.histogram(
+    "gitsentry_processing_seconds",
+    "Time spent matching a scan's results",
+    buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 60.0)
+)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_response(404)
+            self.end_headers()
+            return
+        body = registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Keep scrapes out of the scan log
+
+
+_server = None
+_textfile_thread = None
+_start_lock = threading.Lock()
+
+
+def start_metrics_server(port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Serve /metrics on a background thread"""
+    global _server
+    with _start_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            threading.Thread(target=_server.serve_forever, name="metrics-server", daemon=True).start()
+            logger.info(f"Metrics endpoint listening on http://{host}:{port}/metrics")
+        return _server
+
+
+def write_textfile(path: str) -> None:
+    """Write all metrics to a textfile collector file atomically"""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(registry.render())
+    os.replace(tmp_path, path)
+
+
+def start_textfile_writer(path: str, interval: float = 15.0) -> None:
+    """Rewrite the textfile collector file every interval seconds"""
+    global _textfile_thread
+
+    def run():
+        while True:
+            try:
+                write_textfile(path)
+            except (IOError, OSError) as e:
+                logger.warning(f"Could not write metrics textfile {path}: {str(e)}")
+            time.sleep(interval)
+
+    with _start_lock:
+        if _textfile_thread is None:
+            _textfile_thread = threading.Thread(target=run, name="metrics-textfile", daemon=True)
+            _textfile_thread.start()
+
+
+def start_from_env() -> None:
+    """Start the exporters configured through METRICS_PORT and METRICS_TEXTFILE"""
+    port: Optional[str] = os.getenv("METRICS_PORT")
+    if port:
+        try:
+            start_metrics_server(int(port))
+        except (OSError, ValueError) as e:
+            logger.error(f"Could not start metrics endpoint on port {port}: {str(e)}")
+    textfile = os.getenv("METRICS_TEXTFILE")
+    if textfile:
+        start_textfile_writer(textfile, float(os.getenv("METRICS_TEXTFILE_INTERVAL", "15")))
@@ -0,0 +1,183 @@
+"""
+Repository metadata enrichment for GitHub code search results.
+
+Search items often carry a `repository` object without `pushed_at` or
+`updated_at`, so results show "N/A" for their last activity. Fetching each
+repository over REST would cost a request per finding. This stage collects
+the distinct repositories of a scan that have no date yet and resolves them
+with batched GraphQL queries, one aliased `repository` field per repository
+and about 100 per request, into a TTL cache shared by all scans.
+
+The endpoint is taken from GITHUB_GRAPHQL_URL, so a local stand-in server can
+answer the queries in tests.
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+import requests
+
+from config import get_token_rotator
+from request_guard import request_timeouts, watchdog
+from search_records import SearchHit, as_hit
+from tracing import traced
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_GRAPHQL_URL = "https://api.github.com/graphql"
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_REPO_CACHE_TTL = 6 * 3600
+
+# Last activity fields in order of preference, as GraphQL names them
+_DATE_FIELDS = ("pushedAt", "updatedAt", "createdAt")
+
+
+class RepoMetadataCache:
+    """Repository dates keyed by full name, each entry expiring after a TTL."""
+
+    def __init__(self, ttl: float = DEFAULT_REPO_CACHE_TTL):
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        # full name -> (expires at, last activity date or None if the repository was not found)
+        self._entries: Dict[str, Tuple[float, Optional[str]]] = {}
+
+    def lookup(self, full_name: str) -> Tuple[bool, Optional[str]]:
+        """Get (found, date) for a repository; found is False if it is not cached or expired"""
+        with self.lock:
+            entry = self._entries.get(full_name)
+            if entry is None:
+                return False, None
+            if entry[0] <= time.monotonic():
+                del self._entries[full_name]
+                return False, None
+            return True, entry[1]
+
+    def put(self, full_name: str, date: Optional[str]) -> None:
+        """Store a repository's date, None remembers that it could not be resolved"""
+        with self.lock:
+            self._entries[full_name] = (time.monotonic() + self.ttl, date)
+
+    def __len__(self) -> int:
+        with self.lock:
+            return len(self._entries)
+
+
+# Shared cache so repositories resolved by one scan are reused by the next
+repo_cache = RepoMetadataCache(float(os.getenv("REPO_CACHE_TTL", DEFAULT_REPO_CACHE_TTL)))
+
+
+def build_query(names: List[str]) -> Tuple[str, Dict[str, str]]:
+    """Build one GraphQL query with an aliased repository field per full name"""
+    params = []
+    fields = []
+    variables = {}
+    for index, full_name in enumerate(names):
+        owner, name = full_name.split("/", 1)
+        params.append(f"$o{index}: String!, $n{index}: String!")
+        fields.append(f"r{index}: repository(owner: $o{index}, name: $n{index}) {{ {' '.join(_DATE_FIELDS)} }}")
+        variables[f"o{index}"] = owner
+        variables[f"n{index}"] = name
+    return f"query({', '.join(params)}) {{ {' '.join(fields)} }}", variables
+
+
+@traced("graphql_request")
+def _resolve_batch(session: requests.Session, url: str, token: str, names: List[str]) -> Optional[Dict[str, Optional[str]]]:
+    """Resolve one batch of repositories, or None if the request failed"""
+    query, variables = build_query(names)
+    with watchdog.track("graphql", f"{len(names)} repositories"):
+        response = session.post(
+            url,
+            json={"query": query, "variables": variables},
+            headers={"Authorization": f"Bearer {token}"},
+            timeout=request_timeouts()
+        )
+    if response.status_code != 200:
+        logger.warning(f"Repository enrichment request failed: HTTP {response.status_code}")
+        return None
+    payload = response.json()
+    data = payload.get("data")
+    if data is None:
+        logger.warning(f"Repository enrichment query failed: {payload.get('errors')}")
+        return None
+    # Missing or inaccessible repositories come back as null with a NOT_FOUND error
+    resolved = {}
+    for index, full_name in enumerate(names):
+        repository = data.get(f"r{index}") or {}
+        resolved[full_name] = next((repository[f] for f in _DATE_FIELDS if repository.get(f)), None)
+    return resolved
+
+
+@traced("enrich_repositories")
+def enrich_repositories(
+    results: Iterable[Union[SearchHit, Dict[str, Any]]],
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    cache: RepoMetadataCache = repo_cache,
+    progress_callback: Optional[Callable[[int, int], None]] = None
+) -> Dict[str, str]:
+    """
+    Resolve the last activity date of every repository in the results that has none.
+
+    Args:
+        results: Search hits carrying `repository` and `repository_date`
+        batch_size: Repositories per GraphQL request (at most 100)
+        cache: TTL cache to read from and populate
+        progress_callback: Called with (completed, total) as batches finish
+
+    Returns:
+        Dict mapping repository full name to its date, in the format search items use
+    """
+    dates: Dict[str, str] = {}
+    pending: List[str] = []
+    seen = set()
+    for hit in map(as_hit, results):
+        full_name = hit.repository
+        if not full_name or "/" not in full_name or hit.repository_date or full_name in seen:
+            continue
+        seen.add(full_name)
+        found, date = cache.lookup(full_name)
+        if not found:
+            pending.append(full_name)
+        elif date:
+            dates[full_name] = date
+
+    logger.info(f"Repository enrichment: {len(dates)} cached, {len(pending)} to resolve")
+    if not pending:
+        return dates
+
+    token_rotator = get_token_rotator()
+    tokens = token_rotator.allocate_tokens(1)
+    if not tokens:
+        logger.error("No tokens available for repository enrichment")
+        return dates
+    pool_id = id(threading.current_thread())
+    url = os.getenv("GITHUB_GRAPHQL_URL", DEFAULT_GRAPHQL_URL)
+    batch_size = max(1, min(batch_size, DEFAULT_BATCH_SIZE))
+    batches = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+
+    sent = 0
+    try:
+        with requests.Session() as session:
+            for completed, names in enumerate(batches, 1):
+                sent += 1
+                try:
+                    resolved = _resolve_batch(session, url, tokens[0], names)
+                except (requests.exceptions.RequestException, ValueError) as e:
+                    logger.warning(f"Error resolving repositories: {str(e)}")
+                    resolved = None
+                if resolved is None:
+                    # Rate limited or unavailable, the remaining batches would fail too
+                    break
+                for full_name, date in resolved.items():
+                    cache.put(full_name, date)
+                    if date:
+                        dates[full_name] = date
+                if progress_callback:
+                    progress_callback(completed, len(batches))
+    finally:
+        token_rotator.release_tokens(pool_id)
+
+    logger.info(f"Repository enrichment complete: {len(dates)} repositories dated with {sent} GraphQL requests")
+    return dates
@@ -0,0 +1,296 @@
+"""
+Timeouts, deadlines, stall detection and hedged retries for GitHub API requests.
+
+Every request gets a connect and a read timeout (REQUEST_CONNECT_TIMEOUT,
+REQUEST_READ_TIMEOUT). The read timeout only bounds the wait for each chunk,
+so a server trickling bytes could still hold a worker forever; `guarded_get`
+reads the body in chunks and gives up once REQUEST_DEADLINE seconds have
+passed since the request started.
+
+A watchdog thread flags requests that have been in flight longer than
+STALL_SECONDS, logging the worker and request and updating the
+gitsentry_stalled_requests gauge, so hangs that no timeout covers (such as
+DNS resolution) still show up.
+
+With HEDGED_REQUESTS=true, a request that has not answered after the p95 of
+its endpoint's latency histogram is sent a second time and the first answer
+wins. The hedge leases its own request slot and token from the search
+scheduler, and is not sent when none is free right away. It still spends
+rate limit on a request that would probably have answered, so it is off by
+default.
+"""
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+import requests
+from urllib3.exceptions import ReadTimeoutError
+
+import metrics
+from tracing import env_flag, in_scan_context
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONNECT_TIMEOUT = 10
+DEFAULT_READ_TIMEOUT = 30
+DEFAULT_REQUEST_DEADLINE = 120
+DEFAULT_STALL_SECONDS = 90
+WATCHDOG_INTERVAL = 5
+
+# Hedge after this latency quantile, once the histogram has enough observations
+HEDGE_QUANTILE = 0.95
+MIN_HEDGE_SAMPLES = 20
+MIN_HEDGE_DELAY = 0.5
+HEDGE_WORKERS = 32
+
+_CHUNK_SIZE = 64 * 1024
+
+
+def request_timeouts() -> Tuple[float, float]:
+    """The (connect, read) timeout for every GitHub API request"""
+    return (
+        float(os.getenv("REQUEST_CONNECT_TIMEOUT", DEFAULT_CONNECT_TIMEOUT)),
+        float(os.getenv("REQUEST_READ_TIMEOUT", DEFAULT_READ_TIMEOUT))
+    )
+
+
+def request_deadline() -> float:
+    """Seconds a request may take in total, including reading the body"""
+    return float(os.getenv("REQUEST_DEADLINE", DEFAULT_REQUEST_DEADLINE))
+
+
+class DeadlineExceeded(requests.exceptions.Timeout):
+    """The response did not arrive in full before the request deadline."""
+
+
+class StallWatchdog:
+    """Tracks requests in flight and flags those running longer than a threshold."""
+
+    def __init__(self, stall_seconds: float = DEFAULT_STALL_SECONDS, interval: float = WATCHDOG_INTERVAL):
+        self.stall_seconds = stall_seconds
+        self.interval = interval
+        self.lock = threading.Lock()
+        # request id -> (started at, worker thread name, endpoint, detail)
+        self._in_flight: Dict[int, Tuple[float, str, str, str]] = {}
+        self._flagged = set()
+        self._next_id = 0
+        self._thread = None
+
+    @contextmanager
+    def track(self, endpoint: str, detail: str = ""):
+        """Register a request as in flight for the duration of the block"""
+        self._ensure_started()
+        with self.lock:
+            request_id = self._next_id
+            self._next_id += 1
+            self._in_flight[request_id] = (time.monotonic(), threading.current_thread().name, endpoint, detail)
+        try:
+            yield
+        finally:
+            with self.lock:
+                del self._in_flight[request_id]
+                if request_id in self._flagged:
+                    self._flagged.discard(request_id)
+                    logger.info(f"Stalled {endpoint} request recovered: {detail}")
+
+    def stalled(self) -> List[Dict[str, object]]:
+        """Requests in flight longer than the stall threshold"""
+        now = time.monotonic()
+        with self.lock:
+            return [
+                {"id": request_id, "worker": worker, "endpoint": endpoint, "detail": detail, "seconds": now - started}
+                for request_id, (started, worker, endpoint, detail) in self._in_flight.items()
+                if now - started > self.stall_seconds
+            ]
+
+    def check(self) -> List[Dict[str, object]]:
+        """Flag newly stalled requests and update the stalled requests gauge"""
+        stalled = self.stalled()
+        with self.lock:
+            new = [s for s in stalled if s["id"] not in self._flagged]
+            self._flagged.update(s["id"] for s in new)
+        for s in new:
+            logger.warning(f"Stalled {s['endpoint']} request on worker {s['worker']}: "
+                           f"{s['seconds']:.0f}s in flight ({s['detail']})")
+        metrics.STALLED_REQUESTS.set(len(stalled))
+        return stalled
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.check()
+            except Exception as e:
+                logger.error(f"Stall watchdog error: {str(e)}")
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self.lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="stall-watchdog", daemon=True)
+                    self._thread.start()
+
+
+watchdog = StallWatchdog(float(os.getenv("STALL_SECONDS", DEFAULT_STALL_SECONDS)))
+
+_hedge_executor = None
+_hedge_lock = threading.Lock()
+# Hedges do not share a connection pool with the requests they duplicate
+_hedge_sessions = threading.local()
+
+
+def _get_hedge_executor() -> ThreadPoolExecutor:
+    global _hedge_executor
+    with _hedge_lock:
+        if _hedge_executor is None:
+            _hedge_executor = ThreadPoolExecutor(max_workers=HEDGE_WORKERS, thread_name_prefix="hedge")
+        return _hedge_executor
+
+
+def _get_hedge_session() -> requests.Session:
+    session = getattr(_hedge_sessions, "session", None)
+    if session is None:
+        session = _hedge_sessions.session = requests.Session()
+    return session
+
+
+def hedge_delay(endpoint: str) -> Optional[float]:
+    """Seconds after which to hedge a request, or None until the latency histogram has enough samples"""
+    if metrics.REQUEST_LATENCY.count(endpoint=endpoint) < MIN_HEDGE_SAMPLES:
+        return None
+    return max(MIN_HEDGE_DELAY, metrics.REQUEST_LATENCY.quantile(HEDGE_QUANTILE, endpoint=endpoint))
+
+
+def _abort(response: requests.Response) -> None:
+    """Shut down a response's connection so a blocked read returns"""
+    shutdown = getattr(response.raw, "shutdown", None)  # urllib3 2.3+
+    if shutdown is not None:
+        shutdown()
+    response.close()
+
+
+def _attempt(session: requests.Session, url: str, endpoint: str, detail: str, deadline: float, **kwargs) -> requests.Response:
+    """Send one request and read its body, within the timeouts and the deadline"""
+    started = time.monotonic()
+    with watchdog.track(endpoint, detail or url):
+        try:
+            response = session.get(url, stream=True, timeout=request_timeouts(), **kwargs)
+        except requests.exceptions.ConnectTimeout:
+            metrics.REQUEST_TIMEOUTS.inc(endpoint=endpoint, phase="connect")
+            raise
+        except requests.exceptions.ReadTimeout:
+            metrics.REQUEST_TIMEOUTS.inc(endpoint=endpoint, phase="read")
+            raise
+        # A read blocked on a trickling connection only notices the deadline once
+        # the connection is shut down under it
+        remaining = max(0.0, deadline - (time.monotonic() - started))
+        timer = threading.Timer(remaining, _abort, (response,))
+        timer.daemon = True
+        timer.start()
+        try:
+            body = bytearray()
+            for chunk in response.iter_content(chunk_size=_CHUNK_SIZE):
+                body.extend(chunk)
+                if time.monotonic() - started > deadline:
+                    break
+        except requests.exceptions.RequestException as e:
+            response.close()
+            if time.monotonic() - started <= deadline:
+                # A read timeout in the middle of the body surfaces as a connection error
+                if e.args and isinstance(e.args[0], ReadTimeoutError):
+                    metrics.REQUEST_TIMEOUTS.inc(endpoint=endpoint, phase="read")
+                    raise requests.exceptions.ReadTimeout(str(e)) from e
+                raise
+        except Exception:
+            response.close()
+            raise
+        finally:
+            timer.cancel()
+        if time.monotonic() - started > deadline:
+            response.close()
+            metrics.REQUEST_TIMEOUTS.inc(endpoint=endpoint, phase="deadline")
+            raise DeadlineExceeded(f"No complete response within {deadline:.0f}s from {url}")
+        # The body is read, later response.json() and response.text use it
+        response._content = bytes(body)
+        response.close()
+        return response
+
+
+def _hedge_attempt(scheduler, token: str, url: str, endpoint: str, detail: str, deadline: float,
+                   **kwargs) -> requests.Response:
+    """Send a hedge with a token leased from the scheduler, and give the token back"""
+    response = None
+    try:
+        response = _attempt(_get_hedge_session(), url, endpoint, detail, deadline, **kwargs)
+        return response
+    finally:
+        scheduler.release(token, response)
+
+
+def guarded_get(session: requests.Session, url: str, endpoint: str, detail: str = "",
+                hedge: bool = None, scheduler=None, **kwargs) -> requests.Response:
+    """
+    GET a URL with connect/read timeouts, a total deadline and optional hedging.
+
+    Args:
+        session: Session to send the request with
+        url: URL to fetch
+        endpoint: Endpoint label for metrics, e.g. "search"
+        detail: Description of the request for stall warnings (default: the URL)
+        hedge: Whether to send a duplicate request after the p95 latency
+            (default: the HEDGED_REQUESTS setting)
+        scheduler: SearchScheduler to lease the hedge's request slot and token
+            from; without one, requests are never hedged
+        **kwargs: Passed to session.get (headers, params, ...)
+
+    Returns:
+        The response with its body already read
+
+    Raises:
+        requests.exceptions.RequestException, including DeadlineExceeded and
+        Timeout subclasses, if the request (and its hedge) failed
+    """
+    deadline = request_deadline()
+    if hedge is None:
+        hedge = env_flag("HEDGED_REQUESTS")
+    delay = hedge_delay(endpoint) if hedge and scheduler is not None else None
+    if delay is None:
+        return _attempt(session, url, endpoint, detail, deadline, **kwargs)
+
+    executor = _get_hedge_executor()
+    primary = executor.submit(in_scan_context(_attempt), session, url, endpoint, detail, deadline, **kwargs)
+    done, _ = wait([primary], timeout=delay)
+    if done:
+        return primary.result()
+
+    token = scheduler.try_acquire()
+    if token is None:
+        # Every slot or token is taken, a hedge would only compete with other requests
+        return primary.result()
+    metrics.HEDGED_REQUESTS.inc(endpoint=endpoint)
+    metrics.REQUESTS_SENT.inc(endpoint=endpoint)
+    logger.debug(f"Hedging {endpoint} request after {delay:.2f}s: {detail or url}")
+    hedge_kwargs = dict(kwargs)
+    hedge_kwargs["headers"] = {**kwargs.get("headers", {}), "Authorization": f"Bearer {token}"}
+    if "params" in kwargs:
+        # The caller reuses its params for the next page once an answer is back
+        hedge_kwargs["params"] = dict(kwargs["params"])
+    hedged = executor.submit(in_scan_context(_hedge_attempt), scheduler, token, url, endpoint,
+                             f"{detail or url} (hedge)", deadline, **hedge_kwargs)
+    pending = {primary, hedged}
+    error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                if future is hedged:
+                    metrics.HEDGE_WINS.inc(endpoint=endpoint)
+                # The slower request finishes in the background, its response is already closed
+                return future.result()
+            error = future.exception()
+    raise error
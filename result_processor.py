@@ -1,6 +1,70 @@
 import re
+import os
 import json
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
 from datetime import datetime
+from search_records import as_hit
+from match_batches import batch_findall, batch_separator
+from match_windows import window_plan, windowed_findall
+from suppression import SuppressionRules, get_suppression_rules
+import metrics
+from tracing import env_flag, traced
+
+logger = logging.getLogger(__name__)
+
+# Processed output of recent scans, keyed by (scan id, pattern, collapse mode)
+MAX_MEMOIZED_SCANS = 16
+_scan_outputs = OrderedDict()
+# Keys being processed right now, so concurrent callers wait for that one run
+_scan_in_progress = {}
+_scan_outputs_lock = threading.Lock()
+
+DEFAULT_FRAGMENT_MEMO_SIZE = 200000
+
+class FragmentMatchMemo:
+    """
+    Bounded LRU of match lists keyed by (pattern, digest of the matched text).
+    
+    Forks, vendored libraries and copied config templates return the same
+    fragment text many times, so each distinct text is matched once per
+    pattern, within a scan and across scans.
+    """
+    
+    def __init__(self, max_entries: int = DEFAULT_FRAGMENT_MEMO_SIZE):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self._entries = OrderedDict()
+    
+    @staticmethod
+    def digest(text: str) -> bytes:
+        return hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+    
+    def get(self, key: tuple):
+        """Get the memoized matches for a key, or None if not memoized"""
+        with self.lock:
+            matches = self._entries.get(key)
+            if matches is not None:
+                self._entries.move_to_end(key)
+            return matches
+    
+    def put(self, key: tuple, matches: list) -> None:
+        with self.lock:
+            self._entries[key] = tuple(matches)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def __len__(self) -> int:
+        with self.lock:
+            return len(self._entries)
+
+# Shared so identical fragments in later scans are not matched again
+fragment_memo = FragmentMatchMemo(int(os.getenv("FRAGMENT_MEMO_SIZE", DEFAULT_FRAGMENT_MEMO_SIZE)))
 
 def extract_matches(snippet: str, pattern: str) -> list:
     """Extract all matches of the pattern in the snippet."""
@@ -11,72 +75,226 @@ def extract_matches(snippet: str, pattern: str) -> list:
     except re.error:
         return []
 
-def process_results(results: list, pattern: str) -> list:
-    """Process search results and extract matches."""
+def build_result(repository: str, file_path: str, html_url: str, last_modified: str,
+                 collected: list, fragments: list) -> dict:
+    """Build the per-file result record for a list of collected matches."""
+    # Deduplicate tokens for this file
+    unique_tokens = list(set(collected))
+    return {
+        "repository": repository,
+        "file_path": file_path,
+        "html_url": html_url,
+        "last_modified": last_modified or "N/A",
+        "found_tokens": unique_tokens,
+        "total_matches_in_file": len(collected),  # Total matches before deduplication
+        "unique_matches_in_file": len(unique_tokens),  # Unique matches in this file
+        "found_date": datetime.now().strftime("%d:%m:%Y"),
+        "fragments": fragments
+    }
+
+def add_match_statistics(processed: list, memo_stats: dict = None, suppressed: dict = None) -> list:
+    """Add match statistics to the first result if we have any results."""
+    if processed:
+        all_unique_tokens = set()
+        for result in processed:
+            all_unique_tokens.update(result["found_tokens"])
+        processed[0]["match_statistics"] = {
+            "total_files_with_matches": len(processed),
+            "total_matches_found": sum(r["total_matches_in_file"] for r in processed),
+            "total_unique_matches_in_files": sum(r["unique_matches_in_file"] for r in processed),
+            "total_unique_tokens_overall": len(all_unique_tokens)
+        }
+        if any("locations" in r for r in processed):
+            # Collapsed output: the totals above count each blob once, these count every copy
+            processed[0]["match_statistics"].update({
+                "total_unique_blobs": len(processed),
+                "total_locations": sum(r["location_count"] for r in processed),
+                "total_matches_across_locations": sum(r["total_matches_in_file"] * r["location_count"] for r in processed)
+            })
+        if memo_stats is not None:
+            lookups = memo_stats["lookups"]
+            processed[0]["match_statistics"].update({
+                "fragment_memo_lookups": lookups,
+                "fragment_memo_hits": memo_stats["hits"],
+                "fragment_memo_hit_rate": round(memo_stats["hits"] / lookups, 4) if lookups else 0.0
+            })
+        if suppressed is not None:
+            processed[0]["match_statistics"]["suppressed"] = dict(suppressed)
+    return processed
+
+def collapse_duplicates(processed: list, keys: list) -> list:
+    """
+    Group result records that share a blob into one record listing every location.
+    
+    The first record of each group is kept as the canonical one and gains
+    blob_sha, location_count and locations (repository, file_path, html_url
+    and last_modified of every copy, including its own).
+    """
+    groups = OrderedDict()
+    for result, key in zip(processed, keys):
+        groups.setdefault(key, []).append(result)
+    collapsed = []
+    for key, group in groups.items():
+        canonical = dict(group[0])
+        canonical["blob_sha"] = key if not key.startswith("fragments:") else None
+        canonical["location_count"] = len(group)
+        canonical["locations"] = [
+            {
+                "repository": r["repository"],
+                "file_path": r["file_path"],
+                "html_url": r["html_url"],
+                "last_modified": r["last_modified"]
+            }
+            for r in group
+        ]
+        collapsed.append(canonical)
+    return collapsed
+
+@traced("process_results")
+def process_results(results: list, pattern: str, blob_texts: dict = None, windowed: bool = None,
+                    batched: bool = None, repo_dates: dict = None, memo: FragmentMatchMemo = fragment_memo,
+                    collapse: bool = None, suppression: SuppressionRules = None) -> list:
+    """
+    Process search results and extract matches.
+    
+    Results may be compact SearchHit records or raw search items.
+    
+    If blob_texts maps an item's blob sha to its full file content, the pattern
+    is matched against the whole file instead of the text_matches fragments.
+    
+    If windowed is True (default: the WINDOWED_MATCHING setting), fragments are
+    only matched in windows around the highlighted query terms where the
+    pattern allows it, see `match_windows`.
+    
+    If batched is True (default: the BATCH_MATCHING setting, on unless disabled),
+    the remaining texts are matched in a few large buffers instead of one
+    findall call each where the pattern allows it, see `match_batches`.
+    
+    repo_dates maps a repository to a last activity date resolved by
+    `repo_enrichment`, used when the search item has none.
+    
+    Texts already matched against the pattern are served from memo (pass None
+    or set FRAGMENT_MEMO_SIZE=0 to disable); its hit rate is added to
+    match_statistics.
+    
+    If collapse is True (default: the COLLAPSE_DUPLICATES setting), copies of
+    the same blob (by sha, or by fragment hash when the sha is missing) are
+    collapsed into one record listing all their locations.
+    
+    Hits excluded by the suppression rules (default: the SUPPRESSION_RULES
+    file) are dropped before any matching, and matches that are known dummy
+    tokens afterwards; match_statistics["suppressed"] counts both per rule.
+    """
     processed = []
-    total_matches = 0
-    total_unique_matches = 0
-    all_unique_tokens = set()
-    
-    for item in results:
-        text_matches = item.get("text_matches", [])
-        collected = []
-        fragments = []  # Store the original fragments
-        for tm in text_matches:
-            fragment = tm.get("fragment", "")
-            fragments.append(fragment)  # Store the fragment
-            matches = extract_matches(fragment, pattern)
-            if matches:
-                total_matches += len(matches)
-                collected.extend(matches)
-        
-        if collected:
-            # Deduplicate tokens for this file
-            unique_tokens = list(set(collected))
-            total_unique_matches += len(unique_tokens)
-            all_unique_tokens.update(unique_tokens)
-            
-            # Try to get the most relevant date from multiple possible fields
+    # Per record, the blob it came from, for collapsing copies
+    blob_keys = []
+    blob_texts = blob_texts or {}
+    repo_dates = repo_dates or {}
+    start_time = time.monotonic()
+    if windowed is None:
+        windowed = env_flag("WINDOWED_MATCHING")
+    if batched is None:
+        batched = env_flag("BATCH_MATCHING", default=True)
+    if collapse is None:
+        collapse = env_flag("COLLAPSE_DUPLICATES")
+    plan = window_plan(pattern) if windowed else None
+    
+    if memo is not None and memo.max_entries <= 0:
+        memo = None
+    memo_stats = {"lookups": 0, "hits": 0}
+    if suppression is None:
+        suppression = get_suppression_rules()
+    suppressed = {}
+    
+    hits = [as_hit(item) for item in results]
+    if suppression:
+        hits = [hit for hit in hits if suppression.suppress_hit(hit, suppressed) is None]
+    collected = [[] for _ in hits]
+    # Texts still to be matched with the whole pattern, the hits each belongs to and its digest
+    texts = []
+    owners = []
+    digests = []
+    # Digest -> index in texts, so copies within this scan are matched once
+    queued = {}
+    
+    def queue_text(text, index):
+        if memo is None:
+            texts.append(text)
+            owners.append([index])
+            return
+        digest = memo.digest(text)
+        memo_stats["lookups"] += 1
+        cached = memo.get((pattern, digest))
+        if cached is not None:
+            memo_stats["hits"] += 1
+            collected[index].extend(cached)
+        elif digest in queued:
+            memo_stats["hits"] += 1
+            owners[queued[digest]].append(index)
+        else:
+            queued[digest] = len(texts)
+            texts.append(text)
+            owners.append([index])
+            digests.append(digest)
+    
+    for index, hit in enumerate(hits):
+        full_text = blob_texts.get(hit.sha)
+        if full_text is not None:
+            queue_text(full_text, index)
+            continue
+        for text, indices in zip(hit.fragments, hit.match_indices):
+            found = windowed_findall(text, plan, indices) if plan else None
+            if found is None:
+                queue_text(text, index)
+            else:
+                collected[index].extend(found)
+    
+    separator = batch_separator(pattern) if batched else None
+    if separator is not None:
+        found = batch_findall(re.compile(pattern), texts, separator)
+        matches_per_text = (found.get(text_index, []) for text_index in range(len(texts)))
+    else:
+        matches_per_text = (extract_matches(text, pattern) for text in texts)
+    for text_index, matches in enumerate(matches_per_text):
+        for index in owners[text_index]:
+            collected[index].extend(matches)
+        if memo is not None:
+            memo.put((pattern, digests[text_index]), matches)
+    
+    for hit, matches in zip(hits, collected):
+        if matches and suppression:
+            matches = suppression.filter_matches(matches, suppressed)
+        if matches:
+            # Repository date in order of preference: pushed_at, updated_at, created_at
             last_modified = None
+            repository_date = hit.repository_date or repo_dates.get(hit.repository)
             try:
-                # Try different date fields in order of preference
-                if item.get("repository", {}).get("pushed_at"):
-                    last_modified = item["repository"]["pushed_at"]
-                elif item.get("repository", {}).get("updated_at"):
-                    last_modified = item["repository"]["updated_at"]
-                elif item.get("repository", {}).get("created_at"):
-                    last_modified = item["repository"]["created_at"]
-                
-                if last_modified:
+                if repository_date:
                     last_modified = datetime.strptime(
-                        last_modified,
+                        repository_date,
                         "%Y-%m-%dT%H:%M:%SZ"
                     ).strftime("%Y-%m-%d %H:%M:%S UTC")
-            except (ValueError, KeyError):
+            except ValueError:
                 pass
             
-            result_info = {
-                "repository": item.get("repository", {}).get("full_name"),
-                "file_path": item.get("path"),
-                "html_url": item.get("html_url"),
-                "last_modified": last_modified or "N/A",
-                "found_tokens": unique_tokens,
-                "total_matches_in_file": len(collected),  # Total matches before deduplication
-                "unique_matches_in_file": len(unique_tokens),  # Unique matches in this file
-                "found_date": datetime.now().strftime("%d:%m:%Y"),
-                "fragments": fragments
-            }
-            processed.append(result_info)
-    
-    # Add match statistics to the first result if we have any results
-    if processed:
-        processed[0]["match_statistics"] = {
-            "total_files_with_matches": len(processed),
-            "total_matches_found": total_matches,
-            "total_unique_matches_in_files": total_unique_matches,
-            "total_unique_tokens_overall": len(all_unique_tokens)
-        }
+            processed.append(build_result(
+                hit.repository,
+                hit.path,
+                hit.html_url,
+                last_modified,
+                matches,
+                list(hit.fragments)  # Store the original fragments
+            ))
+            blob_keys.append(hit.sha or "fragments:" + FragmentMatchMemo.digest("\x00".join(hit.fragments)).hex())
     
+    if collapse:
+        processed = collapse_duplicates(processed, blob_keys)
+    add_match_statistics(processed, memo_stats if memo is not None else None, suppressed if suppression else None)
+    if suppressed:
+        logger.info(f"Suppressed {sum(suppressed.values())} items: {suppressed}")
+    metrics.ITEMS_PROCESSED.inc(len(results))
+    metrics.MATCHES_FOUND.inc(processed[0]["match_statistics"]["total_matches_found"] if processed else 0)
+    metrics.PROCESSING_SECONDS.observe(time.monotonic() - start_time)
     return processed
 
 def sanitize_filename(filename):
@@ -86,6 +304,7 @@ def sanitize_filename(filename):
         filename = filename.replace(char, '-')
     return filename
 
+@traced("save_results")
 def save_results(results: list, pattern: str) -> tuple:
     """Save results to JSON files and return file paths and error status."""
     timestamp = datetime.now().strftime("%d:%m:%Y_%H:%M:%S")
@@ -138,4 +357,70 @@ def save_results(results: list, pattern: str) -> tuple:
     if error_occurred:
         return None, None, error_message # Return error message
     else:
-        return tokens_file, detailed_file, None # Return None for error message 
\ No newline at end of file
+        return tokens_file, detailed_file, None # Return None for error message 
+
+def process_scan(scan_id: str, pattern: str, results: list, blob_texts: dict = None, on_processed=None,
+                 repo_dates: dict = None, collapse: bool = None) -> dict:
+    """
+    Process and save a scan's results once per (scan id, pattern, collapse mode).
+    
+    UI reruns call this on every render; only the first call for a given scan
+    and pattern runs the regex pass and writes output files, later calls
+    return the memoized summary. Concurrent calls for the same key wait for
+    the first one; calls for other scans are not blocked by it.
+    
+    Args:
+        scan_id: Identifier of the scan that produced the results
+        pattern: Regex pattern to match
+        results: Search hits of the scan
+        blob_texts: Optional full file contents keyed by blob sha
+        on_processed: Called once with the processed results when they are first computed
+        repo_dates: Optional last activity dates keyed by repository
+        collapse: Whether to collapse copies of the same blob into one record
+    
+    Returns:
+        Dict with result_count, total_tokens, match_statistics, tokens_file,
+        detailed_file and save_error
+    """
+    key = (scan_id, pattern, collapse)
+    with _scan_outputs_lock:
+        if key in _scan_outputs:
+            _scan_outputs.move_to_end(key)
+            return _scan_outputs[key]
+        pending = _scan_in_progress.get(key)
+        if pending is None:
+            pending = _scan_in_progress[key] = Future()
+            owner = True
+        else:
+            owner = False
+    if not owner:
+        return pending.result()
+    
+    # Matching and saving run outside the lock, other scans are not held up by this one
+    try:
+        processed = process_results(results, pattern, blob_texts, repo_dates=repo_dates, collapse=collapse)
+        output = {
+            "result_count": len(processed),
+            "total_tokens": sum(len(r["found_tokens"]) for r in processed),
+            "match_statistics": processed[0].get("match_statistics", {}) if processed else {},
+            "tokens_file": None,
+            "detailed_file": None,
+            "save_error": None
+        }
+        if processed:
+            output["tokens_file"], output["detailed_file"], output["save_error"] = save_results(processed, pattern)
+            if on_processed:
+                on_processed(processed)
+    except BaseException as e:
+        with _scan_outputs_lock:
+            del _scan_in_progress[key]
+        pending.set_exception(e)
+        raise
+    
+    with _scan_outputs_lock:
+        del _scan_in_progress[key]
+        _scan_outputs[key] = output
+        while len(_scan_outputs) > MAX_MEMOIZED_SCANS:
+            _scan_outputs.popitem(last=False)
+    pending.set_result(output)
+    return output
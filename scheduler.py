@@ -0,0 +1,275 @@
+"""
+Budget-driven scheduling of search requests.
+
+Instead of running extended-search partitions in fixed batches separated by a
+flat cooldown, every partition is submitted at once to a persistent worker
+pool, and each page request asks the scheduler for a token first. The
+scheduler tracks each token's remaining search budget from the rate-limit
+headers of its responses and hands out the token with the most budget left,
+so the next page goes out the moment any token can serve it. When every token
+is exhausted, requests wait only until the earliest reset.
+
+How many requests are in flight is adapted with AIMD (additive increase,
+multiplicative decrease): each successful response raises the limit by about
+one per round of requests, and a secondary rate-limit response halves it. The
+limit never exceeds MAX_CONCURRENT_REQUESTS, which all scan jobs share.
+"""
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional, Tuple
+
+import metrics
+from cancellation import CancellationToken
+from config import get_github_tokens
+from tracing import in_scan_context
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_CONCURRENT_REQUESTS = 8
+INITIAL_CONCURRENCY = 2
+# Seconds a token rests after a secondary rate limit response without Retry-After
+SECONDARY_LIMIT_REST = 60
+# Partition searches that can be waiting for or holding a request at once
+DEFAULT_POOL_SIZE = 32
+
+
+class NoTokensError(RuntimeError):
+    """The scheduler was created without any GitHub tokens."""
+
+
+class AIMDLimiter:
+    """Concurrency limit that grows additively on success and halves when throttled."""
+
+    def __init__(self, initial: float, minimum: float = 1, maximum: float = DEFAULT_MAX_CONCURRENT_REQUESTS,
+                 increase: float = 1.0, decrease: float = 0.5):
+        self.minimum = minimum
+        self.maximum = max(minimum, maximum)
+        self.limit = min(max(initial, minimum), self.maximum)
+        self.increase = increase
+        self.decrease = decrease
+        self.in_flight = 0
+        self.condition = threading.Condition()
+        metrics.SEARCH_CONCURRENCY.set(self.limit)
+
+    def acquire(self, cancel_token: CancellationToken) -> bool:
+        """Wait for a request slot; returns False if the scan is cancelled first"""
+        with self.condition:
+            while self.in_flight >= int(self.limit):
+                if cancel_token.cancelled:
+                    return False
+                self.condition.wait(0.5)
+            self.in_flight += 1
+            return True
+
+    def try_acquire(self) -> bool:
+        """Take a request slot only if one is free right now"""
+        with self.condition:
+            if self.in_flight >= int(self.limit):
+                return False
+            self.in_flight += 1
+            return True
+
+    def release(self, throttled: Optional[bool]) -> None:
+        """
+        Free a request slot and adapt the limit.
+
+        Args:
+            throttled: True after a secondary rate limit, False after a success,
+                None when the outcome says nothing about concurrency
+        """
+        with self.condition:
+            self.in_flight -= 1
+            if throttled:
+                self.limit = max(self.minimum, self.limit * self.decrease)
+                logger.info(f"Secondary rate limit hit, search concurrency reduced to {int(self.limit)}")
+            elif throttled is False:
+                # About +1 after a full round of successful requests
+                self.limit = min(self.maximum, self.limit + self.increase / self.limit)
+            metrics.SEARCH_CONCURRENCY.set(self.limit)
+            self.condition.notify_all()
+
+
+@dataclass
+class TokenBudget:
+    """What is known about one token's search rate limit."""
+    token: str
+    remaining: Optional[int] = None  # None until the first response reports it
+    reset_at: float = 0.0
+    resting_until: float = 0.0
+    in_flight: int = 0
+
+    def available_at(self, now: float) -> float:
+        if self.resting_until > now:
+            return self.resting_until
+        if self.remaining is not None and self.remaining <= 0 and self.reset_at > now:
+            return self.reset_at
+        return now
+
+
+class SearchScheduler:
+    """Hands out tokens by remaining budget and runs partition searches on a persistent pool."""
+
+    def __init__(self, tokens, max_concurrent_requests: int = DEFAULT_MAX_CONCURRENT_REQUESTS,
+                 pool_size: int = DEFAULT_POOL_SIZE):
+        self.lock = threading.Lock()
+        self.budgets: Dict[str, TokenBudget] = {token: TokenBudget(token) for token in tokens}
+        self.limiter = AIMDLimiter(INITIAL_CONCURRENCY, maximum=max_concurrent_requests)
+        self.pool = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="search-partition")
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        """Run a partition search on the persistent pool, under the submitting scan's trace"""
+        return self.pool.submit(in_scan_context(fn), *args, **kwargs)
+
+    def _lease_token(self) -> Tuple[Optional[str], float]:
+        """Take the token with the most budget left, or return how long until one is available"""
+        now = time.time()
+        with self.lock:
+            ready = [budget for budget in self.budgets.values() if budget.available_at(now) <= now]
+            if not ready:
+                return None, min(budget.available_at(now) for budget in self.budgets.values()) - now
+            budget = max(ready, key=lambda b: (b.remaining if b.remaining is not None else float("inf"), -b.in_flight))
+            if budget.remaining is not None:
+                budget.remaining -= 1
+            budget.in_flight += 1
+            return budget.token, 0.0
+
+    def acquire(self, cancel_token: CancellationToken,
+                on_wait: Optional[Callable[[float], None]] = None) -> Optional[str]:
+        """
+        Wait for a request slot and a token with budget.
+
+        Args:
+            cancel_token: Stops the wait when the scan is cancelled
+            on_wait: Called with the expected wait in seconds when every token is exhausted
+
+        Returns:
+            The token to send the request with, or None if the scan was cancelled
+
+        Raises:
+            NoTokensError: If the scheduler has no tokens at all
+        """
+        if not self.budgets:
+            raise NoTokensError("No tokens available for allocation")
+        if not self.limiter.acquire(cancel_token):
+            return None
+        waited_since = None
+        try:
+            while True:
+                token, wait_seconds = self._lease_token()
+                if token:
+                    if waited_since is not None:
+                        metrics.RATE_LIMIT_WAIT_SECONDS.inc(time.monotonic() - waited_since)
+                    return token
+                if waited_since is None:
+                    waited_since = time.monotonic()
+                    if on_wait:
+                        on_wait(wait_seconds)
+                if cancel_token.wait(min(max(wait_seconds, 0.1), 1.0)):
+                    self.limiter.release(None)
+                    return None
+        except BaseException:
+            # The slot was never handed out with a token, so nothing else frees it
+            self.limiter.release(None)
+            raise
+
+    def try_acquire(self) -> Optional[str]:
+        """Get a request slot and a token only if both are available right now, for hedged requests"""
+        if not self.budgets or not self.limiter.try_acquire():
+            return None
+        token, _ = self._lease_token()
+        if token is None:
+            self.limiter.release(None)
+        return token
+
+    def release(self, token: str, response=None) -> bool:
+        """
+        Record what a response says about the token's budget and free the request slot.
+
+        Returns:
+            True if the response was a primary or secondary rate limit, so the
+            request should be retried with another token; any other 403 is an error
+        """
+        throttled = None
+        limit = rate_limit_kind(response) if response is not None else None
+        now = time.time()
+        with self.lock:
+            budget = self.budgets[token]
+            budget.in_flight -= 1
+            # A hedge sent with another token may have answered this request; its
+            # headers describe that token's budget, which its own release records
+            if response is not None and _sent_with(response, token):
+                headers = response.headers
+                if headers.get("X-RateLimit-Remaining", "").isdigit():
+                    budget.remaining = int(headers["X-RateLimit-Remaining"])
+                if headers.get("X-RateLimit-Reset", "").isdigit():
+                    budget.reset_at = float(headers["X-RateLimit-Reset"])
+                if limit == "retry_after":
+                    budget.resting_until = now + int(headers["Retry-After"])
+                    throttled = True
+                elif limit == "primary":
+                    # The budget is spent, wait for the reset but keep the concurrency
+                    budget.resting_until = max(budget.reset_at, now + 1)
+                elif limit == "secondary":
+                    budget.resting_until = now + SECONDARY_LIMIT_REST
+                    throttled = True
+                elif response.status_code == 200:
+                    throttled = False
+        self.limiter.release(throttled)
+        return limit is not None
+
+
+def _sent_with(response, token: str) -> bool:
+    request = getattr(response, "request", None)
+    if request is None:
+        return True
+    authorization = request.headers.get("Authorization")
+    return authorization is None or authorization == f"Bearer {token}"
+
+
+def rate_limit_kind(response) -> Optional[str]:
+    """
+    Classify a 403 or 429 response as a rate limit.
+
+    Returns:
+        "retry_after" if GitHub said how long to wait, "primary" if the budget
+        is spent, "secondary" for a secondary rate limit, or None for any other
+        response (a 403 permission error, say)
+    """
+    if response.status_code not in (403, 429):
+        return None
+    if response.headers.get("Retry-After", "").isdigit():
+        return "retry_after"
+    if response.headers.get("X-RateLimit-Remaining") == "0":
+        return "primary"
+    if response.status_code == 429 or is_secondary_limit(response):
+        return "secondary"
+    return None
+
+
+def is_secondary_limit(response) -> bool:
+    """Check whether a 403 response is GitHub's secondary rate limit rather than a permission error"""
+    try:
+        return "secondary rate limit" in response.text.lower()
+    except (AttributeError, ValueError):
+        return False
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> SearchScheduler:
+    """Get the process-wide scheduler shared by every scan job"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = SearchScheduler(
+                get_github_tokens() or [],
+                int(os.getenv("MAX_CONCURRENT_REQUESTS", DEFAULT_MAX_CONCURRENT_REQUESTS))
+            )
+        return _scheduler
@@ -1,7 +1,213 @@
+import math
 import re
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from suppression import get_suppression_rules
+
+try:  # Python 3.11+ moved the regex parser into the re package
+    from re import _parser as sre_parse
+    from re import _constants as sre_constants
+except ImportError:  # pragma: no cover - older interpreters
+    import sre_parse
+    import sre_constants
+
+# GitHub code search limits (see search_api.md)
+MAX_QUERY_LENGTH = 256
+MAX_QUERY_OPERATORS = 5
+MAX_SEARCH_RESULTS = 1000
+RESULTS_PER_PAGE = 100
+
+# Literals shorter than this match almost every file and are not worth searching for
+MIN_TERM_LENGTH = 3
+
+# Rough selectivity model: every alphanumeric character in a term divides the
+# expected number of hits by ten, starting from roughly a billion indexed files.
+_BASE_HITS_EXPONENT = 9.0
+_EXPONENT_PER_CHAR = 1.0
+_AND_FACTOR = 0.1
+
+_REPEAT_OPS = tuple(
+    getattr(sre_constants, name)
+    for name in ("MAX_REPEAT", "MIN_REPEAT", "POSSESSIVE_REPEAT")
+    if hasattr(sre_constants, name)
+)
+
+
+class QueryPlan(NamedTuple):
+    """A candidate code-search query derived from a regex pattern."""
+    query: str
+    terms: Tuple[str, ...]
+    estimated_hits: float
+    estimated_pages: int
+
+
+def _required_literals(items) -> Tuple[List[Tuple[str, ...]], Optional[str]]:
+    """
+    Walk a parsed regex and collect the literals every match must contain.
+
+    Returns a list of requirements, each a tuple of alternatives (one of which
+    must appear), and the literal text of the whole subpattern if it is a pure
+    literal, otherwise None.
+    """
+    requirements = []
+    run = []
+    pure = True
+
+    def flush():
+        if run:
+            requirements.append(("".join(run),))
+            run.clear()
+
+    for op, av in items:
+        if op is sre_constants.LITERAL:
+            run.append(chr(av))
+        elif op is sre_constants.IN and len(av) == 1 and av[0][0] is sre_constants.LITERAL:
+            run.append(chr(av[0][1]))
+        elif op is sre_constants.AT:
+            continue  # Anchors are zero-width, the run stays contiguous
+        elif op is sre_constants.SUBPATTERN:
+            sub_requirements, sub_literal = _required_literals(av[-1])
+            if sub_literal is not None:
+                run.append(sub_literal)
+            else:
+                pure = False
+                flush()
+                requirements.extend(sub_requirements)
+        elif op is sre_constants.BRANCH:
+            pure = False
+            # The parser factors a prefix shared by all branches out in front of them,
+            # so the literal run before the branch belongs to each alternative
+            prefix = [(sre_constants.LITERAL, ord(ch)) for ch in "".join(run)]
+            flush()
+            alternatives = []
+            for branch in av[1]:
+                branch_requirements, _ = _required_literals(prefix + list(branch))
+                singles = [r[0] for r in branch_requirements if len(r) == 1]
+                if not singles:
+                    alternatives = []
+                    break
+                alternatives.append(max(singles, key=len))
+            if alternatives:
+                requirements.append(tuple(dict.fromkeys(alternatives)))
+        elif op in _REPEAT_OPS:
+            low, high, sub = av
+            sub_requirements, sub_literal = _required_literals(sub)
+            if sub_literal is not None and low >= 1:
+                run.append(sub_literal * low)
+                if high != low:
+                    pure = False
+                    flush()
+            else:
+                pure = False
+                flush()
+                if low >= 1:
+                    requirements.extend(sub_requirements)
+        else:
+            pure = False
+            flush()
+
+    literal = "".join(run) if pure else None
+    flush()
+    return requirements, literal
+
+
+def estimate_hits(term: str) -> float:
+    """Estimate how many indexed files contain the given search term."""
+    significant = sum(ch.isalnum() for ch in term)
+    return 10 ** max(0.0, _BASE_HITS_EXPONENT - _EXPONENT_PER_CHAR * significant)
+
+
+def estimate_pages(hits: float) -> int:
+    """Estimate how many result pages a query with the given hit count costs."""
+    reachable = min(hits, MAX_SEARCH_RESULTS)
+    return max(1, math.ceil(reachable / RESULTS_PER_PAGE))
+
+
+def _quote_term(term: str) -> str:
+    """Quote a term unless it is a plain alphanumeric word."""
+    return term if term.isalnum() else f'"{term}"'
+
+
+def _usable_term(term: str) -> bool:
+    return len(term) >= MIN_TERM_LENGTH and '"' not in term and "\\" not in term and term.isprintable()
+
+
+def _candidate_plans(requirements: List[Tuple[str, ...]]) -> List[QueryPlan]:
+    """Build every valid query plan for a list of literal requirements."""
+    plans = []
+    for alternatives in requirements:
+        # Code search is case-insensitive, so alternatives differing only in case collapse,
+        # and an alternative containing another one adds nothing to the OR
+        terms = tuple({t.lower(): t for t in alternatives}.values())
+        terms = tuple(t for t in terms if not any(o != t and o.lower() in t.lower() for o in terms))
+        if not all(_usable_term(t) for t in terms) or len(terms) - 1 > MAX_QUERY_OPERATORS:
+            continue
+        query = " OR ".join(_quote_term(t) for t in terms)
+        if len(query) > MAX_QUERY_LENGTH:
+            continue
+        hits = sum(estimate_hits(t) for t in terms)
+        plans.append(QueryPlan(query, terms, hits, estimate_pages(hits)))
+
+    # Two mandatory literals together are more selective than either alone
+    singles = sorted((p for p in plans if len(p.terms) == 1), key=lambda p: p.estimated_hits)
+    if len(singles) >= 2 and singles[0].terms[0].lower() != singles[1].terms[0].lower():
+        first, second = singles[0], singles[1]
+        query = f"{first.query} {second.query}"
+        if len(query) <= MAX_QUERY_LENGTH:
+            hits = min(first.estimated_hits, second.estimated_hits) * _AND_FACTOR
+            plans.append(QueryPlan(query, first.terms + second.terms, hits, estimate_pages(hits)))
+    return plans
+
+
+@lru_cache(maxsize=None)
+def plan_query(pattern: str) -> Optional[QueryPlan]:
+    """
+    Derive the most selective code-search query for a regex pattern.
+
+    Parses the regex, extracts the literals every match must contain and
+    returns the plan with the fewest expected result pages, or None if the
+    pattern has no usable mandatory literal.
+    """
+    if not pattern:
+        return None
+    try:
+        parsed = sre_parse.parse(pattern)
+    except (re.error, RecursionError):
+        return None
+    requirements, _ = _required_literals(parsed)
+    plans = _candidate_plans(requirements)
+    if not plans:
+        return None
+    return min(plans, key=lambda p: (p.estimated_pages, p.estimated_hits, len(p.query)))
+
+
+def plan_catalog(patterns: Dict[str, str]) -> Dict[str, Optional[QueryPlan]]:
+    """Precompute query plans for every pattern in the catalog."""
+    return {name: plan_query(pattern) for name, pattern in patterns.items() if isinstance(pattern, str)}
+
 
 def generate_search_query(pattern: str, pattern_type: str = "", start_date: str = None, end_date: str = None) -> str:
-    """Generate a search query based on the regex pattern, pattern type, and optional date range."""
+    """
+    Generate a search query based on the regex pattern, pattern type, and optional date range.
+    
+    Suppression rules that code search can express are appended as exclusion
+    qualifiers, so suppressed files are not fetched at all.
+    """
+    query = _generate_terms(pattern, pattern_type)
+    exclusions = get_suppression_rules().query_exclusions() if query else ""
+    # Qualifiers do not count towards MAX_QUERY_LENGTH, they are appended as a whole
+    return f"{query} {exclusions}" if exclusions else query
+
+
+def _generate_terms(pattern: str, pattern_type: str) -> str:
+    """The search terms for a pattern, without qualifiers"""
+    # Prefer the literals the regex itself requires, they are far more selective than names
+    if pattern and pattern.lower() != "custom" and pattern_type != "Custom (Empty)":
+        plan = plan_query(pattern)
+        if plan:
+            return plan.query
+
     # First try to get keywords from pattern type
     if pattern_type and pattern_type != "Custom Pattern" and pattern_type != "Custom (Empty)":
         keywords = pattern_type.lower().split()
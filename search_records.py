@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Compact records for GitHub code search items.
+
+Raw search items carry the full repository object with its owner, dozens of
+URLs and the text_matches payload. Scans keep tens of thousands of them in
+memory, so each item is projected onto a slotted record holding only the
+fields result processing needs, and the raw payload is dropped right away.
+
+Run this module directly to compare the memory use of both representations:
+    python search_records.py --items 30000
+"""
+
+import argparse
+import sys
+import threading
+import tracemalloc
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Set, Tuple, Union
+
+# Repository date fields in order of preference for last_modified
+_DATE_FIELDS = ("pushed_at", "updated_at", "created_at")
+
+
+@dataclass
+class SearchHit:
+    """The fields of a code search item that result processing needs."""
+    __slots__ = ("repository", "path", "html_url", "sha", "git_url", "repository_date", "fragments", "match_indices")
+    repository: Optional[str]
+    path: Optional[str]
+    html_url: Optional[str]
+    sha: Optional[str]
+    git_url: Optional[str]
+    repository_date: Optional[str]
+    fragments: Tuple[str, ...]
+    # Per fragment, the (start, end) spans of the highlighted query terms
+    match_indices: Tuple[Tuple[Tuple[int, int], ...], ...]
+
+    @classmethod
+    def from_item(cls, item: Dict[str, Any]) -> "SearchHit":
+        """Project a raw search item onto a compact record"""
+        repository = item.get("repository") or {}
+        full_name = repository.get("full_name")
+        return cls(
+            # Many hits share a repository, so share the name string too
+            repository=sys.intern(full_name) if full_name else full_name,
+            path=item.get("path"),
+            html_url=item.get("html_url"),
+            sha=item.get("sha"),
+            git_url=item.get("git_url"),
+            repository_date=next((repository[f] for f in _DATE_FIELDS if repository.get(f)), None),
+            fragments=tuple(tm.get("fragment", "") for tm in item.get("text_matches", [])),
+            match_indices=tuple(
+                tuple(tuple(m["indices"]) for m in tm.get("matches", []) if len(m.get("indices") or ()) == 2)
+                for tm in item.get("text_matches", [])
+            )
+        )
+
+
+def as_hit(item: Union[SearchHit, Dict[str, Any]]) -> SearchHit:
+    """Accept either a compact record or a raw search item"""
+    return item if isinstance(item, SearchHit) else SearchHit.from_item(item)
+
+
+class DedupCollector:
+    """
+    Collects search hits across partitions, dropping duplicates as pages arrive.
+
+    Overlapping extended-search partitions return many of the same files. Hits
+    are keyed by (repository, path, blob sha), so a duplicate is never stored
+    or matched, and per-partition counts show which partitions are redundant.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.seen: Set[Tuple[str, str, str]] = set()
+        self.hits: List[SearchHit] = []
+        # partition -> {"fetched": n, "unique": n}
+        self.partitions: Dict[str, Dict[str, int]] = {}
+
+    def add(self, partition: str, hits: List[SearchHit]) -> List[SearchHit]:
+        """Keep the hits not collected before and return them"""
+        accepted = []
+        with self.lock:
+            counts = self.partitions.setdefault(partition, {"fetched": 0, "unique": 0})
+            for hit in hits:
+                key = (hit.repository or "", hit.path or "", hit.sha or "")
+                if key in self.seen:
+                    continue
+                self.seen.add(key)
+                accepted.append(hit)
+            counts["fetched"] += len(hits)
+            counts["unique"] += len(accepted)
+            self.hits.extend(accepted)
+        return accepted
+
+    @property
+    def fetched(self) -> int:
+        with self.lock:
+            return sum(counts["fetched"] for counts in self.partitions.values())
+
+    def results(self) -> List[SearchHit]:
+        with self.lock:
+            return list(self.hits)
+
+    def overlap_report(self) -> List[Dict[str, Any]]:
+        """Per-partition fetched, new and duplicate counts, most redundant first"""
+        with self.lock:
+            rows = [
+                {
+                    "Partition": partition,
+                    "Fetched": counts["fetched"],
+                    "New": counts["unique"],
+                    "Duplicates": counts["fetched"] - counts["unique"],
+                    "Overlap": f"{(counts['fetched'] - counts['unique']) / counts['fetched']:.0%}" if counts["fetched"] else "0%"
+                }
+                for partition, counts in self.partitions.items()
+            ]
+        return sorted(rows, key=lambda row: (row["Duplicates"] / row["Fetched"]) if row["Fetched"] else 0, reverse=True)
+
+
+def make_sample_item(index: int) -> Dict[str, Any]:
+    """Build a raw item shaped like a code search response entry"""
+    owner = f"owner{index % 500}"
+    name = f"{owner}/repo{index % 2000}"
+    api = f"https://api.github.com/repos/{name}"
+    return {
+        "name": f"config{index}.py",
+        "path": f"src/settings/config{index}.py",
+        "sha": f"{index:040x}",
+        "url": f"{api}/contents/src/settings/config{index}.py?ref={index:040x}",
+        "git_url": f"{api}/git/blobs/{index:040x}",
+        "html_url": f"https://github.com/{name}/blob/{index:040x}/src/settings/config{index}.py",
+        "repository": {
+            "id": index,
+            "node_id": f"MDEwOlJlcG9zaXRvcnk{index}",
+            "name": f"repo{index % 2000}",
+            "full_name": name,
+            "owner": {
+                "login": owner,
+                "id": index % 500,
+                "node_id": f"MDQ6VXNlcj{index % 500}",
+                "avatar_url": f"https://avatars.githubusercontent.com/u/{index % 500}?v=4",
+                "url": f"https://api.github.com/users/{owner}",
+                "html_url": f"https://github.com/{owner}",
+                "followers_url": f"https://api.github.com/users/{owner}/followers",
+                "repos_url": f"https://api.github.com/users/{owner}/repos",
+                "type": "User",
+                "site_admin": False
+            },
+            "private": False,
+            "html_url": f"https://github.com/{name}",
+            "description": "Sample repository used for the memory benchmark",
+            "fork": False,
+            "url": api,
+            "forks_url": f"{api}/forks",
+            "keys_url": f"{api}/keys{{/key_id}}",
+            "collaborators_url": f"{api}/collaborators{{/collaborator}}",
+            "teams_url": f"{api}/teams",
+            "hooks_url": f"{api}/hooks",
+            "events_url": f"{api}/events",
+            "branches_url": f"{api}/branches{{/branch}}",
+            "tags_url": f"{api}/tags",
+            "languages_url": f"{api}/languages",
+            "commits_url": f"{api}/commits{{/sha}}",
+            "contents_url": f"{api}/contents/{{+path}}",
+        },
+        "score": 1.0,
+        "text_matches": [
+            {
+                "object_url": f"{api}/contents/src/settings/config{index}.py?ref={index:040x}",
+                "object_type": "FileContent",
+                "property": "content",
+                "fragment": f"API_KEY = \"gsk_{index:052d}\"\nDEBUG = False\n",
+                "matches": [{"text": "gsk", "indices": [11, 14]}]
+            }
+        ]
+    }
+
+
+def benchmark_memory(count: int) -> Dict[str, int]:
+    """Measure the memory held by count raw items versus count compact records"""
+    tracemalloc.start()
+    raw_items = [make_sample_item(i) for i in range(count)]
+    raw_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    tracemalloc.start()
+    hits = [SearchHit.from_item(make_sample_item(i)) for i in range(count)]
+    compact_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    del raw_items, hits
+    return {"items": count, "raw_bytes": raw_bytes, "compact_bytes": compact_bytes}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare memory use of raw search items and compact records.")
+    parser.add_argument("--items", type=int, default=30000, help="Number of items to build (default: 30000)")
+    args = parser.parse_args()
+
+    result = benchmark_memory(args.items)
+    raw_mb = result["raw_bytes"] / (1024 * 1024)
+    compact_mb = result["compact_bytes"] / (1024 * 1024)
+    print(f"{result['items']} items")
+    print(f"Raw search items:  {raw_mb:8.1f} MB")
+    print(f"Compact records:   {compact_mb:8.1f} MB ({raw_mb / max(compact_mb, 1e-9):.1f}x smaller)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+"""
+Sharded scanning of local repository corpora across several hosts.
+
+A coordinator splits a corpus of cloned repositories into shards in a shared
+SQLite work queue (on storage every host can reach). Worker processes on any
+number of hosts claim shards under a time-limited lease, keep the lease alive
+with heartbeats while they scan, run the token pattern catalog over every
+repository in the shard with the local scanner and write the findings to the
+shared findings store. A shard whose worker dies stops heartbeating, its lease
+expires and the next worker to ask for work claims it again; shards that keep
+failing are given up after MAX_ATTEMPTS.
+
+Usage:
+    python shard_queue.py create /mirror/repos --shard-size 20
+    python shard_queue.py work            # on every host
+    python shard_queue.py status
+"""
+
+import argparse
+import json
+import logging
+import os
+import re
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from alert_sinks import publish_findings
+from findings_store import get_findings_store
+from local_scanner import (
+    DEFAULT_MAX_FILE_BYTES,
+    check_patterns,
+    compile_bytes_pattern,
+    create_scan_pool,
+    resolve_pattern,
+    scan_directory_patterns,
+)
+from log_setup import LOG_FORMAT, get_log_level
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUEUE_PATH = "shard_queue.sqlite"
+DEFAULT_SHARD_SIZE = 20
+DEFAULT_LEASE_SECONDS = 300
+MAX_ATTEMPTS = 3
+
+
+@dataclass
+class Shard:
+    """A claimed group of repository paths."""
+    shard_id: int
+    run_id: str
+    paths: List[str]
+    attempts: int
+
+
+class ShardQueue:
+    """SQLite work queue of repository shards with leases and heartbeats."""
+
+    def __init__(self, path: str = DEFAULT_QUEUE_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        # Shared storage may be slow to hand over the write lock between hosts
+        self._conn = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS shards (
+                id INTEGER PRIMARY KEY,
+                run_id TEXT NOT NULL,
+                paths TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                lease_owner TEXT,
+                lease_expires REAL,
+                last_error TEXT,
+                findings INTEGER NOT NULL DEFAULT 0,
+                updated_at REAL
+            );
+            CREATE INDEX IF NOT EXISTS idx_shards_status ON shards (status, lease_expires);
+        """)
+
+    def create_run(self, repo_paths: List[str], shard_size: int = DEFAULT_SHARD_SIZE) -> str:
+        """Split repository paths into shards and queue them under a new run id"""
+        run_id = uuid.uuid4().hex
+        shards = [repo_paths[i:i + shard_size] for i in range(0, len(repo_paths), shard_size)]
+        with self.lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(
+                    "INSERT INTO shards (run_id, paths, updated_at) VALUES (?, ?, ?)",
+                    [(run_id, json.dumps(paths), time.time()) for paths in shards]
+                )
+                self._conn.execute("COMMIT")
+            except sqlite3.Error:
+                self._conn.execute("ROLLBACK")
+                raise
+        logger.info(f"Queued {len(repo_paths)} repositories in {len(shards)} shards for run {run_id}")
+        return run_id
+
+    def claim(self, worker_id: str, lease_seconds: float = DEFAULT_LEASE_SECONDS) -> Optional[Shard]:
+        """
+        Lease the next pending shard, or one whose lease has expired.
+
+        Returns:
+            The claimed shard, or None if there is nothing to claim right now
+        """
+        now = time.time()
+        with self.lock:
+            # BEGIN IMMEDIATE takes the write lock, so two workers cannot claim the same shard
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                while True:
+                    row = self._conn.execute("""
+                        SELECT id, run_id, paths, attempts FROM shards
+                        WHERE status = 'pending' OR (status = 'leased' AND lease_expires < ?)
+                        ORDER BY id LIMIT 1
+                    """, (now,)).fetchone()
+                    if row is None:
+                        self._conn.execute("COMMIT")
+                        return None
+                    shard_id, run_id, paths, attempts = row
+                    if attempts < MAX_ATTEMPTS:
+                        break
+                    # Its last worker died mid-scan too often, stop handing it out
+                    self._conn.execute(
+                        "UPDATE shards SET status = 'failed', lease_owner = NULL, updated_at = ? WHERE id = ?",
+                        (now, shard_id)
+                    )
+                    logger.error(f"Shard {shard_id} abandoned after {attempts} attempts")
+                self._conn.execute("""
+                    UPDATE shards SET status = 'leased', attempts = attempts + 1, lease_owner = ?,
+                                      lease_expires = ?, updated_at = ?
+                    WHERE id = ?
+                """, (worker_id, now + lease_seconds, now, shard_id))
+                self._conn.execute("COMMIT")
+            except sqlite3.Error:
+                self._conn.execute("ROLLBACK")
+                raise
+        return Shard(shard_id, run_id, json.loads(paths), attempts + 1)
+
+    def heartbeat(self, shard_id: int, worker_id: str, lease_seconds: float = DEFAULT_LEASE_SECONDS) -> bool:
+        """Extend a lease; returns False if the worker no longer holds it"""
+        now = time.time()
+        with self.lock:
+            cursor = self._conn.execute("""
+                UPDATE shards SET lease_expires = ?, updated_at = ?
+                WHERE id = ? AND status = 'leased' AND lease_owner = ?
+            """, (now + lease_seconds, now, shard_id, worker_id))
+        return cursor.rowcount == 1
+
+    def complete(self, shard_id: int, worker_id: str, findings: int) -> bool:
+        """Mark a leased shard done; returns False if the lease was lost"""
+        with self.lock:
+            cursor = self._conn.execute("""
+                UPDATE shards SET status = 'done', lease_owner = NULL, findings = ?, updated_at = ?
+                WHERE id = ? AND status = 'leased' AND lease_owner = ?
+            """, (findings, time.time(), shard_id, worker_id))
+        return cursor.rowcount == 1
+
+    def fail(self, shard_id: int, worker_id: str, error: str) -> None:
+        """Give a shard back after an error; it is retried until MAX_ATTEMPTS"""
+        with self.lock:
+            self._conn.execute("""
+                UPDATE shards SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,
+                                  lease_owner = NULL, lease_expires = NULL, last_error = ?, updated_at = ?
+                WHERE id = ? AND status = 'leased' AND lease_owner = ?
+            """, (MAX_ATTEMPTS, error, time.time(), shard_id, worker_id))
+
+    def progress(self, run_id: Optional[str] = None) -> Dict[str, int]:
+        """Count shards by status, for one run or all of them"""
+        where, params = ("WHERE run_id = ?", (run_id,)) if run_id else ("", ())
+        with self.lock:
+            rows = self._conn.execute(
+                f"SELECT status, COUNT(*), SUM(findings) FROM shards {where} GROUP BY status", params
+            ).fetchall()
+        counts = {"pending": 0, "leased": 0, "done": 0, "failed": 0, "findings": 0}
+        for status, count, findings in rows:
+            counts[status] = count
+            counts["findings"] += findings or 0
+        return counts
+
+
+class _Heartbeat:
+    """Renews a shard lease in the background while it is being scanned."""
+
+    def __init__(self, queue: ShardQueue, shard: Shard, worker_id: str, lease_seconds: float):
+        self.lost = False
+        self._stop = threading.Event()
+
+        def run():
+            while not self._stop.wait(lease_seconds / 3):
+                if not queue.heartbeat(shard.shard_id, worker_id, lease_seconds):
+                    logger.warning(f"Lost the lease on shard {shard.shard_id}")
+                    self.lost = True
+                    return
+
+        self._thread = threading.Thread(target=run, name=f"heartbeat-{shard.shard_id}", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+
+def run_worker(
+    queue: ShardQueue,
+    patterns: List[str],
+    worker_id: Optional[str] = None,
+    workers: Optional[int] = None,
+    max_file_bytes: int = DEFAULT_MAX_FILE_BYTES,
+    lease_seconds: float = DEFAULT_LEASE_SECONDS,
+    wait_for_work: bool = False,
+    poll_seconds: float = 10.0
+) -> int:
+    """
+    Claim and scan shards until the queue is drained.
+
+    Every repository in a shard is read once and matched against all patterns.
+    Findings are written to the shared findings store under the shard's run id
+    once the whole shard has been scanned, so a shard that fails part-way
+    leaves no partial findings behind. They replace any findings an earlier
+    attempt stored for the shard, and alerts are only sent by the worker that
+    completes it.
+
+    Args:
+        queue: The shared shard queue
+        patterns: Regex patterns to run, usually the whole catalog
+        worker_id: Lease owner name (default: host:pid)
+        workers: Scanner processes on this host (default: one per core)
+        max_file_bytes: Files larger than this are skipped
+        lease_seconds: Lease length; heartbeats renew it every third of that
+        wait_for_work: Keep polling for new shards instead of exiting when the queue is empty
+        poll_seconds: Delay between polls while waiting for work
+
+    Returns:
+        Number of shards completed by this worker
+    """
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+    findings_store = get_findings_store()
+    completed = 0
+
+    with create_scan_pool(patterns, workers, max_file_bytes) as executor:
+        while True:
+            shard = queue.claim(worker_id, lease_seconds)
+            if shard is None:
+                if wait_for_work or queue.progress()["leased"]:
+                    # Leased shards may still come back if their worker dies
+                    time.sleep(poll_seconds)
+                    continue
+                break
+
+            logger.info(f"Worker {worker_id} scanning shard {shard.shard_id} "
+                        f"({len(shard.paths)} repositories, attempt {shard.attempts})")
+            heartbeat = _Heartbeat(queue, shard, worker_id, lease_seconds)
+            try:
+                shard_findings = [[] for _ in patterns]
+                for repo_path in shard.paths:
+                    if heartbeat.lost:
+                        break
+                    processed, _ = scan_directory_patterns(repo_path, patterns, executor)
+                    for index, results in enumerate(processed):
+                        shard_findings[index].extend(results)
+            except BrokenProcessPool as e:
+                # The scanner processes are gone, so this worker cannot take any more shards
+                heartbeat.stop()
+                queue.fail(shard.shard_id, worker_id, str(e))
+                raise
+            except Exception as e:
+                heartbeat.stop()
+                logger.error(f"Shard {shard.shard_id} failed: {str(e)}", exc_info=True)
+                queue.fail(shard.shard_id, worker_id, str(e))
+                continue
+            heartbeat.stop()
+            if heartbeat.lost:
+                # Another worker owns the shard now and will write its findings
+                continue
+
+            # Replaces whatever an earlier attempt at this shard stored, so a shard
+            # that was scanned twice still has its findings stored once
+            findings = findings_store.replace_shard_findings(
+                shard.run_id, shard.shard_id, list(zip(patterns, shard_findings))
+            )
+            if not queue.complete(shard.shard_id, worker_id, findings):
+                logger.warning(f"Lost the lease on shard {shard.shard_id} before completing it")
+                continue
+            completed += 1
+            for pattern, results in zip(patterns, shard_findings):
+                if results:
+                    publish_findings(shard.run_id, pattern, results)
+    logger.info(f"Worker {worker_id} finished after {completed} shards")
+    return completed
+
+
+def catalog_patterns() -> List[str]:
+    """Get every distinct pattern in token_patterns.json that compiles"""
+    from token_patterns import read_token_patterns
+    patterns = []
+    for name, pattern in read_token_patterns().items():
+        try:
+            compile_bytes_pattern(pattern)
+        except re.error as e:
+            logger.warning(f"Skipping invalid catalog pattern {name}: {str(e)}")
+            continue
+        if pattern not in patterns:
+            patterns.append(pattern)
+    return patterns
+
+
+def list_repositories(roots: List[str]) -> List[str]:
+    """Treat every directory directly below each corpus root as one repository"""
+    repo_paths = []
+    for root in roots:
+        for entry in sorted(os.scandir(root), key=lambda e: e.name):
+            if entry.is_dir() and not entry.name.startswith("."):
+                repo_paths.append(os.path.abspath(entry.path))
+    return repo_paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scan a corpus of local repositories across several hosts.")
+    parser.add_argument("--queue", default=os.getenv("SHARD_QUEUE_PATH", DEFAULT_QUEUE_PATH),
+                        help="Shared queue database (default: SHARD_QUEUE_PATH or shard_queue.sqlite)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    create = commands.add_parser("create", help="Queue a corpus for scanning")
+    create.add_argument("roots", nargs="+", help="Directories whose subdirectories are cloned repositories")
+    create.add_argument("--shard-size", type=int, default=DEFAULT_SHARD_SIZE, help="Repositories per shard (default: 20)")
+
+    work = commands.add_parser("work", help="Claim and scan shards until the queue is drained")
+    group = work.add_mutually_exclusive_group()
+    group.add_argument("--pattern", help="Regex pattern to search for (default: the whole catalog)")
+    group.add_argument("--pattern-name", help="Name of a pattern in token_patterns.json")
+    work.add_argument("--workers", type=int, default=None, help="Worker processes (default: one per core)")
+    work.add_argument("--max-file-size", type=float, default=DEFAULT_MAX_FILE_BYTES / (1024 * 1024),
+                      help="Skip files larger than this many MB (default: 50)")
+    work.add_argument("--lease", type=float, default=DEFAULT_LEASE_SECONDS, help="Lease length in seconds (default: 300)")
+    work.add_argument("--wait", action="store_true", help="Keep waiting for new shards when the queue is empty")
+
+    status = commands.add_parser("status", help="Show shard counts")
+    status.add_argument("--run", default=None, help="Only this run id")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=get_log_level(), format=LOG_FORMAT)
+    queue = ShardQueue(args.queue)
+
+    if args.command == "create":
+        repo_paths = list_repositories(args.roots)
+        if not repo_paths:
+            raise SystemExit("No repositories found below the given roots")
+        run_id = queue.create_run(repo_paths, args.shard_size)
+        print(f"Queued {len(repo_paths)} repositories as run {run_id}")
+    elif args.command == "work":
+        if args.pattern or args.pattern_name:
+            patterns = [resolve_pattern(args.pattern, args.pattern_name)]
+            try:
+                check_patterns(patterns)
+            except ValueError as e:
+                raise SystemExit(str(e))
+        else:
+            patterns = catalog_patterns()
+        completed = run_worker(queue, patterns, workers=args.workers,
+                               max_file_bytes=int(args.max_file_size * 1024 * 1024),
+                               lease_seconds=args.lease, wait_for_work=args.wait)
+        print(f"Completed {completed} shards")
+    else:
+        counts = queue.progress(args.run)
+        print(", ".join(f"{status}: {count}" for status, count in counts.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Early suppression of search results that are discarded in triage anyway.
+
+Rules are read from a JSON file (SUPPRESSION_RULES, default
+suppression_rules.json; see suppression_rules.example.json):
+
+    paths               Path globs such as "node_modules/**" or "*.min.js"
+    extensions          File extensions such as "lock"
+    deny_repositories   Repositories whose results are dropped
+    allow_repositories  If not empty, only results from these repositories are kept
+    false_positive_fingerprints
+                        SHA-256 hex digests of known dummy tokens
+
+Path, extension and repository rules run before any regex evaluation. Known
+dummy tokens are checked against a Bloom filter of their fingerprints as soon
+as a text has been matched. The rules that GitHub code search can express
+(`-extension:`, `-path:` for directory globs and `-repo:`) are also pushed
+into generated queries, so those results are never fetched.
+
+Print the fingerprint of a dummy token to add to the rules file:
+    python suppression.py --fingerprint "gsk_exampleexampleexample"
+"""
+
+import argparse
+import fnmatch
+import hashlib
+import json
+import logging
+import math
+import os
+import re
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+
+from search_records import SearchHit
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RULES_PATH = "suppression_rules.json"
+# Bloom filter false positive rate, a real token is suppressed with this probability
+BLOOM_ERROR_RATE = 0.0001
+# Small filters make the double hashing positions collide, so never go below this
+MIN_BLOOM_BITS = 1 << 16
+
+# Path globs that map onto a code search path qualifier: one directory from the root
+_DIRECTORY_GLOB = re.compile(r"^([A-Za-z0-9_.\-]+(?:/[A-Za-z0-9_.\-]+)*)/\*\*$")
+_PLAIN_EXTENSION = re.compile(r"^[A-Za-z0-9_\-]+$")
+
+
+def fingerprint(token: str) -> str:
+    """Fingerprint of a token as stored in the rules file"""
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+class BloomFilter:
+    """Fixed-size set membership test with no false negatives."""
+
+    def __init__(self, capacity: int, error_rate: float = BLOOM_ERROR_RATE):
+        capacity = max(1, capacity)
+        self.size = max(MIN_BLOOM_BITS, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, math.ceil(-math.log2(error_rate)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str) -> Iterable[int]:
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        # Double hashing: k positions from two independent hashes
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, item: str) -> None:
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class SuppressionRules:
+    """Path, extension, repository and dummy-token rules with per-rule counts."""
+
+    def __init__(self, paths: Iterable[str] = (), extensions: Iterable[str] = (),
+                 deny_repositories: Iterable[str] = (), allow_repositories: Iterable[str] = (),
+                 false_positive_fingerprints: Iterable[str] = ()):
+        self.paths = list(paths)
+        self.extensions = [e.lower().lstrip(".") for e in extensions]
+        self.deny_repositories = {r.lower() for r in deny_repositories}
+        self.allow_repositories = {r.lower() for r in allow_repositories}
+        fingerprints = [f.lower() for f in false_positive_fingerprints]
+        self.false_positives = BloomFilter(len(fingerprints))
+        for value in fingerprints:
+            self.false_positives.add(value)
+        self.has_false_positives = bool(fingerprints)
+        self.lock = threading.Lock()
+        self.counts: Dict[str, int] = {}
+
+    @classmethod
+    def load(cls, path: str) -> "SuppressionRules":
+        """Load rules from a JSON file; a missing file means no suppression"""
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return cls()
+        except (IOError, OSError, ValueError) as e:
+            logger.error(f"Could not load suppression rules from {path}: {str(e)}")
+            return cls()
+        rules = cls(
+            data.get("paths", []),
+            data.get("extensions", []),
+            data.get("deny_repositories", []),
+            data.get("allow_repositories", []),
+            data.get("false_positive_fingerprints", [])
+        )
+        logger.info(f"Loaded suppression rules from {path}: {len(rules.paths)} paths, {len(rules.extensions)} extensions, "
+                    f"{len(rules.deny_repositories)} denied and {len(rules.allow_repositories)} allowed repositories")
+        return rules
+
+    def __bool__(self) -> bool:
+        return bool(self.paths or self.extensions or self.deny_repositories
+                    or self.allow_repositories or self.has_false_positives)
+
+    def _count(self, counts: Optional[Dict[str, int]], rule: str) -> str:
+        if counts is not None:
+            counts[rule] = counts.get(rule, 0) + 1
+        with self.lock:
+            self.counts[rule] = self.counts.get(rule, 0) + 1
+        return rule
+
+    def suppress_hit(self, hit: SearchHit, counts: Optional[Dict[str, int]] = None) -> Optional[str]:
+        """Get the rule that suppresses a hit, or None if it is kept"""
+        repository = (hit.repository or "").lower()
+        if self.allow_repositories and repository not in self.allow_repositories:
+            return self._count(counts, "repository not allowed")
+        if repository in self.deny_repositories:
+            return self._count(counts, f"repo:{repository}")
+        path = hit.path or ""
+        name = path.rsplit("/", 1)[-1].lower()
+        for extension in self.extensions:
+            if name.endswith("." + extension):
+                return self._count(counts, f"extension:{extension}")
+        for glob in self.paths:
+            # "**/" also matches at the root, as in gitignore
+            if fnmatch.fnmatchcase(path, glob) or (glob.startswith("**/") and fnmatch.fnmatchcase(path, glob[3:])):
+                return self._count(counts, f"path:{glob}")
+        return None
+
+    def filter_matches(self, matches: List[Any], counts: Optional[Dict[str, int]] = None) -> List[Any]:
+        """Drop matches that are known dummy tokens"""
+        if not self.has_false_positives:
+            return matches
+        kept = []
+        for match in matches:
+            values = (match,) if isinstance(match, str) else match
+            if any(value and fingerprint(value) in self.false_positives for value in values):
+                self._count(counts, "false positive token")
+            else:
+                kept.append(match)
+        return kept
+
+    def query_exclusions(self) -> str:
+        """The rules that code search can express, as qualifiers to append to a query"""
+        qualifiers = [f"-extension:{e}" for e in self.extensions if _PLAIN_EXTENSION.match(e)]
+        for glob in self.paths:
+            directory = _DIRECTORY_GLOB.match(glob)
+            if directory:
+                qualifiers.append(f"-path:{directory.group(1)}")
+        qualifiers += [f"-repo:{r}" for r in sorted(self.deny_repositories)]
+        return " ".join(qualifiers)
+
+    def get_counts(self) -> Dict[str, int]:
+        """Suppressed items per rule since the rules were loaded"""
+        with self.lock:
+            return dict(self.counts)
+
+
+_rules = None
+_rules_lock = threading.Lock()
+
+
+def get_suppression_rules() -> SuppressionRules:
+    """Get the process-wide rules loaded from SUPPRESSION_RULES"""
+    global _rules
+    with _rules_lock:
+        if _rules is None:
+            _rules = SuppressionRules.load(os.getenv("SUPPRESSION_RULES", DEFAULT_RULES_PATH))
+        return _rules
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Print the fingerprint of a known dummy token for the suppression rules.")
+    parser.add_argument("--fingerprint", required=True, help="Dummy token to fingerprint")
+    args = parser.parse_args()
+    print(fingerprint(args.fingerprint))
+
+
+if __name__ == "__main__":
+    main()
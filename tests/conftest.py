@@ -0,0 +1,72 @@
+"""
+Shared test fixtures.
+
+The modules live at the repository root, and the services they talk to are
+replaced by a local HTTP stand-in that records what it receives.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"null")
+        with self.server.lock:
+            self.server.requests.append({
+                "time": time.monotonic(),
+                "path": self.path,
+                "headers": dict(self.headers),
+                "body": body
+            })
+        status, answer = self.server.respond(body)
+        data = json.dumps(answer).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StandIn(ThreadingHTTPServer):
+    """Local server that records every POSTed JSON body and answers with `respond(body)`."""
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _StandInHandler)
+        self.lock = threading.Lock()
+        self.requests = []
+        # (status, JSON answer) for a request body
+        self.respond = lambda body: (200, {})
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_port}"
+
+    def bodies(self):
+        with self.lock:
+            return [request["body"] for request in self.requests]
+
+
+@pytest.fixture
+def stand_in():
+    server = StandIn()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
@@ -0,0 +1,135 @@
+import os
+import time
+
+import pytest
+
+import alert_sinks
+from alert_sinks import AlertDispatcher, SinkWorker, WebhookSink, build_alerts
+
+
+def wait_until(condition, timeout: float = 10.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(0.02)
+    return True
+
+
+def delivered_ids(stand_in):
+    return [alert["id"] for body in stand_in.bodies() for alert in body["alerts"]]
+
+
+def sample_results(count):
+    return [
+        {"repository": f"owner/repo{i}", "file_path": "config.py", "html_url": None,
+         "found_tokens": [f"gsk_{i:04d}abcdefghijklmnopqrstuvwxyz"]}
+        for i in range(count)
+    ]
+
+
+@pytest.fixture(autouse=True)
+def fast_delivery(monkeypatch):
+    monkeypatch.setattr(alert_sinks, "BATCH_SECONDS", 0.1)
+    monkeypatch.setattr(alert_sinks, "INITIAL_BACKOFF", 0.05)
+    monkeypatch.setattr(alert_sinks, "MAX_SEND_ATTEMPTS", 3)
+
+
+@pytest.fixture
+def make_worker(stand_in, tmp_path):
+    workers = []
+
+    def make(batch_size=3):
+        worker = SinkWorker(WebhookSink(stand_in.url), str(tmp_path), batch_size=batch_size)
+        workers.append(worker)
+        return worker
+
+    yield make
+    for worker in workers:
+        worker.close(timeout=1.0)
+
+
+def test_alerts_are_delivered_in_batches(stand_in, make_worker):
+    worker = make_worker(batch_size=3)
+    alerts = build_alerts("scan", "pattern", sample_results(7))
+    worker.offer(alerts)
+
+    assert worker.flush(timeout=10.0)
+    batches = [body["alerts"] for body in stand_in.bodies()]
+    assert all(len(batch) <= 3 for batch in batches)
+    assert len(batches) >= 3
+    assert delivered_ids(stand_in) == [alert["id"] for alert in alerts]
+    assert not os.path.exists(worker.spill_path)
+
+
+def test_failed_sends_back_off_and_then_spill(stand_in, make_worker):
+    stand_in.respond = lambda body: (503, {"message": "unavailable"})
+    worker = make_worker()
+    alerts = build_alerts("scan", "pattern", sample_results(2))
+    worker.offer(alerts)
+
+    assert worker.flush(timeout=10.0)
+    times = [request["time"] for request in stand_in.requests]
+    assert len(times) == alert_sinks.MAX_SEND_ATTEMPTS
+    gaps = [later - earlier for earlier, later in zip(times, times[1:])]
+    assert gaps[0] >= alert_sinks.INITIAL_BACKOFF
+    assert gaps[1] >= 2 * alert_sinks.INITIAL_BACKOFF
+    assert [alert["id"] for alert in worker._take_spill()] == [alert["id"] for alert in alerts]
+
+
+def test_spilled_alerts_are_replayed_in_order_when_the_receiver_is_back(stand_in, make_worker):
+    stand_in.respond = lambda body: (503, {})
+    worker = make_worker(batch_size=2)
+    first = build_alerts("scan", "pattern", sample_results(3))
+    second = build_alerts("scan", "pattern", sample_results(2))
+    worker.offer(first)
+    assert worker.flush(timeout=10.0)
+    worker.offer(second)
+    assert worker.flush(timeout=10.0)
+    assert os.path.exists(worker.spill_path)
+
+    stand_in.respond = lambda body: (200, {})
+    del stand_in.requests[:]
+    latest = build_alerts("scan", "pattern", sample_results(1))
+    worker.offer(latest)
+
+    expected = [alert["id"] for alert in latest + first + second]
+    assert wait_until(lambda: len(delivered_ids(stand_in)) >= len(expected))
+    assert delivered_ids(stand_in) == expected
+    assert not os.path.exists(worker.spill_path)
+
+
+def test_spill_from_an_earlier_run_is_sent_first(stand_in, make_worker):
+    stand_in.respond = lambda body: (503, {})
+    worker = make_worker()
+    spilled = build_alerts("scan", "pattern", sample_results(4))
+    worker.offer(spilled)
+    assert worker.flush(timeout=10.0)
+    worker.close(timeout=1.0)
+
+    stand_in.respond = lambda body: (200, {})
+    del stand_in.requests[:]
+    make_worker()
+
+    expected = [alert["id"] for alert in spilled]
+    assert wait_until(lambda: len(delivered_ids(stand_in)) >= len(expected))
+    assert delivered_ids(stand_in) == expected
+
+
+def test_tokens_are_masked_unless_included(stand_in, tmp_path):
+    token = "gsk_abcdefghijklmnopqrstuvwxyz0123456789"
+    result = {"repository": "owner/repo", "file_path": "a.env", "found_tokens": [token, ("AKIA1234", "secretsecretsecret")]}
+    for include_tokens in (False, True):
+        dispatcher = AlertDispatcher([WebhookSink(stand_in.url)], str(tmp_path / str(include_tokens)),
+                                     include_tokens=include_tokens)
+        try:
+            assert dispatcher.publish("scan", "pattern", [result]) == 1
+            assert dispatcher.flush(timeout=10.0)
+        finally:
+            dispatcher.close(timeout=1.0)
+
+    masked, included = [body["alerts"][0] for body in stand_in.bodies()]
+    assert masked["tokens"] == ["gsk_...6789", "AKIA...cret"]
+    assert token not in str(masked)
+    assert masked["token_count"] == 2
+    assert included["tokens"] == [token, "AKIA1234 secretsecretsecret"]
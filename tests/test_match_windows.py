@@ -0,0 +1,54 @@
+import glob
+import json
+import os
+import re
+
+import pytest
+
+from match_windows import benchmark, load_fixtures, sanitize_item, window_plan, windowed_findall
+
+FIXTURES = sorted(glob.glob(os.path.join(os.path.dirname(__file__), "fixtures", "code_search", "*.json")))
+
+
+@pytest.mark.parametrize("path", FIXTURES, ids=os.path.basename)
+def test_windowed_matching_agrees_with_full_matching_on_recorded_responses(path):
+    with open(path, encoding="utf-8") as f:
+        pattern = json.load(f)["pattern"]
+
+    result = benchmark(load_fixtures([path]), pattern, rounds=1)
+
+    assert result["mismatches"] == 0
+    assert result["windowed"] > 0
+    assert result["fallbacks"] > 0
+
+
+def test_short_fragments_and_unhighlighted_anchors_are_scanned_whole():
+    plan = window_plan(r"[0-9a-f]{32}-us[0-9]{1,2}")
+    token = "0123456789abcdef0123456789abcdef-us6"
+    text = "x = 1\n" * 200 + f"KEY = '{token}'\n" + "y = 2\n" * 200
+
+    assert windowed_findall(f"KEY = '{token}'", plan, [(39, 42)]) is None
+    assert windowed_findall(text, plan, [(text.index("-us"), text.index("-us") + 3)]) == [token]
+    assert windowed_findall(text + "lang = 'en-us'", plan, [(text.index("-us"), text.index("-us") + 3)]) is None
+
+
+def test_sanitized_items_keep_matches_but_not_tokens():
+    pattern = r"[0-9a-f]{32}-us[0-9]{1,2}"
+    token = "0123456789abcdef0123456789abcdef-us6"
+    fragment = f"LANGUAGE_CODE = 'en-us'\nMAILCHIMP_KEY = '{token}'\n"
+    item = {
+        "name": "settings.py", "path": "app/settings.py", "sha": "f" * 40,
+        "repository": {"full_name": "someone/private-project", "private": False},
+        "text_matches": [{"fragment": fragment, "matches": [
+            {"text": "-us", "indices": [19, 22]},
+            {"text": "-us", "indices": [fragment.index("-us6"), fragment.index("-us6") + 3]}
+        ]}]
+    }
+
+    sanitized = sanitize_item(item, pattern, 3)
+
+    text = sanitized["text_matches"][0]["fragment"]
+    assert token not in text and "private-project" not in json.dumps(sanitized)
+    assert sanitized["repository"] == {"full_name": "owner3/repo3"}
+    assert len(re.findall(pattern, text)) == 1
+    assert [m["text"] for m in sanitized["text_matches"][0]["matches"]] == ["-us", "-us"]
@@ -0,0 +1,106 @@
+import time
+
+import pytest
+
+from repo_enrichment import RepoMetadataCache, build_query, enrich_repositories
+
+# What the stand-in knows about; anything else comes back null with a NOT_FOUND error
+REPOSITORIES = {
+    "octo/alpha": {"pushedAt": "2024-05-01T10:00:00Z", "updatedAt": "2024-04-01T10:00:00Z", "createdAt": "2020-01-01T00:00:00Z"},
+    "octo/beta": {"pushedAt": None, "updatedAt": "2023-02-03T04:05:06Z", "createdAt": "2019-01-01T00:00:00Z"},
+    "other/gamma.js": {"pushedAt": "2022-12-31T23:59:59Z", "updatedAt": None, "createdAt": None},
+}
+
+
+def graphql_answer(body):
+    """Answer an aliased repository query the way the GraphQL API does"""
+    variables = body["variables"]
+    data, errors = {}, []
+    index = 0
+    while f"o{index}" in variables:
+        full_name = f"{variables[f'o{index}']}/{variables[f'n{index}']}"
+        data[f"r{index}"] = REPOSITORIES.get(full_name)
+        if data[f"r{index}"] is None:
+            errors.append({"type": "NOT_FOUND", "path": [f"r{index}"],
+                           "message": f"Could not resolve to a Repository with the name '{full_name}'."})
+        index += 1
+    answer = {"data": data}
+    if errors:
+        answer["errors"] = errors
+    return 200, answer
+
+
+def hits(*names, dated=()):
+    return [
+        {"repository": {"full_name": name, "pushed_at": "2021-01-01T00:00:00Z" if name in dated else None},
+         "path": f"file{i}.py"}
+        for i, name in enumerate(names)
+    ]
+
+
+@pytest.fixture
+def graphql(stand_in, monkeypatch):
+    monkeypatch.setenv("GITHUB_GRAPHQL_URL", stand_in.url + "/graphql")
+    monkeypatch.setenv("GITHUB_TOKENS", "test-token")
+    stand_in.respond = graphql_answer
+    return stand_in
+
+
+def test_build_query_aliases_one_repository_field_per_name():
+    query, variables = build_query(["octo/alpha", "other/gamma.js"])
+
+    assert query == (
+        "query($o0: String!, $n0: String!, $o1: String!, $n1: String!) { "
+        "r0: repository(owner: $o0, name: $n0) { pushedAt updatedAt createdAt } "
+        "r1: repository(owner: $o1, name: $n1) { pushedAt updatedAt createdAt } }"
+    )
+    assert variables == {"o0": "octo", "n0": "alpha", "o1": "other", "n1": "gamma.js"}
+
+
+def test_resolves_dates_and_remembers_repositories_that_are_not_found(graphql):
+    cache = RepoMetadataCache(ttl=60)
+    results = hits("octo/alpha", "octo/beta", "octo/alpha", "gone/missing", "dated/already", dated=("dated/already",))
+
+    dates = enrich_repositories(results, cache=cache)
+
+    assert dates == {"octo/alpha": "2024-05-01T10:00:00Z", "octo/beta": "2023-02-03T04:05:06Z"}
+    # Duplicates and hits that already have a date are not queried
+    assert len(graphql.requests) == 1
+    assert sorted(graphql.requests[0]["body"]["variables"].values()) == ["alpha", "beta", "gone", "missing", "octo", "octo"]
+    assert graphql.requests[0]["headers"]["Authorization"].startswith("Bearer ")
+    assert cache.lookup("gone/missing") == (True, None)
+
+
+def test_cached_repositories_are_reused_until_the_ttl_expires(graphql):
+    cache = RepoMetadataCache(ttl=0.3)
+    results = hits("octo/alpha", "gone/missing")
+
+    first = enrich_repositories(results, cache=cache)
+    second = enrich_repositories(results, cache=cache)
+    assert first == second == {"octo/alpha": "2024-05-01T10:00:00Z"}
+    assert len(graphql.requests) == 1
+
+    time.sleep(0.4)
+    assert enrich_repositories(results, cache=cache) == first
+    assert len(graphql.requests) == 2
+
+
+def test_batches_stop_after_a_failed_request(graphql):
+    answers = iter([graphql_answer, lambda body: (403, {"message": "API rate limit exceeded"})])
+    graphql.respond = lambda body: next(answers)(body)
+    cache = RepoMetadataCache(ttl=60)
+    progress = []
+
+    dates = enrich_repositories(
+        hits("octo/alpha", "octo/beta", "other/gamma.js", "gone/one", "gone/two"),
+        batch_size=2,
+        cache=cache,
+        progress_callback=lambda completed, total: progress.append((completed, total))
+    )
+
+    assert dates == {"octo/alpha": "2024-05-01T10:00:00Z", "octo/beta": "2023-02-03T04:05:06Z"}
+    # The third batch is never sent once the second one fails
+    assert len(graphql.requests) == 2
+    assert progress == [(1, 3)]
+    assert cache.lookup("other/gamma.js") == (False, None)
+    assert len(cache) == 2
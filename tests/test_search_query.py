@@ -0,0 +1,13 @@
+from search_query import plan_query
+
+
+def test_a_prefix_factored_out_of_an_alternation_stays_in_every_term():
+    plan = plan_query(r"FLWPUBK_TEST-[a-hA-H0-9]{32}-X|FLWSECK_TEST-[a-hA-H0-9]{32}-X|FLWSECK_TEST[a-hA-H0-9]{12}")
+
+    assert plan.query == '"FLWPUBK_TEST-" OR "FLWSECK_TEST"'
+
+
+def test_alternatives_containing_another_alternative_are_dropped():
+    plan = plan_query(r"(?:secret:|secretName:|Secret)[0-9a-f]{16}")
+
+    assert plan.terms == ("Secret",)
@@ -12,10 +12,37 @@ import logging
 from typing import Dict, Any, Optional, List
 import json
 import time
+import uuid
+
+from cancellation import CancellationToken
+from search_records import DedupCollector
+from tracing import env_flag, finish_scan_trace, start_scan_trace
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+def _new_search_stats() -> Dict[str, Any]:
+    return {
+        "total_fetched": 0,
+        "current_page": 0,
+        "items_per_page": 0,
+        "start_time": None,
+        "elapsed_time": 0,
+        "current_pattern": "",
+        "token_info": "",
+        "completed_patterns": 0,
+        "total_patterns": 0,
+        "rate_limit_hits": 0,
+        "requests_made": 0,
+        "is_extended_search": False,
+        "search_query": "",
+        "result_limit": 0,
+        "search_phase": "initializing",
+        "active_tokens": 0,
+        "last_update_time": None
+    }
+
+
 # Global state accessible from any thread
 class ThreadSafeState:
     def __init__(self):
@@ -25,38 +52,33 @@ class ThreadSafeState:
         self.is_running = False
         self.error = None
         self.results = None
+        # Identifies the current results, a new id is assigned whenever results are set
+        self.scan_id = None
+        # Full file contents keyed by blob sha, when the blob fetch stage ran
+        self.blob_texts = None
+        # Last activity dates keyed by repository, when the enrichment stage ran
+        self.repo_dates = None
+        # Performance trace of the scan, when tracing was enabled
+        self.tracer = None
+        # Per-partition duplicate counts of the last scan
+        self.partition_report = []
         # Store completion stats to display after search completes
         self.completed_stats = None
         # Queue for updates to be processed by the main thread
         self.update_queue = Queue()
         # Additional fields for more detailed stats
-        self.search_stats = {
-            "total_fetched": 0,
-            "current_page": 0,
-            "items_per_page": 0,
-            "start_time": None,
-            "elapsed_time": 0,
-            "current_batch": 0,
-            "total_batches": 0,
-            "current_pattern": "",
-            "token_info": "",
-            "completed_patterns": 0,
-            "total_patterns": 0,
-            "rate_limit_hits": 0,
-            "requests_made": 0,
-            "is_extended_search": False,
-            "search_query": "",
-            "result_limit": 0,
-            "cooldown_time": 40,
-            "search_phase": "initializing",
-            "active_tokens": 0,
-            "last_update_time": None
-        }
+        self.search_stats = _new_search_stats()
+        # When the scheduler expects a token's rate limit budget back, while every token is spent
+        self.budget_wait_until = None
         
     def start_search(self, query: str, limit: int, extended: bool) -> None:
         """Record search start time and parameters"""
         with self.lock:
             self.reset()  # Make sure we start with a clean state
+            self.blob_texts = None
+            self.repo_dates = None
+            self.tracer = None
+            self.partition_report = []
             self.search_stats["start_time"] = time.time()
             self.search_stats["search_query"] = query
             self.search_stats["result_limit"] = limit
@@ -99,10 +121,6 @@ class ThreadSafeState:
                 self.search_stats["search_phase"] = "starting"
             elif "Progress:" in message:
                 self.search_stats["search_phase"] = "fetching_results"
-            elif "Batch" in message and "Processing batch" in message:
-                self.search_stats["search_phase"] = "batch_processing"
-            elif "Cooling down" in message:
-                self.search_stats["search_phase"] = "cooling_down"
             elif "Search completed" in message or "search completed" in message.lower():
                 self.search_stats["search_phase"] = "completed"
             
@@ -122,42 +140,18 @@ class ThreadSafeState:
                         self.search_stats["items_per_page"] = int(items_info)
                     
                     self.search_stats["requests_made"] += 1
-                    logger.info(f"Parsed progress: {self.search_stats['total_fetched']} results, page {self.search_stats['current_page']}")
+                    logger.debug(f"Parsed progress: {self.search_stats['total_fetched']} results, page {self.search_stats['current_page']}")
                 except (ValueError, IndexError) as e:
                     logger.error(f"Error parsing Progress information: {str(e)}")
 
-            # Extract batch information for extended search
-            if "Batch" in message:
-                try:
-                    batch_lines = [line for line in message.split("\n") if "Batch" in line and "/" in line]
-                    if batch_lines:
-                        batch_line = batch_lines[0]
-                        if "Processing batch" in batch_line:
-                            batch_parts = batch_line.split("batch")[1].split("/")
-                        else:
-                            batch_parts = batch_line.split("Batch")[1].split("/")
-                        
-                        if len(batch_parts) >= 2:
-                            current_batch = batch_parts[0].strip()
-                            if current_batch.isdigit():
-                                self.search_stats["current_batch"] = int(current_batch)
-                            
-                            total_part = batch_parts[1].split()[0].strip()
-                            if total_part.isdigit():
-                                self.search_stats["total_batches"] = int(total_part)
-                                
-                            logger.info(f"Parsed batch info: {self.search_stats['current_batch']}/{self.search_stats['total_batches']}")
-                except (ValueError, IndexError, KeyError) as e:
-                    logger.error(f"Error parsing Batch information: {str(e)}")
-            
             # Extract pattern information
             if "Pattern" in message:
                 try:
                     pattern_parts = message.split("Pattern")
                     if len(pattern_parts) > 1:
-                        pattern_info = pattern_parts[1].split("in batch")[0].strip() if "in batch" in pattern_parts[1] else pattern_parts[1].strip()
+                        pattern_info = pattern_parts[1].strip()
                         self.search_stats["current_pattern"] = pattern_info
-                        logger.info(f"Parsed pattern: {pattern_info}")
+                        logger.debug(f"Parsed pattern: {pattern_info}")
                 except (ValueError, IndexError) as e:
                     logger.error(f"Error parsing Pattern information: {str(e)}")
             
@@ -169,7 +163,7 @@ class ThreadSafeState:
                         token_count_text = tokens_part.split("tokens")[0].strip()
                         if token_count_text.isdigit():
                             self.search_stats["active_tokens"] = int(token_count_text)
-                            logger.info(f"Parsed token count: {self.search_stats['active_tokens']}")
+                            logger.debug(f"Parsed token count: {self.search_stats['active_tokens']}")
                 except (ValueError, IndexError) as e:
                     logger.error(f"Error parsing token allocation information: {str(e)}")
             
@@ -189,7 +183,7 @@ class ThreadSafeState:
                             if total_count.isdigit():
                                 self.search_stats["total_patterns"] = int(total_count)
                             
-                            logger.info(f"Parsed completed patterns: {self.search_stats['completed_patterns']}/{self.search_stats['total_patterns']}")
+                            logger.debug(f"Parsed completed patterns: {self.search_stats['completed_patterns']}/{self.search_stats['total_patterns']}")
                 except (ValueError, IndexError) as e:
                     logger.error(f"Error parsing completed patterns information: {str(e)}")
             
@@ -198,14 +192,14 @@ class ThreadSafeState:
                 try:
                     token_info = message.split("Using GitHub token:")[1].strip()
                     self.search_stats["token_info"] = token_info
-                    logger.info(f"Parsed token info: {token_info}")
+                    logger.debug(f"Parsed token info: {token_info}")
                 except (ValueError, IndexError) as e:
                     logger.error(f"Error parsing token information: {str(e)}")
             
             # Count rate limit hits
             if "Rate limit hit" in message:
                 self.search_stats["rate_limit_hits"] += 1
-                logger.info(f"Rate limit hit count: {self.search_stats['rate_limit_hits']}")
+                logger.debug(f"Rate limit hit count: {self.search_stats['rate_limit_hits']}")
             
             # Put both the raw message and structured stats into the queue
             self.update_queue.put(("status", {
@@ -219,16 +213,41 @@ class ThreadSafeState:
             self.error = error_message
             self.update_queue.put(("error", self.error))
     
-    def set_results(self, results: List[Dict[str, Any]]) -> None:
+    def set_results(self, results: List[Any]) -> None:
         """Set search results"""
         with self.lock:
             self.results = results
+            self.scan_id = uuid.uuid4().hex
             self.search_stats["total_results"] = len(results) if results else 0
             self.update_queue.put(("results", {
                 "count": len(results) if results else 0,
                 "stats": self.search_stats.copy()  # Send a copy to avoid mutation
             }))
     
+    def set_budget_wait(self, seconds: float) -> None:
+        """Record that every token is spent and the scheduler expects budget back in this many seconds"""
+        with self.lock:
+            self.budget_wait_until = time.time() + seconds
+            self.search_stats["search_phase"] = "cooling_down"
+    
+    def get_budget_wait(self) -> Optional[float]:
+        """Seconds until a token is expected to have budget again, or None if no search is waiting for one"""
+        with self.lock:
+            if self.budget_wait_until is None:
+                return None
+            remaining = self.budget_wait_until - time.time()
+            return remaining if remaining > 0 else None
+    
+    def set_blob_texts(self, blob_texts: Dict[str, str]) -> None:
+        """Set full file contents fetched for the results"""
+        with self.lock:
+            self.blob_texts = blob_texts
+    
+    def set_repo_dates(self, repo_dates: Dict[str, str]) -> None:
+        """Set last activity dates resolved for the results' repositories"""
+        with self.lock:
+            self.repo_dates = repo_dates
+    
     def set_running(self, is_running: bool) -> None:
         """Set running state"""
         with self.lock:
@@ -264,11 +283,46 @@ class ThreadSafeState:
         with self.lock:
             return self.error
     
-    def get_results(self) -> Optional[List[Dict[str, Any]]]:
+    def get_results(self) -> Optional[List[Any]]:
         """Get search results if available"""
         with self.lock:
             return self.results
     
+    def set_tracer(self, tracer) -> None:
+        """Set the performance trace recording this scan"""
+        with self.lock:
+            self.tracer = tracer
+    
+    def get_tracer(self):
+        """Get the performance trace of the scan, if tracing was enabled"""
+        with self.lock:
+            return self.tracer
+    
+    def set_partition_report(self, report: List[Dict[str, Any]]) -> None:
+        """Set the per-partition overlap report of the scan"""
+        with self.lock:
+            self.partition_report = report
+    
+    def get_partition_report(self) -> List[Dict[str, Any]]:
+        """Get the per-partition overlap report of the scan"""
+        with self.lock:
+            return list(self.partition_report)
+    
+    def get_scan_id(self) -> Optional[str]:
+        """Get the id of the scan that produced the current results"""
+        with self.lock:
+            return self.scan_id
+    
+    def get_blob_texts(self) -> Optional[Dict[str, str]]:
+        """Get full file contents keyed by blob sha if fetched"""
+        with self.lock:
+            return self.blob_texts
+    
+    def get_repo_dates(self) -> Optional[Dict[str, str]]:
+        """Get last activity dates keyed by repository if resolved"""
+        with self.lock:
+            return self.repo_dates
+    
     def is_search_running(self) -> bool:
         """Check if search is running"""
         with self.lock:
@@ -307,28 +361,8 @@ class ThreadSafeState:
             # self.completed_stats = None
             
             # Reset search stats
-            self.search_stats = {
-                "total_fetched": 0,
-                "current_page": 0,
-                "items_per_page": 0,
-                "start_time": None,
-                "elapsed_time": 0,
-                "current_batch": 0,
-                "total_batches": 0,
-                "current_pattern": "",
-                "token_info": "",
-                "completed_patterns": 0,
-                "total_patterns": 0,
-                "rate_limit_hits": 0,
-                "requests_made": 0,
-                "is_extended_search": False,
-                "search_query": "",
-                "result_limit": 0,
-                "cooldown_time": 40,
-                "search_phase": "initializing",
-                "active_tokens": 0,
-                "last_update_time": None
-            }
+            self.search_stats = _new_search_stats()
+            self.budget_wait_until = None
             
             # Clear queue
             while not self.update_queue.empty():
@@ -345,9 +379,14 @@ def thread_safe_search_github(
     query: str,
     limit: int,
     extended: bool = False,
-    cooldown: int = 40,
+    fetch_full_content: bool = False,
+    enrich_repos: bool = False,
+    trace: bool = False,
+    profile: bool = False,
+    trace_memory: bool = False,
+    cancel_token: Optional[CancellationToken] = None,
     state: ThreadSafeState = thread_safe_state
-) -> List[Dict[str, Any]]:
+) -> List[Any]:
     """
     Thread-safe wrapper for GitHub search_github function.
     
@@ -358,7 +397,12 @@ def thread_safe_search_github(
         query: The search query to submit to GitHub
         limit: Maximum number of results to fetch
         extended: Whether to use extended search (multiple queries)
-        cooldown: Time in seconds to wait between batches in extended search
+        fetch_full_content: Whether to fetch full file contents for the results
+        enrich_repos: Whether to resolve missing repository dates with batched GraphQL queries
+        trace: Whether to record a performance trace of the scan (also enabled by TRACE_SCANS)
+        profile: Whether to capture a cProfile dump of the search thread and the pool threads working for it
+        trace_memory: Whether to capture a tracemalloc snapshot
+        cancel_token: Stops the scan early (on cancel or deadline), keeping the partial results
         state: The thread-safe state to update
     """
     # Import here to avoid circular imports
@@ -366,7 +410,6 @@ def thread_safe_search_github(
     
     # Initialize search in the thread-safe state
     state.start_search(query, limit, extended)
-    state.search_stats["cooldown_time"] = cooldown
     state.search_stats["search_phase"] = "starting"
     
     # Create proxy objects for progress_bar and status_text
@@ -385,6 +428,16 @@ def thread_safe_search_github(
     progress_proxy = ProgressProxy()
     status_proxy = StatusProxy()
     
+    # The trace stays active until the results have been processed and saved
+    tracer = None
+    if trace or env_flag("TRACE_SCANS"):
+        tracer = start_scan_trace(profile=profile, trace_memory=trace_memory)
+        tracer.start_profiler()
+        state.set_tracer(tracer)
+    
+    # Drops duplicate hits as pages arrive instead of after the scan
+    collector = DedupCollector()
+    
     try:
         # Call the original search_github with our proxies
         results = _search_github(
@@ -393,11 +446,37 @@ def thread_safe_search_github(
             progress_bar=progress_proxy,
             status_text=status_proxy,
             extended=extended,
-            cooldown_time=cooldown
+            cancel_token=cancel_token,
+            collector=collector,
+            on_budget_wait=state.set_budget_wait
         )
+        state.set_partition_report(collector.overlap_report())
+        if cancel_token and cancel_token.cancelled:
+            state.set_status(f"Scan stopped ({cancel_token.reason}) with {len(results)} partial results")
+        elif fetch_full_content and results:
+            from blob_fetcher import fetch_blobs
+            state.set_status(f"Fetching full file contents for {len(results)} results...")
+            state.set_blob_texts(fetch_blobs(
+                results,
+                progress_callback=lambda done, total: state.set_progress(done / total)
+            ))
+        if enrich_repos and results and not (cancel_token and cancel_token.cancelled):
+            from repo_enrichment import enrich_repositories
+            state.set_status("Resolving repository dates...")
+            state.set_repo_dates(enrich_repositories(
+                results,
+                progress_callback=lambda done, total: state.set_progress(done / total)
+            ))
         state.set_results(results)
         return results
     except Exception as e:
         logger.error(f"Error in thread_safe_search_github: {str(e)}", exc_info=True)
         state.set_error(f"Search error: {str(e)}")
-        return [] 
\ No newline at end of file
+        if tracer:
+            # No results will be processed, so write the partial trace now
+            tracer.stop_profiler()
+            finish_scan_trace(tracer)
+        return []
+    finally:
+        if tracer:
+            tracer.stop_profiler() 
\ No newline at end of file
@@ -1,16 +1,18 @@
 import json
 import streamlit as st
 
+def read_token_patterns(path: str = 'token_patterns.json') -> dict:
+    """Read the token pattern catalog without the "Custom Pattern" option or Streamlit caching."""
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
 @st.cache_data
 def load_token_patterns():
     """Load token patterns from JSON file."""
-    try:
-        with open('token_patterns.json', 'r') as f:
-            patterns = json.load(f)
-        # Add "Custom Pattern" option
-        patterns["Custom Pattern"] = "custom"
-        return patterns
-    except FileNotFoundError:
-        return {"Custom Pattern": "custom"}
-    except json.JSONDecodeError:
-        return {"Custom Pattern": "custom"} 
\ No newline at end of file
+    patterns = read_token_patterns()
+    # Add "Custom Pattern" option
+    patterns["Custom Pattern"] = "custom"
+    return patterns
@@ -0,0 +1,275 @@
+"""
+Opt-in per-scan tracing and profiling.
+
+When enabled, timing spans are recorded around each scan stage (network
+requests, pacing sleeps, JSON decoding, regex matching, file writing) and
+written to a per-scan Chrome trace file that can be opened in
+chrome://tracing or https://ui.perfetto.dev. A cProfile dump of the scan
+thread and the pool threads working for it, and a tracemalloc snapshot, can be
+captured alongside it, and a summary table of time per stage is shown in the
+UI once the scan has finished.
+
+Each scan job has its own trace: the active tracer is a context variable set
+in the job's thread, and work handed to pools is wrapped with
+`in_scan_context` so its spans land in the trace of the scan that queued it.
+
+Spans recorded while no trace is active cost a single function call.
+"""
+
+import contextvars
+import cProfile
+import functools
+import json
+import logging
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TRACE_DIR = "traces"
+
+# tracemalloc is process-wide, it runs while any scan asks for memory tracing
+_tracemalloc_users = 0
+_tracemalloc_lock = threading.Lock()
+
+
+def _acquire_tracemalloc() -> None:
+    global _tracemalloc_users
+    with _tracemalloc_lock:
+        if _tracemalloc_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        _tracemalloc_users += 1
+
+
+def _release_tracemalloc() -> None:
+    global _tracemalloc_users
+    with _tracemalloc_lock:
+        _tracemalloc_users -= 1
+        if _tracemalloc_users == 0:
+            tracemalloc.stop()
+
+
+class ScanTracer:
+    """Collects timing spans for one scan and writes them out when it finishes."""
+
+    def __init__(self, scan_name: str, trace_dir: str = DEFAULT_TRACE_DIR,
+                 profile: bool = False, trace_memory: bool = False):
+        self.scan_name = scan_name
+        self.trace_dir = trace_dir
+        self.lock = threading.Lock()
+        self.events: List[Dict[str, Any]] = []
+        self.thread_names: Dict[int, str] = {}
+        self.origin = time.perf_counter()
+        self.finished = False
+        self.summary: List[Dict[str, Any]] = []
+        self.files: Dict[str, str] = {}
+        self.profiler = cProfile.Profile() if profile else None
+        # Profiles of pool threads that ran work for this scan
+        self.thread_profiles: List[cProfile.Profile] = []
+        self.trace_memory = trace_memory
+        if trace_memory:
+            _acquire_tracemalloc()
+
+    @contextmanager
+    def span(self, name: str, **args):
+        """Record the time spent inside the block as a complete trace event"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            thread = threading.current_thread()
+            event = {
+                "name": name,
+                "cat": "scan",
+                "ph": "X",
+                "ts": (start - self.origin) * 1e6,
+                "dur": (end - start) * 1e6,
+                "pid": os.getpid(),
+                "tid": thread.ident
+            }
+            if args:
+                event["args"] = {k: str(v) for k, v in args.items()}
+            with self.lock:
+                self.events.append(event)
+                self.thread_names.setdefault(thread.ident, thread.name)
+
+    def start_profiler(self) -> None:
+        """Start profiling the calling thread (the scan thread)"""
+        if self.profiler:
+            self.profiler.enable()
+
+    @contextmanager
+    def profile_thread(self):
+        """Profile the calling pool thread for the duration of the block"""
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler is already active on this thread
+            yield
+            return
+        try:
+            yield
+        finally:
+            profiler.disable()
+            with self.lock:
+                self.thread_profiles.append(profiler)
+
+    def stop_profiler(self) -> None:
+        if self.profiler:
+            self.profiler.disable()
+
+    def _summarize(self) -> List[Dict[str, Any]]:
+        wall = max(time.perf_counter() - self.origin, 1e-9)
+        stages: Dict[str, Dict[str, float]] = {}
+        for event in self.events:
+            stage = stages.setdefault(event["name"], {"calls": 0, "total": 0.0, "max": 0.0})
+            stage["calls"] += 1
+            stage["total"] += event["dur"] / 1e6
+            stage["max"] = max(stage["max"], event["dur"] / 1e6)
+        rows = [
+            {
+                "Stage": name,
+                "Calls": int(stage["calls"]),
+                "Total (s)": round(stage["total"], 3),
+                "Mean (ms)": round(stage["total"] / stage["calls"] * 1000, 1),
+                "Max (ms)": round(stage["max"] * 1000, 1),
+                # Spans overlap across worker threads, so shares can add up to more than 100%
+                "% of Wall Time": round(stage["total"] / wall * 100, 1)
+            }
+            for name, stage in stages.items()
+        ]
+        return sorted(rows, key=lambda row: row["Total (s)"], reverse=True)
+
+    def finish(self) -> List[Dict[str, Any]]:
+        """Write the trace, profile and memory snapshot files and return the stage summary"""
+        with self.lock:
+            if self.finished:
+                return self.summary
+            self.finished = True
+            events = list(self.events)
+            thread_names = dict(self.thread_names)
+
+        self.stop_profiler()
+        self.summary = self._summarize()
+        base = os.path.join(self.trace_dir, self.scan_name)
+        try:
+            os.makedirs(self.trace_dir, exist_ok=True)
+            metadata = [
+                {"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": tid, "args": {"name": name}}
+                for tid, name in thread_names.items()
+            ]
+            with open(f"{base}.trace.json", "w", encoding="utf-8") as f:
+                json.dump({"traceEvents": metadata + events, "displayTimeUnit": "ms"}, f)
+            self.files["trace"] = f"{base}.trace.json"
+
+            if self.profiler:
+                with self.lock:
+                    thread_profiles = list(self.thread_profiles)
+                # One profile for the scan thread and every pool thread that worked for it
+                stats = pstats.Stats(self.profiler)
+                for profiler in thread_profiles:
+                    stats.add(profiler)
+                stats.dump_stats(f"{base}.prof")
+                self.files["profile"] = f"{base}.prof"
+
+            if self.trace_memory and tracemalloc.is_tracing():
+                # Allocations of every scan running at the same time are included
+                tracemalloc.take_snapshot().dump(f"{base}.tracemalloc")
+                self.files["memory"] = f"{base}.tracemalloc"
+        except (IOError, OSError) as e:
+            logger.error(f"Error writing trace files for {self.scan_name}: {str(e)}")
+        finally:
+            if self.trace_memory:
+                _release_tracemalloc()
+
+        logger.info(f"Scan trace written: {self.files}")
+        return self.summary
+
+
+class _NullTracer:
+    """Stand-in used when no trace is active."""
+    finished = True
+    summary: List[Dict[str, Any]] = []
+
+    @contextmanager
+    def span(self, name: str, **args):
+        yield
+
+
+_null_tracer = _NullTracer()
+# The trace of the scan the current thread (or pool task) works for
+_active_tracer: contextvars.ContextVar = contextvars.ContextVar("scan_tracer", default=None)
+
+
+def env_flag(name: str, default: bool = False) -> bool:
+    return os.getenv(name, "true" if default else "false").strip().lower() in ("1", "true", "yes", "on")
+
+
+def start_scan_trace(profile: bool = False, trace_memory: bool = False) -> ScanTracer:
+    """Begin tracing a scan in the calling thread and the pool work it hands out"""
+    # The random suffix keeps files of scans started in the same second apart
+    scan_name = f"scan_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+    tracer = ScanTracer(
+        scan_name,
+        os.getenv("TRACE_DIR", DEFAULT_TRACE_DIR),
+        profile=profile or env_flag("PROFILE_SCANS"),
+        trace_memory=trace_memory or env_flag("TRACEMALLOC_SCANS")
+    )
+    _active_tracer.set(tracer)
+    return tracer
+
+
+def finish_scan_trace(tracer: ScanTracer) -> List[Dict[str, Any]]:
+    """Finish a scan trace and stop recording spans for it"""
+    if _active_tracer.get() is tracer:
+        _active_tracer.set(None)
+    return tracer.finish()
+
+
+@contextmanager
+def use_tracer(tracer: Optional[ScanTracer]):
+    """Record spans of the block under a scan's trace, e.g. when its results are processed on another thread"""
+    reset = _active_tracer.set(tracer)
+    try:
+        yield
+    finally:
+        _active_tracer.reset(reset)
+
+
+def in_scan_context(fn: Callable) -> Callable:
+    """Wrap fn so that it runs under the caller's scan trace when a pool thread calls it"""
+    context = contextvars.copy_context()
+    tracer = _active_tracer.get()
+
+    def run(*args, **kwargs):
+        if tracer is None or tracer.profiler is None or tracer.finished:
+            return context.run(fn, *args, **kwargs)
+        with tracer.profile_thread():
+            return context.run(fn, *args, **kwargs)
+    return run
+
+
+def span(name: str, **args):
+    """Time a block under the active scan trace, if any"""
+    tracer = _active_tracer.get()
+    return (tracer if tracer is not None and not tracer.finished else _null_tracer).span(name, **args)
+
+
+def traced(name: str):
+    """Decorator that records each call of the function as a span"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Continuous monitoring of a scoped search.
+
+Watch mode repeatedly runs one query sorted by index time, newest first, and
+remembers every (repository, path, blob sha) it has already seen in a small
+SQLite high-water mark. Paging stops on the first page that reaches results
+seen in an earlier poll, so once the first poll is done each poll usually
+costs one or two requests. Only new results are matched against the pattern,
+stored in the findings store, reported and sent to the alert sinks.
+
+Usage:
+    python watch_mode.py --query "org:acme" --pattern-name "GitHub PAT" --interval 300
+"""
+
+import argparse
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+from alert_sinks import publish_findings
+from cancellation import CancellationToken
+from findings_store import get_findings_store
+from github_api import search_github_single
+from local_scanner import resolve_pattern
+from result_processor import process_results, save_results
+from search_records import SearchHit
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WATCH_STATE_PATH = "watch_state.sqlite"
+DEFAULT_INTERVAL = 300
+# Seen entries kept per query; older ones can no longer appear before newer ones in indexed order
+MAX_SEEN_PER_QUERY = 10000
+INDEXED_ORDER = "sort:indexed-desc"
+
+
+class WatchState:
+    """Persisted set of already-seen search hits, per watched query."""
+
+    def __init__(self, path: str = DEFAULT_WATCH_STATE_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS seen (
+                    query TEXT NOT NULL,
+                    repository TEXT NOT NULL,
+                    path TEXT NOT NULL,
+                    sha TEXT NOT NULL,
+                    seen_at REAL NOT NULL,
+                    PRIMARY KEY (query, repository, path, sha)
+                );
+                CREATE INDEX IF NOT EXISTS idx_seen_age ON seen (query, seen_at);
+            """)
+
+    def unseen(self, query: str, hits: List[SearchHit]) -> List[SearchHit]:
+        """Get the hits not seen in an earlier poll of this query"""
+        with self.lock:
+            return [
+                hit for hit in hits
+                if self._conn.execute(
+                    "SELECT 1 FROM seen WHERE query = ? AND repository = ? AND path = ? AND sha = ?",
+                    (query, hit.repository or "", hit.path or "", hit.sha or "")
+                ).fetchone() is None
+            ]
+
+    def mark_seen(self, query: str, hits: List[SearchHit]) -> None:
+        """Record hits as seen and drop the oldest entries beyond MAX_SEEN_PER_QUERY"""
+        now = time.time()
+        with self.lock:
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO seen (query, repository, path, sha, seen_at) VALUES (?, ?, ?, ?, ?)",
+                    [(query, hit.repository or "", hit.path or "", hit.sha or "", now) for hit in hits]
+                )
+                self._conn.execute("""
+                    DELETE FROM seen WHERE query = ? AND rowid NOT IN (
+                        SELECT rowid FROM seen WHERE query = ? ORDER BY seen_at DESC LIMIT ?
+                    )
+                """, (query, query, MAX_SEEN_PER_QUERY))
+
+
+def poll_once(query: str, pattern: str, state: WatchState, limit: int = 100,
+              cancel_token: Optional[CancellationToken] = None) -> Dict[str, Any]:
+    """
+    Fetch results indexed since the last poll and match the new ones.
+
+    Returns:
+        Dict with the new hits, their processed findings and the pages fetched
+    """
+    pages = []
+
+    def reached_seen(page_hits: List[SearchHit]) -> bool:
+        pages.append(len(page_hits))
+        # Results are newest first, so a page with seen hits means everything after it is old
+        return len(state.unseen(query, page_hits)) < len(page_hits)
+
+    hits = search_github_single(
+        f"{query} {INDEXED_ORDER}",
+        limit,
+        current_pattern="watch",
+        cancel_token=cancel_token,
+        stop_when=reached_seen
+    )
+    new_hits = state.unseen(query, hits)
+    processed = process_results(new_hits, pattern) if new_hits else []
+    state.mark_seen(query, new_hits)
+    logger.info(f"Watch poll of '{query}': {len(pages)} pages, {len(new_hits)} new results, "
+                f"{len(processed)} with matches")
+    return {"new_hits": new_hits, "processed": processed, "pages": len(pages)}
+
+
+def watch(query: str, pattern: str, interval: float = DEFAULT_INTERVAL, limit: int = 100,
+          state: Optional[WatchState] = None, cancel_token: Optional[CancellationToken] = None,
+          save: bool = True) -> None:
+    """Poll the query every interval seconds until cancelled"""
+    state = state or WatchState(os.getenv("WATCH_STATE_PATH", DEFAULT_WATCH_STATE_PATH))
+    cancel_token = cancel_token or CancellationToken()
+    findings_store = get_findings_store()
+    while not cancel_token.cancelled:
+        try:
+            outcome = poll_once(query, pattern, state, limit, cancel_token)
+        except Exception as e:
+            logger.error(f"Watch poll failed: {str(e)}", exc_info=True)
+        else:
+            processed = outcome["processed"]
+            if processed:
+                scan_id = f"watch-{uuid.uuid4().hex}"
+                findings_store.add_findings(scan_id, pattern, processed)
+                publish_findings(scan_id, pattern, processed)
+                for result in processed:
+                    print(f"New finding: {result['repository']} {result['file_path']} {result['html_url']}")
+                if save:
+                    save_results(processed, pattern)
+        cancel_token.wait(interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Continuously watch a scoped search for new leaks.")
+    parser.add_argument("--query", required=True, help="Scoped search query, e.g. \"org:acme\"")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--pattern", help="Regex pattern to search for")
+    group.add_argument("--pattern-name", help="Name of a pattern in token_patterns.json")
+    parser.add_argument("--interval", type=float, default=DEFAULT_INTERVAL, help="Seconds between polls (default: 300)")
+    parser.add_argument("--limit", type=int, default=100, help="Maximum results fetched per poll (default: 100)")
+    parser.add_argument("--no-save", action="store_true", help="Only store findings in the findings database")
+    args = parser.parse_args()
+
+    pattern = resolve_pattern(args.pattern, args.pattern_name)
+    try:
+        watch(args.query, pattern, args.interval, args.limit, save=not args.no_save)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()